@@ -4,35 +4,24 @@ os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
 import operator
 import logging
-from flask import Flask, request
-import whisper
+from flask import Config, Flask, request
 import nltk
 import time
 
-import torch
 from logger import configure_logger
-from sentence_transformers import SentenceTransformer
-import tensorflow_hub as hub
-from transformers import (
-    # pipeline,
-    LlavaNextProcessor,
-    LlavaNextForConditionalGeneration,
-    AutoProcessor,
-    AutoModelForSpeechSeq2Seq,
-    AutoModelForCTC,
-)
 
 from app.extensions import (
     jwt,
     session,
     celery_manager,
     redis_manager,
+    model_manager,
     swagger,
     limiter,
 )
-from app.chatbot.utils.translation.translation import TranslationService
 from app.metrics import log_latency, log_request, start_metrics_server
 from app.database import initialize_db
+from app.inference.client import engine_authkey
 
 logger = configure_logger(log_level=logging.DEBUG, log_file="logs/app.log")
 
@@ -48,11 +37,22 @@ def create_app(args):
     else:
         app.config.from_object("app.config.DevConfig")
 
+    if app.config["LLAVA_ENGINE_ADDRESS"]:
+        # Refuse to start with a TCP inference engine that has no authkey
+        engine_authkey(
+            app.config["LLAVA_ENGINE_ADDRESS"], app.config["LLAVA_ENGINE_AUTHKEY"]
+        )
+
     # Initialize extensions
     redis_manager.init_app(app)
     celery_manager.init_app(app)
+    model_manager.init_app(app)
+    register_models()
 
-    if not args.environment == "make_celery":
+    if args.environment == "make_celery":
+        initialize_db(app)
+        model_manager.warm(app.config["CELERY_WARM_MODELS"])
+    else:
         # Initialize prometheus metrics
         @app.before_request
         def before_request():
@@ -73,10 +73,12 @@ def create_app(args):
         swagger.init_app(app)
         limiter.init_app(app)
 
-        start_metrics_server()
+        # Under gunicorn the master serves the metrics of all the workers
+        if getattr(args, "metrics_server", True):
+            start_metrics_server()
 
-        # Initialize models
-        init_models(app)
+        # Load the models this worker serves; the others load on first use
+        model_manager.warm(app.config["WEB_WARM_MODELS"])
 
         # Download nltk data
         nltk.download("punkt")
@@ -100,106 +102,172 @@ def create_app(args):
                 route = "{:50s} {:25s} {}".format(endpoint, methods, rule)
                 print(route)
 
+        @app.cli.command("build-response-catalog")
+        def build_response_catalog_command():
+            "Translate the static dialogue replies into every supported language"
+            from app.chatbot.response_catalog import build_response_catalog
+
+            build_response_catalog(app.config["RESPONSE_CATALOG_PATH"])
+            print(f"Response catalog written to {app.config['RESPONSE_CATALOG_PATH']}")
+
+        @app.cli.command("migrate-messages")
+        def migrate_messages_command():
+            "Replace the message arrays of conversations with counters"
+            from app.utils.migrate_messages import migrate_conversations
+
+            print(f"Migrated {migrate_conversations()} conversations")
+
+        @app.cli.command("models")
+        def models():
+            "Display the loaded models with their load time and memory"
+            for model in model_manager.report():
+                print("{name:30s} {load_time:>8}s {memory_mb:>10} MB".format(**model))
+
     return app
 
 
-def init_translation_model(app):
-    try:
-        device = "gpu" if torch.cuda.is_available() else "cpu"
-        with app.app_context():
-            app.mmt_params = TranslationService.load_model(device)
-        logger.info("MMTAFRICA model loaded successfully!")
-
-    except Exception as e:
-        logger.error(f"Failed to load MMTAFRICA model: {e}")
-        raise
-
-
-def init_speech_recognition_models(app):
-    try:
-        with app.app_context():
-            app.whisper_base_model = whisper.load_model("base")
-
-            # app.whisper_yoruba_pipeline = pipeline(
-            #     "automatic-speech-recognition", model="neoform-ai/whisper-medium-yoruba"
-            # )
-            app.whisper_yoruba_processor = AutoProcessor.from_pretrained(
-                "neoform-ai/whisper-medium-yoruba"
-            )
-            app.whisper_yoruba_model = AutoModelForSpeechSeq2Seq.from_pretrained(
-                "neoform-ai/whisper-medium-yoruba"
-            )
-            # app.whisper_fon_pipeline = pipeline(
-            #     "automatic-speech-recognition", model="chrisjay/fonxlsr"
-            # )
-            app.whisper_fon_processor = AutoProcessor.from_pretrained(
-                "chrisjay/fonxlsr"
-            )
-            app.whisper_fon_model = AutoModelForCTC.from_pretrained("chrisjay/fonxlsr")
-        logger.info("Speech recognition models loaded successfully!")
-
-    except Exception as e:
-        logger.error(f"Failed to load speech recognition models: {e}")
-        raise
-
-
-def init_llm(app):
-    try:
-        with app.app_context():
-            app.llava_processor = LlavaNextProcessor.from_pretrained(
-                "llava-hf/llava-v1.6-mistral-7b-hf"
-            )
-            app.llava_model = LlavaNextForConditionalGeneration.from_pretrained(
-                "llava-hf/llava-v1.6-mistral-7b-hf",
-                torch_dtype=torch.float16,
-                low_cpu_mem_usage=True,
-            )
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            if device == "cuda":
-                app.llava_model.to("cuda")
-        logger.info("LLM model loaded successfully!")
-
-    except Exception as e:
-        logger.error(f"Failed to load LLM: {e}")
-        raise
-
-
-def init_sentence_embedding_model(app):
-    try:
-        with app.app_context():
-            app.sentence_embedding_model = SentenceTransformer("all-mpnet-base-v2")
-        logger.info("sentence embedding model loaded successfully!")
-
-    except Exception as e:
-        logger.error(f"Failed to load sentence embedding model: {e}")
-        raise
-
-
-def init_image_recognition_model(app):
-    try:
-        with app.app_context():
-            app.image_recognition_model = hub.load(
-                "https://tfhub.dev/google/imagenet/mobilenet_v2_100_224/classification/5"
-            )
-        logger.info("image recognition model loaded successfully!")
-
-    except Exception as e:
-        logger.error(f"Failed to load image recognition model: {e}")
-        raise
-
-
-def init_models(app):
-    # Initialize sentence embedding model
-    init_sentence_embedding_model(app)
-
-    # Initialize image recognition model
-    # init_image_recognition_model(app)
-
-    # Initialize LLL
-    # init_llm(app)
-
-    # Initialize speech recognition models
-    # init_speech_recognition_models(app)
-
-    # Initialize translation model
-    # init_translation_model(app)
+def load_translation_model(app):
+    import torch
+    from app.chatbot.utils.translation.translation import TranslationService
+
+    device = "gpu" if torch.cuda.is_available() else "cpu"
+    return TranslationService.load_model(device)
+
+
+def load_whisper_base_model(app):
+    import whisper
+
+    return whisper.load_model("base")
+
+
+def load_whisper_yoruba_processor(app):
+    from transformers import AutoProcessor
+
+    return AutoProcessor.from_pretrained("neoform-ai/whisper-medium-yoruba")
+
+
+def load_whisper_yoruba_model(app):
+    from transformers import AutoModelForSpeechSeq2Seq
+
+    return AutoModelForSpeechSeq2Seq.from_pretrained("neoform-ai/whisper-medium-yoruba")
+
+
+def load_whisper_fon_processor(app):
+    from transformers import AutoProcessor
+
+    return AutoProcessor.from_pretrained("chrisjay/fonxlsr")
+
+
+def load_whisper_fon_model(app):
+    from transformers import AutoModelForCTC
+
+    return AutoModelForCTC.from_pretrained("chrisjay/fonxlsr")
+
+
+def load_llava_processor(app=None):
+    from transformers import LlavaNextProcessor
+
+    return LlavaNextProcessor.from_pretrained("llava-hf/llava-v1.6-mistral-7b-hf")
+
+
+def loader_config(app):
+    """
+    Return the config of the app, or the production config for loaders called
+    outside of an app, such as by the inference server.
+    """
+    if app is not None:
+        return app.config
+    config = Config(os.getcwd())
+    config.from_object("app.config.ProdConfig")
+    return config
+
+
+def load_llava_model(app=None):
+    import torch
+    from transformers import LlavaNextForConditionalGeneration
+    from app.inference.cpu import (
+        configure_threads,
+        load_dtype,
+        quantize_model,
+        resolve_precision,
+    )
+    from app.inference.vision_cache import (
+        VisionFeatureCache,
+        install_vision_feature_cache,
+    )
+
+    config = loader_config(app)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device == "cuda":
+        precision = "float16"
+    else:
+        precision = resolve_precision(config["LLAVA_PRECISION"])
+        configure_threads(config["LLAVA_TORCH_THREADS"])
+
+    llava_model = LlavaNextForConditionalGeneration.from_pretrained(
+        "llava-hf/llava-v1.6-mistral-7b-hf",
+        torch_dtype=load_dtype(precision),
+        low_cpu_mem_usage=True,
+    )
+    if device == "cuda":
+        llava_model.to("cuda")
+    else:
+        llava_model = quantize_model(llava_model, precision)
+    logger.info(f"Loaded LLaVA on {device} in {precision}")
+
+    if config["VISION_CACHE_MEMORY_MB"] > 0:
+        install_vision_feature_cache(
+            llava_model,
+            VisionFeatureCache(
+                config["VISION_CACHE_MEMORY_MB"] * 1024 * 1024,
+                directory=config["VISION_CACHE_DIR"],
+                max_disk_bytes=config["VISION_CACHE_DISK_MB"] * 1024 * 1024,
+            ),
+        )
+    return llava_model
+
+
+def load_sentence_embedding_model(app):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(app.config["SENTENCE_EMBEDDING_MODEL"])
+
+
+def load_intent_index(app):
+    from app.chatbot.intent_index import IntentIndex
+    from app.chatbot.dialogue_management_config import INTENT_PHRASE_GROUPS
+
+    return IntentIndex.build(
+        model_manager.get("sentence_embedding_model"),
+        app.config["SENTENCE_EMBEDDING_MODEL"],
+        INTENT_PHRASE_GROUPS,
+        cache_dir=app.config["INTENT_INDEX_CACHE_DIR"],
+    )
+
+
+def load_image_recognition_model(app):
+    import tensorflow_hub as hub
+
+    return hub.load(
+        "https://tfhub.dev/google/imagenet/mobilenet_v2_100_224/classification/5"
+    )
+
+
+def register_models():
+    """
+    Register every model with the model manager. Nothing is imported or loaded
+    until a model is first requested.
+    """
+    model_manager.register("mmt_params", load_translation_model)
+    model_manager.register("whisper_base_model", load_whisper_base_model)
+    model_manager.register("whisper_yoruba_processor", load_whisper_yoruba_processor)
+    model_manager.register("whisper_yoruba_model", load_whisper_yoruba_model)
+    model_manager.register("whisper_fon_processor", load_whisper_fon_processor)
+    model_manager.register("whisper_fon_model", load_whisper_fon_model)
+    model_manager.register("llava_processor", load_llava_processor, pinned=True)
+    model_manager.register("llava_model", load_llava_model)
+    model_manager.register(
+        "sentence_embedding_model", load_sentence_embedding_model, pinned=True
+    )
+    model_manager.register("intent_index", load_intent_index, pinned=True)
+    model_manager.register("image_recognition_model", load_image_recognition_model)
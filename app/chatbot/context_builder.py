@@ -0,0 +1,166 @@
+import logging
+
+from flask import current_app
+
+from logger import configure_logger
+from app.extensions import model_manager, redis_manager
+from app.models.Message import Message
+from app.utils.cache import TieredCache
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+_token_count_cache = None
+
+
+def get_token_count_cache():
+    global _token_count_cache
+    if _token_count_cache is None:
+        _token_count_cache = TieredCache(
+            "message_tokens",
+            maxsize=current_app.config["MESSAGE_TOKEN_CACHE_SIZE"],
+            ttl=current_app.config["MESSAGE_TOKEN_CACHE_TTL"],
+        )
+    return _token_count_cache
+
+
+def count_tokens(text):
+    """Count the LLaVA tokens of a text, without special tokens."""
+    tokenizer = model_manager.get("llava_processor").tokenizer
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def message_text(message):
+    """The English text of a message, as seen by the model."""
+    return message.model_text or message.text or ""
+
+
+def message_token_counts(messages):
+    """
+    Count the tokens of messages, caching the counts by message ID since the text
+    of a saved message never changes.
+
+    Returns:
+        dict: The token count of each message, keyed by message ID.
+    """
+    cache = get_token_count_cache()
+    keys = {message.id: str(message.id) for message in messages}
+    cached = cache.get_many(list(keys.values()))
+
+    counts = {}
+    missing = {}
+    for message in messages:
+        count = cached.get(keys[message.id])
+        if count is None:
+            count = missing[keys[message.id]] = count_tokens(message_text(message))
+        counts[message.id] = count
+    if missing:
+        cache.set_many(missing)
+    return counts
+
+
+class ConversationContext:
+    """
+    The history a prompt is built from: a summary of the older turns and the
+    recent messages that fit in the token budget, oldest first.
+    """
+
+    def __init__(self, summary=None, messages=None):
+        self.summary = summary
+        self.messages = messages or []
+
+    def turns(self):
+        """
+        Return the history as alternating user and assistant turns starting with
+        a user turn, as chat templates require. The last turn may be a user turn
+        that was never answered.
+
+        Returns:
+            list: (role, text) pairs.
+        """
+        turns = []
+        for message in self.messages:
+            role = "user" if message.sender == "user" else "assistant"
+            text = message_text(message)
+            if not text:
+                continue
+            if turns and turns[-1][0] == role:
+                turns[-1] = (role, f"{turns[-1][1]}\n{text}")
+            elif turns or role == "user":
+                turns.append((role, text))
+
+        if self.summary:
+            if turns:
+                turns[0] = ("user", f"{SUMMARY_PREFIX}{self.summary}\n\n{turns[0][1]}")
+            else:
+                turns = [("user", f"{SUMMARY_PREFIX}{self.summary}")]
+        return turns
+
+
+def build_context(conversation):
+    """
+    Assemble the recent history of a conversation under the token budget.
+
+    The newest messages are kept until the budget, which the conversation summary
+    also counts against, is spent. Older messages that the summary does not cover
+    yet are summarized in the background, so the prompt stays bounded however
+    long the conversation grows.
+
+    Args:
+        conversation (Conversation): The conversation.
+
+    Returns:
+        ConversationContext: The summary and the messages to include.
+    """
+    if not conversation.message_count and not conversation.summary:
+        return ConversationContext()
+
+    budget = current_app.config["CONTEXT_TOKEN_BUDGET"]
+    query = Message.objects(conversation_id=conversation.id)
+    if conversation.summarized_until:
+        query = query.filter(timestamp__gt=conversation.summarized_until)
+    recent = list(
+        query.order_by("-timestamp", "-id")
+        .only("id", "sender", "text", "model_text", "timestamp")
+        .limit(current_app.config["CONTEXT_MAX_MESSAGES"])
+        .no_dereference()
+    )
+
+    summary = conversation.summary
+    if summary:
+        budget -= count_tokens(SUMMARY_PREFIX + summary)
+
+    counts = message_token_counts(recent)
+    selected = []
+    for message in recent:
+        if counts[message.id] > budget:
+            break
+        budget -= counts[message.id]
+        selected.append(message)
+
+    if len(selected) < len(recent) or (
+        len(recent) == current_app.config["CONTEXT_MAX_MESSAGES"]
+    ):
+        # Everything before the oldest kept message belongs in the summary
+        schedule_summary(conversation, (selected or recent[:1])[-1].timestamp)
+
+    selected.reverse()
+    return ConversationContext(summary, selected)
+
+
+def schedule_summary(conversation, until):
+    """
+    Queue the summary of the messages sent before `until`, unless one is already
+    being made for the conversation.
+    """
+    from app.tasks.chat_tasks import summarize_conversation_task
+
+    lock_key = f"conversation-summary:{conversation.id}"
+    try:
+        if redis_manager.get_redis_client().set(
+            lock_key, 1, nx=True, ex=current_app.config["CONTEXT_SUMMARY_LOCK_TTL"]
+        ):
+            summarize_conversation_task.delay(str(conversation.id), until.isoformat())
+    except Exception as e:
+        logger.error(f"Could not queue summary of conversation {conversation.id}: {e}")
@@ -1,46 +1,39 @@
-from flask import current_app
-from sentence_transformers import util
+import re
+
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 
 from app import chat_logger
-from app.chatbot.llava_response import generate_response
+from app.chatbot.llava_response import (
+    generate_response,
+    prepare_inputs,
+    stream_response,
+)
+from app.chatbot.input_processing import chat_messages
 from app.chatbot.response_translation import translate_response
 from app.chatbot.sentiment_analysis import analyze_sentiment
 from app.tasks.tasks import generate_image_task
 from app.chatbot.error_handling import handle_error
-
-
-IMAGE_GENERATION_PHRASES = [
-    "Can you create an image of",
-    "I'd like to see a picture of",
-    "Generate an image showing",
-    "Please make an image that depicts",
-    "Could you draw",
-    "Can you paint",
-    "I want to see a picture of",
-    "Create a visual representation of",
-    "Show me an image of",
-    "Make me a picture of",
-    "Imagine an image of",
-    "Visualize and create an image of",
+from app.extensions import model_manager
+from app.chatbot.dialogue_management_config import (
+    IMAGE_GENERATION_SIMILARITY_THRESHOLD,
+    CONFIRMATION_SIMILARITY_THRESHOLD,
+    SHORT_RESPONSE_THRESHOLD,
+    SHORT_RESPONSE_LENGTH,
+    DIALOGUE_STATES,
+    STATIC_RESPONSES,
+)
+from app.chatbot.response_catalog import static_response
+
+# States whose replies are fixed strings rather than LLM generations
+NON_STREAMING_STATES = [
+    DIALOGUE_STATES["greeting"],
+    "confirming_image_generation",
+    DIALOGUE_STATES["generating_image"],
+    DIALOGUE_STATES["confirming"],
+    DIALOGUE_STATES["end"],
 ]
-IMAGE_GENERATION_SIMILARITY_THRESHOLD = 0.7
-CONFIRMATION_PHRASES = [
-    "Is there anything else I can help you with?",
-    "Do you have any other questions?",
-    "Anything else I can assist you with today?",
-]
-CONFIRMATION_SIMILARITY_THRESHOLD = 0.8
-SHORT_RESPONSE_THRESHOLD = 3
-SHORT_RESPONSE_LENGTH = 50
-DIALOGUE_STATES = {
-    "greeting": "greeting",
-    "conversing": "conversing",
-    "confirming": "confirming",
-    "generating_image": "generating_image",
-    "end": "end",
-}
+SENTENCE_BOUNDARY = re.compile(r"[.!?\n]\s")
 
 
 def generate_title(translated_text):
@@ -64,49 +57,52 @@ def generate_title(translated_text):
     return title.capitalize()
 
 
-def handle_greeting_state(sentiment):
+def handle_greeting_state(sentiment, language):
     """
     Handle the greeting state based on the sentiment.
 
     Args:
         sentiment (float): The sentiment score.
+        language (str): The language of the response.
 
     Returns:
         tuple: A tuple containing the response and the new state.
     """
     if sentiment >= 0:
-        return "Hello! How can I help you today?", DIALOGUE_STATES["conversing"]
+        return static_response("greeting", language), DIALOGUE_STATES["conversing"]
     else:
         return (
-            "Hello, it seems like you're having a tough day. What's going on?",
+            static_response("greeting_negative", language),
             DIALOGUE_STATES["conversing"],
         )
 
 
-def handle_confirming_image_generation_state(translated_text):
+def handle_confirming_image_generation_state(translated_text, language):
     """
     Handle the confirming image generation state based on the translated text.
 
     Args:
         translated_text (str): The translated text.
+        language (str): The language of the response.
 
     Returns:
         tuple: A tuple containing the response, the new state, and the image task ID (if applicable).
     """
     image_task = generate_image_task.delay(translated_text)
     return (
-        "Okay, I'm generating an image for you. You can check the status with the provided task ID.",
+        static_response("generating_image", language),
         DIALOGUE_STATES["generating_image"],
         image_task.id,
     )
 
 
-def handle_generating_image_state(image_task_id, user_id):
+def handle_generating_image_state(image_task_id, user_id, language):
     """
     Handle the generating image state based on the image task ID.
 
     Args:
         image_task_id (str): The ID of the image generation task.
+        language (str): The language of the response.
 
     Returns:
         tuple: A tuple containing the response and the new state.
@@ -117,83 +113,107 @@ def handle_generating_image_state(image_task_id, user_id):
         try:
             image_file_url = image_task.get()
             return (
-                f"Here's the generated image: {image_file_url}",
+                f"{static_response('image_ready', language)} {image_file_url}",
                 image_file_url,
                 DIALOGUE_STATES["confirming"],
             )
         except Exception as e:
             chat_logger.error(f"Error in process_input: {e}")
             return (
-                "I'm not sure what the status of the image generation is. Please try again later.",
+                static_response("image_status_unknown", language),
                 None,
                 DIALOGUE_STATES["conversing"],
             )
     elif image_task.state in ["PENDING", "STARTED"]:
         return (
-            "The image is still being generated. Please wait a bit.",
+            static_response("image_pending", language),
             None,
             DIALOGUE_STATES["generating_image"],
         )
     elif image_task.state == "FAILURE":
         return (
-            "Sorry, there was an error generating the image. Please try again later.",
+            static_response("image_failed", language),
             None,
             DIALOGUE_STATES["conversing"],
         )
     else:
         return (
-            "I'm not sure what the status of the image generation is. Please try again later.",
+            static_response("image_status_unknown", language),
             None,
             DIALOGUE_STATES["conversing"],
         )
 
 
-def handle_confirming_state(translated_text, sentiment):
+def handle_confirming_state(translated_text, sentiment, language):
     """
     Handle the confirming state based on the translated text and sentiment.
 
     Args:
         translated_text (str): The translated text.
         sentiment (float): The sentiment score.
+        language (str): The language of the response.
 
     Returns:
         tuple: A tuple containing the response and the new state.
     """
     if any(keyword in translated_text.lower() for keyword in ["yes", "sure", "please"]):
-        return "Okay, what else can I do for you?", DIALOGUE_STATES["conversing"]
+        return static_response("continue", language), DIALOGUE_STATES["conversing"]
     else:
         return (
-            "Alright, have a great day!"
-            if sentiment >= 0
-            else "Okay, I hope you feel better soon!"
-        ), DIALOGUE_STATES["end"]
+            static_response(
+                "farewell" if sentiment >= 0 else "farewell_negative", language
+            ),
+            DIALOGUE_STATES["end"],
+        )
 
 
-def handle_end_state():
+def handle_end_state(language):
     """
     Handle the end state.
 
+    Args:
+        language (str): The language of the response.
+
     Returns:
         tuple: A tuple containing the response and the new state.
     """
-    return "Goodbye!", DIALOGUE_STATES["end"]
+    return static_response("goodbye", language), DIALOGUE_STATES["end"]
 
 
-def handle_default_state(session, inputs):
+def handle_default_state(session, inputs, language, conversation_id=None):
     """
     Handle the default state based on the translated text, sentiment, and inputs.
 
     Args:
         inputs (dict): The input data.
+        language (str): The language of the user.
+        conversation_id (str, optional): The conversation the response is for.
+
+    Returns:
+        tuple: A tuple containing the response, the translated response and the
+            new state.
+    """
+    generated_response = generate_response(inputs, conversation_id=conversation_id)
+    chatbot_response, new_state = resolve_default_response(session, generated_response)
+    if not generated_response:
+        translated_response = static_response("not_understood", language)
+    else:
+        translated_response = translate_response(chatbot_response, language)
+    return chatbot_response, translated_response, new_state
+
+
+def resolve_default_response(session, chatbot_response):
+    """
+    Apply the fallback reply and pick the next state for a generated response.
+
+    Args:
+        chatbot_response (str): The response generated by the LLM.
 
     Returns:
         tuple: A tuple containing the response and the new state.
     """
-    chatbot_response = generate_response(inputs)
     if not chatbot_response:
-        chatbot_response = (
-            "I'm sorry, but I don't understand. Could you please rephrase your request?"
-        )
+        chatbot_response = STATIC_RESPONSES["not_understood"]
     new_state = (
         DIALOGUE_STATES["confirming"]
         if should_transition_to_confirming(session, chatbot_response)
@@ -213,14 +233,9 @@ def check_image_intent(translated_text):
         bool: True if the text indicates an image generation intent, False otherwise.
     """
 
-    response_embedding = current_app.sentence_embedding_model.encode(
-        translated_text, convert_to_tensor=True
+    max_similarity = model_manager.get("intent_index").max_similarity(
+        "image_generation", translated_text
     )
-    image_generation_embeddings = current_app.sentence_embedding_model.encode(
-        IMAGE_GENERATION_PHRASES, convert_to_tensor=True
-    )
-    cosine_scores = util.cos_sim(response_embedding, image_generation_embeddings)
-    max_similarity = cosine_scores.max().item()
     similarity_threshold = IMAGE_GENERATION_SIMILARITY_THRESHOLD
 
     if max_similarity >= similarity_threshold:
@@ -233,15 +248,8 @@ def check_image_intent(translated_text):
 
     Your answer should only be "yes" or "no" based on whether the user's statement indicates a desire to generate an image.
     """
-    intent_inputs = current_app.llava_processor(
-        text=intent_prompt, return_tensors="pt"
-    ).to(current_app.llava_model.device)
-    intent_generated_ids = current_app.llava_model.generate(
-        **intent_inputs, max_new_tokens=10
-    )
-    intent_response = current_app.llava_processor.batch_decode(
-        intent_generated_ids, skip_special_tokens=True
-    )[0]
+    intent_inputs = prepare_inputs(chat_messages(intent_prompt, False))
+    intent_response = generate_response(intent_inputs, max_new_tokens=10)
 
     return "yes" in intent_response.lower()
 
@@ -257,14 +265,9 @@ def should_transition_to_confirming(session, chatbot_response):
         bool: True if the response indicates a transition to the confirming state, False otherwise.
     """
 
-    response_embedding = current_app.sentence_embedding_model.encode(
-        chatbot_response, convert_to_tensor=True
+    max_similarity = model_manager.get("intent_index").max_similarity(
+        "confirmation", chatbot_response
     )
-    confirmation_embeddings = current_app.sentence_embedding_model.encode(
-        CONFIRMATION_PHRASES, convert_to_tensor=True
-    )
-    cosine_scores = util.cos_sim(response_embedding, confirmation_embeddings)
-    max_similarity = cosine_scores.max().item()
     similarity_threshold = CONFIRMATION_SIMILARITY_THRESHOLD
 
     if max_similarity >= similarity_threshold:
@@ -293,19 +296,27 @@ def manage_dialogue(session, translated_text, inputs, language, conversation):
 
     print("current_state is: ", current_state)
 
+    # The replies of every state but the default one come from the pre-translated
+    # response catalog and need no translation.
+    chatbot_response = None
+
     if current_state == DIALOGUE_STATES["greeting"]:
-        chatbot_response, new_state = handle_greeting_state(sentiment)
+        translated_response, new_state = handle_greeting_state(sentiment, language)
     elif current_state == DIALOGUE_STATES["conversing"]:
-        chatbot_response, new_state = handle_default_state(session, inputs)
+        chatbot_response, translated_response, new_state = handle_default_state(
+            session, inputs, language, str(conversation.id)
+        )
         # intent = check_image_intent(translated_text)
         # if intent:
         #     chatbot_response = "What would you like me to generate an image of?"
         #     new_state = "confirming_image_generation"
         # else:
-        #     chatbot_response, new_state = handle_default_state(session, inputs)
+        #     chatbot_response, translated_response, new_state = (
+        #         handle_default_state(session, inputs, language)
+        #     )
     elif current_state == "confirming_image_generation":
-        chatbot_response, new_state, image_task_id = (
-            handle_confirming_image_generation_state(translated_text)
+        translated_response, new_state, image_task_id = (
+            handle_confirming_image_generation_state(translated_text, language)
         )
     elif current_state == DIALOGUE_STATES["generating_image"]:
         image_task_id = conversation.image_task_id
@@ -318,24 +329,87 @@ def manage_dialogue(session, translated_text, inputs, language, conversation):
                 ),
                 500,
             )
-        chatbot_response, image_url, new_state = handle_generating_image_state(
-            image_task_id, conversation.user_id
+        translated_response, image_url, new_state = handle_generating_image_state(
+            image_task_id, conversation.user_id, language
         )
     elif current_state == DIALOGUE_STATES["confirming"]:
-        chatbot_response, new_state = handle_confirming_state(
-            translated_text, sentiment
+        translated_response, new_state = handle_confirming_state(
+            translated_text, sentiment, language
         )
     elif current_state == DIALOGUE_STATES["end"]:
-        chatbot_response, new_state = handle_end_state()
+        translated_response, new_state = handle_end_state(language)
     else:
-        chatbot_response, new_state = handle_default_state(session, inputs)
-
-    translated_response = translate_response(chatbot_response, language)
+        chatbot_response, translated_response, new_state = handle_default_state(
+            session, inputs, language, str(conversation.id)
+        )
 
     bot_message_fields = {
         "text": translated_response,
+        "model_text": chatbot_response,
         "image_url": image_url,
         # "audio_data": audio_file_url,
     }
 
     return translated_response, new_state, image_task_id, bot_message_fields
+
+
+def stream_dialogue(session, translated_text, inputs, language, conversation):
+    """
+    Stream the chatbot response for the conversation's current state.
+
+    LLM responses are yielded as they are decoded, or sentence by sentence once
+    translated for non-English users. The fixed replies of the other states are
+    yielded whole.
+
+    Yields:
+        str: Chunks of the (translated) response.
+
+    Returns:
+        tuple: The same tuple as manage_dialogue, once the generator is exhausted.
+    """
+    if conversation.dialogue_state in NON_STREAMING_STATES:
+        result = manage_dialogue(
+            session, translated_text, inputs, language, conversation
+        )
+        yield result[0]
+        return result
+
+    response_chunks = []
+    translated_chunks = []
+    pending = ""
+    for chunk in stream_response(inputs, conversation_id=str(conversation.id)):
+        response_chunks.append(chunk)
+        if language == "English":
+            yield chunk
+            continue
+
+        pending += chunk
+        boundaries = list(SENTENCE_BOUNDARY.finditer(pending))
+        if boundaries:
+            end = boundaries[-1].end()
+            translated = translate_response(pending[:end].strip(), language)
+            yield (" " if translated_chunks else "") + translated
+            translated_chunks.append(translated)
+            pending = pending[end:]
+
+    generated_response = "".join(response_chunks).strip()
+    chatbot_response, new_state = resolve_default_response(session, generated_response)
+
+    if not generated_response:
+        translated_response = static_response("not_understood", language)
+        yield translated_response
+    elif language == "English":
+        translated_response = chatbot_response
+    else:
+        if pending.strip():
+            translated = translate_response(pending.strip(), language)
+            yield (" " if translated_chunks else "") + translated
+            translated_chunks.append(translated)
+        translated_response = " ".join(translated_chunks)
+
+    bot_message_fields = {
+        "text": translated_response,
+        "model_text": chatbot_response,
+        "image_url": None,
+    }
+    return translated_response, new_state, None, bot_message_fields
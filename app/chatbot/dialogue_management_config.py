@@ -19,6 +19,10 @@ CONFIRMATION_PHRASES = [
     "Anything else I can assist you with today?",
 ]
 CONFIRMATION_SIMILARITY_THRESHOLD = 0.8
+INTENT_PHRASE_GROUPS = {
+    "image_generation": IMAGE_GENERATION_PHRASES,
+    "confirmation": CONFIRMATION_PHRASES,
+}
 SHORT_RESPONSE_THRESHOLD = 3
 SHORT_RESPONSE_LENGTH = 50
 DIALOGUE_STATES = {
@@ -28,3 +32,31 @@ DIALOGUE_STATES = {
     "generating_image": "generating_image",
     "end": "end",
 }
+# Fixed replies of the dialogue states. They are translated ahead of time into
+# every supported language by `flask build-response-catalog`.
+STATIC_RESPONSES = {
+    "greeting": "Hello! How can I help you today?",
+    "greeting_negative": (
+        "Hello, it seems like you're having a tough day. What's going on?"
+    ),
+    "generating_image": (
+        "Okay, I'm generating an image for you."
+        " You can check the status with the provided task ID."
+    ),
+    "image_ready": "Here's the generated image:",
+    "image_pending": "The image is still being generated. Please wait a bit.",
+    "image_failed": (
+        "Sorry, there was an error generating the image. Please try again later."
+    ),
+    "image_status_unknown": (
+        "I'm not sure what the status of the image generation is."
+        " Please try again later."
+    ),
+    "continue": "Okay, what else can I do for you?",
+    "farewell": "Alright, have a great day!",
+    "farewell_negative": "Okay, I hope you feel better soon!",
+    "goodbye": "Goodbye!",
+    "not_understood": (
+        "I'm sorry, but I don't understand. Could you please rephrase your request?"
+    ),
+}
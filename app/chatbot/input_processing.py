@@ -1,93 +1,167 @@
 import os
-from flask import current_app
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
 from PIL import Image
 from werkzeug.utils import secure_filename
 
 from app import chat_logger
+from app.chatbot.context_builder import build_context
 from app.chatbot.utils.translation.translation import TranslationService
-from app.tasks.tasks import transcribe_task
-from app.chatbot.utils.aws.s3 import upload_file_to_s3
+from app.chatbot.utils.aws.s3 import upload_bytes_to_s3
 from app.chatbot.utils.aws.cloudwatch import create_cloudwatch_rule
-from app.utils.utils import get_temp_file_path
+from app.chatbot.llava_response import prepare_inputs
+
+# Large JPEGs are decoded at a reduced scale that is still at least this size,
+# which covers the largest LLaVA-Next anyres grid
+IMAGE_DRAFT_SIZE = (1344, 1344)
+
+# Uploads of user files run on threads so that they overlap with decoding
+upload_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="upload")
+
+
+def process_input(text_input, image_file, language, conversation):
+    """
+    Translate the text input, upload the image, and build the LLaVA inputs from
+    them and the history of the conversation.
 
+    Audio inputs are handled asynchronously by `app.services.chat_turns`.
 
-def process_input(audio_file, text_input, image_file, language, user_id):
+    Returns:
+        tuple: The LLaVA inputs, the translated text and the URL of the image.
+    """
     translated_text = None
-    image_tensor = None
-    inputs = None
-    temp_file_path = None
+    image = None
     image_file_url = None
-    audio_file_url = None
-    s3_bucket_name = os.environ.get("AWS_BUCKET_NAME")
 
     try:
-        if audio_file:
-            temp_file_path = get_temp_file_path(suffix=".wav")
-            audio_file.save(temp_file_path)
-            audio_file_url, audio_object_key = upload_file_to_s3(
-                temp_file_path, s3_bucket_name, f"audios/{user_id}"
-            )
-            create_cloudwatch_rule(
-                audio_object_key, "plantid-chatbot-image-remover", delay_minutes=10080
-            )
-            transcription_result = transcribe_task.delay(temp_file_path, language)
-            transcript = transcription_result.get()
-
-            if language != "English":
-                translated_text = TranslationService.get_translation(
-                    source_lang=language,
-                    target_lang="English",
-                    source_text=transcript,
-                )
-            else:
-                translated_text = transcript
-
-        elif text_input:
-            if language != "English":
-                translated_text = TranslationService.get_translation(
-                    source_lang=language,
-                    target_lang="English",
-                    source_sentence=text_input,
-                )
-            else:
-                translated_text = text_input
+        if text_input:
+            translated_text = translate_to_english(text_input, language)
 
+        image_upload = None
         if image_file:
-            filename = secure_filename(image_file.filename)
-            temp_file_path = get_temp_file_path(
-                suffix=f".{filename.rsplit('.', 1)[1].lower()}"
-            )
-            image_file.save(temp_file_path)
-            image_file_url, image_object_key = upload_file_to_s3(
-                temp_file_path, s3_bucket_name, f"images/{user_id}"
+            # The original bytes are uploaded while the image is preprocessed
+            image_data = image_file.read()
+            image_upload = upload_user_file_async(
+                image_data,
+                "images",
+                conversation.user_id,
+                file_extension(image_file.filename),
             )
-            create_cloudwatch_rule(
-                image_object_key, "plantid-chatbot-image-remover", delay_minutes=10080
-            )
-            image = Image.open(temp_file_path)
-
-            image_tensor = current_app.llava_processor(
-                images=image, return_tensors="pt"
-            ).pixel_values.to(current_app.llava_model.device)
+            image = load_image(image_data)
 
-        if translated_text:
-            text_input = (
-                translated_text + "\n<image>" if image_tensor else translated_text
-            )
-        else:
-            text_input = "<image>" if image_tensor else None
-
-        if text_input:
-            inputs = current_app.llava_processor(
-                text=text_input, images=image_tensor, return_tensors="pt"
-            ).to(current_app.llava_model.device)
+        inputs = build_model_inputs(translated_text, image, build_context(conversation))
+        if image_upload:
+            image_file_url, _ = image_upload.result()
 
     except Exception as e:
         chat_logger.error(f"Error in process_input: {e}")
         raise Exception("Error processing input")
 
-    finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    return inputs, translated_text, image_file_url
+
+
+def translate_to_english(text, language):
+    if language != "English":
+        return TranslationService.get_translation(
+            source_lang=language,
+            target_lang="English",
+            source_text=text,
+        )
+    return text
+
+
+def file_extension(filename):
+    return secure_filename(filename).rsplit(".", 1)[1].lower()
+
+
+def upload_user_file(data, folder, user_id, extension):
+    """
+    Upload a file sent by a user and schedule its deletion.
+
+    Returns:
+        tuple: The URL and the key of the uploaded object.
+    """
+    file_url, object_key = upload_bytes_to_s3(
+        data,
+        os.environ.get("AWS_BUCKET_NAME"),
+        f"{folder}/{user_id}",
+        f"{uuid.uuid4().hex}.{extension}",
+    )
+    create_cloudwatch_rule(
+        object_key, "plantid-chatbot-image-remover", delay_minutes=10080
+    )
+    return file_url, object_key
+
+
+def upload_user_file_async(data, folder, user_id, extension):
+    """
+    Start uploading a file sent by a user in the background.
+
+    Returns:
+        Future: Resolves to the URL and the key of the uploaded object.
+    """
+    return upload_executor.submit(upload_user_file, data, folder, user_id, extension)
+
+
+def load_image(data):
+    """
+    Decode an uploaded image from memory. JPEGs much larger than the model needs
+    are decoded in draft mode, at a fraction of their resolution.
+    """
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", IMAGE_DRAFT_SIZE)
+    image.load()
+    return image
+
+
+def chat_messages(translated_text, has_image, context=None):
+    """
+    Build the chat messages of the new message of a user after the conversation
+    history.
+
+    Returns:
+        list: Chat messages ending with the user's, as accepted by chat templates.
+    """
+    messages = [
+        {"role": role, "content": [{"type": "text", "text": text}]}
+        for role, text in (context.turns() if context else [])
+    ]
+
+    text = translated_text or ""
+    if messages and messages[-1]["role"] == "user":
+        # A message that was never answered is sent again with the new one
+        previous = messages.pop()["content"][0]["text"]
+        text = f"{previous}\n{text}" if text else previous
+
+    content = [{"type": "image"}] if has_image else []
+    if text:
+        content.append({"type": "text", "text": text})
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def build_model_inputs(translated_text, image=None, context=None):
+    """
+    Build the generation inputs for the translated text of a user and their
+    image.
+
+    With the transformers backend the image is preprocessed once, in the same
+    processor call as the prompt.
+
+    Args:
+        translated_text (str): The English text of the user.
+        image (PIL.Image.Image, optional): The image of the user.
+        context (ConversationContext, optional): The conversation history.
+
+    Returns:
+        The inputs for `generate_response`, or None if there is neither text nor
+            image.
+    """
+    if not translated_text and image is None:
+        return None
 
-    return inputs, translated_text, image_file_url, audio_file_url
+    return prepare_inputs(
+        chat_messages(translated_text, image is not None, context), image
+    )
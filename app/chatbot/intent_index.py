@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+
+import torch
+
+from logger import configure_logger
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/app.log")
+
+
+class IntentIndex:
+    """
+    A precomputed index of intent phrase embeddings.
+
+    Every phrase group (e.g. image generation requests, confirmation questions) is
+    encoded once, L2-normalized and stacked into a single matrix. Scoring a piece of
+    text then only requires embedding that text and a single matrix product against
+    the index.
+    """
+
+    def __init__(self, model, groups, embeddings):
+        self.model = model
+        self.groups = groups
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, model, model_name, phrase_groups, cache_dir=None):
+        """
+        Build the index for the given phrase groups, loading it from disk if possible.
+
+        Args:
+            model (SentenceTransformer): The sentence embedding model.
+            model_name (str): The name of the embedding model, used in the cache key.
+            phrase_groups (dict): A mapping of group name to list of phrases.
+            cache_dir (str, optional): Directory where the index is persisted.
+
+        Returns:
+            IntentIndex: The built index.
+        """
+        groups = {}
+        phrases = []
+        for name, group_phrases in phrase_groups.items():
+            groups[name] = slice(len(phrases), len(phrases) + len(group_phrases))
+            phrases.extend(group_phrases)
+
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(
+                cache_dir, cls.cache_file_name(model_name, phrase_groups)
+            )
+            if os.path.exists(cache_path):
+                try:
+                    embeddings = torch.load(cache_path, map_location=model.device)
+                    logger.info(f"Loaded intent index from {cache_path}")
+                    return cls(model, groups, embeddings)
+                except Exception as e:
+                    logger.warning(f"Failed to load intent index {cache_path}: {e}")
+
+        embeddings = model.encode(
+            phrases, convert_to_tensor=True, normalize_embeddings=True
+        )
+
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                torch.save(embeddings.cpu(), cache_path)
+            except OSError as e:
+                logger.warning(f"Failed to persist intent index {cache_path}: {e}")
+
+        return cls(model, groups, embeddings)
+
+    @staticmethod
+    def cache_file_name(model_name, phrase_groups):
+        """
+        Derive the on-disk file name for an index from the model name and phrases.
+        """
+        digest = hashlib.sha256()
+        for name, group_phrases in sorted(phrase_groups.items()):
+            digest.update(name.encode("utf-8"))
+            for phrase in group_phrases:
+                digest.update(b"\x00" + phrase.encode("utf-8"))
+        safe_model_name = model_name.replace("/", "_")
+        return f"intent-index-{safe_model_name}-{digest.hexdigest()[:16]}.pt"
+
+    def max_similarity(self, group, text):
+        """
+        Return the highest cosine similarity between the text and a phrase group.
+
+        Args:
+            group (str): The name of the phrase group to score against.
+            text (str): The text to score.
+
+        Returns:
+            float: The maximum cosine similarity.
+        """
+        return self.scores(text)[group]
+
+    def scores(self, text):
+        """
+        Score the text against every phrase group with a single matrix product.
+
+        Args:
+            text (str): The text to score.
+
+        Returns:
+            dict: A mapping of group name to maximum cosine similarity.
+        """
+        query = self.model.encode(
+            text, convert_to_tensor=True, normalize_embeddings=True
+        )
+        similarities = self.embeddings @ query.to(self.embeddings.device)
+        return {
+            name: similarities[group_slice].max().item()
+            for name, group_slice in self.groups.items()
+        }
@@ -1,12 +1,71 @@
 from flask import current_app
 
+from app.inference.backends import create_backend
 
-def generate_response(inputs):
+_llm_backend = None
+
+
+def get_llm_backend():
+    global _llm_backend
+    if _llm_backend is None:
+        _llm_backend = create_backend(current_app.config)
+    return _llm_backend
+
+
+def prepare_inputs(messages, image=None):
+    """
+    Build the generation inputs for chat messages with the configured backend.
+
+    Args:
+        messages (list): Chat messages whose content is a list of text and image
+            parts, as accepted by chat templates.
+        image (PIL.Image.Image, optional): The image of the image part.
+
+    Returns:
+        The backend-specific inputs to pass to `generate_response`.
+    """
+    return get_llm_backend().prepare(messages, image)
+
+
+def generate_response(inputs, max_new_tokens=200, conversation_id=None):
+    """
+    Generate a response for a prompt.
+
+    Args:
+        inputs: The inputs returned by `prepare_inputs`.
+        max_new_tokens (int, optional): The maximum number of tokens to generate.
+        conversation_id (str, optional): The conversation of the prompt, whose
+            previous turn's past key values are reused when generating in-process.
+
+    Returns:
+        str: The generated text.
+    """
+    try:
+        return get_llm_backend().generate(
+            inputs, max_new_tokens=max_new_tokens, conversation_id=conversation_id
+        )
+    except Exception as e:
+        raise Exception(f"Error generating response: {e}")
+
+
+def stream_response(inputs, max_new_tokens=200, conversation_id=None):
+    """
+    Generate a response and yield text chunks as the tokens are decoded.
+
+    Backends that cannot stream yield the response as a single chunk.
+
+    Args:
+        inputs: The inputs returned by `prepare_inputs`.
+        max_new_tokens (int, optional): The maximum number of tokens to generate.
+        conversation_id (str, optional): The conversation of the prompt, whose
+            previous turn's past key values are reused.
+
+    Yields:
+        str: Decoded text chunks.
+    """
     try:
-        generated_ids = current_app.llava_model.generate(**inputs, max_new_tokens=200)
-        response = current_app.llava_processor.batch_decode(
-            generated_ids, skip_special_tokens=True
-        )[0]
-        return response
+        yield from get_llm_backend().stream(
+            inputs, max_new_tokens=max_new_tokens, conversation_id=conversation_id
+        )
     except Exception as e:
         raise Exception(f"Error generating response: {e}")
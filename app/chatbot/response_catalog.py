@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import threading
+
+from flask import current_app
+
+from logger import configure_logger
+from app.chatbot.dialogue_management_config import STATIC_RESPONSES
+from app.chatbot.response_translation import translate_response
+from app.chatbot.utils.translation.translation import (
+    LANGUAGE_MAP,
+    TranslationService,
+)
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/app.log")
+
+
+class ResponseCatalog:
+    """
+    The fixed dialogue replies, pre-translated into every supported language.
+
+    The catalog is a JSON file mapping each language to its translated replies. It
+    is read once per process; replies missing from it are translated on demand.
+    """
+
+    def __init__(self):
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._entries is not None:
+                return self._entries
+            path = current_app.config["RESPONSE_CATALOG_PATH"]
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                logger.warning(
+                    f"Response catalog {path} not found, static replies will be"
+                    " translated on demand"
+                )
+                self._entries = {}
+            return self._entries
+
+    def get(self, key, language):
+        """
+        Return a static reply in the given language.
+
+        Args:
+            key (str): The key of the reply in STATIC_RESPONSES.
+            language (str): The language of the user.
+
+        Returns:
+            str: The reply.
+        """
+        if language == "English":
+            return STATIC_RESPONSES[key]
+
+        response = self._load().get(language, {}).get(key)
+        if response is None:
+            response = translate_response(STATIC_RESPONSES[key], language)
+        return response
+
+
+def build_response_catalog(path):
+    """
+    Translate every static reply into every supported language and write the
+    catalog to `path`.
+    """
+    keys = list(STATIC_RESPONSES)
+    catalog = {}
+    for language in LANGUAGE_MAP:
+        if language == "English":
+            continue
+        translations = TranslationService.translate_batch(
+            "English", language, [STATIC_RESPONSES[key] for key in keys]
+        )
+        catalog[language] = dict(zip(keys, translations))
+        logger.info(f"Translated {len(keys)} static replies into {language}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"))
+
+
+response_catalog = ResponseCatalog()
+
+
+def static_response(key, language):
+    return response_catalog.get(key, language)
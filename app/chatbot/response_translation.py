@@ -8,7 +8,7 @@ def translate_response(response, target_language):
         translated_response = TranslationService.get_translation(
             source_lang="English",
             target_lang=target_language,
-            source_sentence=response,
+            source_text=response,
         )
     else:
         translated_response = response
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, session
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from mongoengine import Q
 
 from app import chat_logger
 from app.chatbot.error_handling import handle_error, handle_validation_error
@@ -8,14 +7,25 @@ from app.chatbot.user_auth import authenticate_user
 from app.tasks.tasks import generate_image_task
 from app.models.Conversation import Conversation
 from app.models.Message import Message
-from app.extensions import limiter, redis_manager
+from app.extensions import limiter
 from app.schemas.conversation import CreateConversationSchema, UpdateConversationSchema
-from app.services.chatbot_service import handle_post_request, is_user_throttled
+from app.services.chatbot_service import (
+    handle_post_request,
+    handle_stream_post_request,
+    is_user_throttled,
+)
+from app.services.chat_turns import TURN_DONE, get_turn
+from app.services.conversation_cache import conversation_cache
+from app.utils.pagination import (
+    InvalidCursor,
+    capped_count,
+    finish_page,
+    keyset_page,
+    page_size,
+)
 
 chatbot_blueprint = Blueprint("chatbot", __name__, url_prefix="/api/v1")
 
-redis_client = redis_manager.get_redis_client()
-
 
 @chatbot_blueprint.route("/image-status/<task_id>")
 @jwt_required()
@@ -34,32 +44,64 @@ def image_status(task_id):
         )
 
 
-@chatbot_blueprint.route("/conversations/<int:conversation_id>", methods=["GET"])
+@chatbot_blueprint.route("/turns/<turn_id>")
+@jwt_required()
+def turn_status(turn_id):
+    """
+    Poll a chat turn started by sending a voice message. Once its status is
+    "done", the turn holds the response and, if one was started, the image task
+    ID.
+    """
+    try:
+        turn = get_turn(turn_id)
+        if not turn or turn["user_id"] != get_jwt_identity():
+            return handle_error("Turn not found", 404)
+
+        if turn["status"] == TURN_DONE:
+            session.update(turn.pop("session", {}))
+        turn.pop("user_id", None)
+        return jsonify(turn), 200
+    except Exception as e:
+        chat_logger.error(f"Error in turn_status: {e}")
+        return handle_error(
+            "An error occurred while retrieving the turn. Please try again later.",
+            500,
+        )
+
+
+@chatbot_blueprint.route("/conversations/<string:conversation_id>", methods=["GET"])
 @jwt_required()
 def get_conversation_by_id(conversation_id):
+    """
+    Return the first page of the messages of a conversation, oldest first. Pass
+    the returned `next_cursor` as `cursor`, here or to `list_messages`, to get the
+    next page.
+    """
     try:
         user_id = get_jwt_identity()
         user = authenticate_user(user_id)
         if not user:
             return handle_error("Unauthorized access", 403)
 
-        conversation = redis_client.get(f"conversation:{conversation_id}")
-        if not conversation:
-            conversation = Conversation.objects(
-                Q(id=conversation_id) & Q(user_id=user_id)
-            ).first()
-            if conversation:
-                redis_client.set(
-                    f"conversation:{conversation_id}", conversation.to_json()
-                )
-            else:
-                return handle_error("Conversation not found", 404)
-        else:
-            conversation = Conversation.from_json(conversation)
+        conversation = conversation_cache.get(conversation_id, user_id)
+        if conversation is None:
+            return handle_error("Conversation not found", 404)
 
-        messages_data = [message.to_dict() for message in conversation.messages]
-        return jsonify(messages=messages_data), 200
+        per_page = page_size(request.args.get("per_page"), default=20)
+        query = keyset_page(
+            Message.objects(conversation_id=conversation.id).no_dereference(),
+            "timestamp",
+            False,
+            request.args.get("cursor"),
+            per_page,
+        )
+        messages, next_cursor = finish_page(
+            [message.to_dict() for message in query], "timestamp", per_page
+        )
+        return jsonify(messages=messages, next_cursor=next_cursor), 200
 
+    except InvalidCursor as e:
+        return handle_error(str(e), 400)
     except Exception as e:
         chat_logger.error(f"Error in get_conversation: {e}")
         return handle_error(
@@ -68,6 +110,81 @@ def get_conversation_by_id(conversation_id):
         )
 
 
+def prepare_chat(conversation_id):
+    """
+    Resolve the user, inputs and conversation of a chat request.
+
+    Returns:
+        tuple: Either (chat_context, None) or (None, response) when the request
+            must be answered right away.
+    """
+    user_id = get_jwt_identity()
+    user = authenticate_user(user_id)
+    if not user:
+        return None, handle_error("Unauthorized access", 403)
+
+    language = request.form.get("language", user.language_preference)
+
+    audio_file = request.files.get("audio")
+    text_input = request.form.get("text")
+    image_file = request.files.get("image")
+
+    new_chat = False
+    if conversation_id:
+        conversation = conversation_cache.get(conversation_id, user_id)
+        if conversation is None:
+            return None, handle_error("Conversation not found", 404)
+    else:
+        new_chat = True
+        try:
+            if is_user_throttled(user_id):
+                return None, handle_error(
+                    "Too many requests. Please try again later.", 429
+                )
+            data = {"user_id": user_id, "title": "chat"}
+            schema = CreateConversationSchema()
+            errors = schema.validate(data)
+            if errors:
+                return None, handle_validation_error(errors)
+
+            conversation = Conversation(**data)
+            conversation.save()
+            if bool(audio_file) + bool(text_input) + bool(image_file) < 1:
+                return None, (jsonify(conversation.to_dict()), 201)
+        except Exception as e:
+            chat_logger.error(f"Error in create_conversation: {e}")
+            return None, handle_error(
+                "An error occurred while creating the conversation. Please try again later.",
+                500,
+            )
+
+    if conversation.image_task_status in ["STARTED", "PENDING"]:
+        return None, handle_error(
+            "Wait till image is generated.",
+            403,
+        )
+    user_message = Message(
+        conversation_id=conversation,
+        sender="user",
+    )
+    bot_message = Message(
+        conversation_id=conversation,
+        sender="bot",
+    )
+    chat_context = {
+        "user": user,
+        "conversation": conversation,
+        "user_message": user_message,
+        "bot_message": bot_message,
+        "language": language,
+        "audio_file": audio_file,
+        "text_input": text_input,
+        "image_file": image_file,
+        "new_chat": new_chat,
+    }
+    return chat_context, None
+
+
 @chatbot_blueprint.route(
     "/conversations",
     defaults={"conversation_id": None},
@@ -80,92 +197,55 @@ def get_conversation_by_id(conversation_id):
 @jwt_required()
 @limiter.limit("40/minute")
 def chat(conversation_id):
-    new_chat = False
     try:
-        user_id = get_jwt_identity()
-        user = authenticate_user(user_id)
-        if not user:
-            return handle_error("Unauthorized access", 403)
+        chat_context, response = prepare_chat(conversation_id)
+        if response:
+            return response
 
-        language = request.form.get("language", user.language_preference)
-
-        audio_file = request.files.get("audio")
-        text_input = request.form.get("text")
-        image_file = request.files.get("image")
-
-        if conversation_id:
-            conversation = redis_client.get(f"conversation:{conversation_id}")
-            if not conversation:
-                conversation = Conversation.objects(
-                    Q(id=conversation_id) & Q(user_id=user_id)
-                ).first()
-                if conversation:
-                    redis_client.set(
-                        f"conversation:{conversation_id}", conversation.to_json()
-                    )
-                else:
-                    return handle_error("Conversation not found", 404)
-            else:
-                conversation = Conversation.from_json(conversation)
-        else:
-            new_chat = True
-            try:
-                if is_user_throttled(user_id):
-                    return handle_error(
-                        "Too many requests. Please try again later.", 429
-                    )
-                data = {"user_id": user_id, "title": "chat"}
-                schema = CreateConversationSchema()
-                errors = schema.validate(data)
-                if errors:
-                    return handle_validation_error(errors)
-
-                conversation = Conversation(**data)
-                conversation.save()
-                if bool(audio_file) + bool(text_input) + bool(image_file) < 1:
-                    return jsonify(conversation.to_dict()), 201
-            except Exception as e:
-                chat_logger.error(f"Error in create_conversation: {e}")
-                return handle_error(
-                    "An error occurred while creating the conversation. Please try again later.",
-                    500,
-                )
+        return handle_post_request(session, **chat_context)
 
-        if conversation.image_task_status in ["STARTED", "PENDING"]:
-            return handle_error(
-                "Wait till image is generated.",
-                403,
-            )
-        user_message = Message(
-            conversation_id=conversation,
-            sender="user",
-        )
-        bot_message = Message(
-            conversation_id=conversation,
-            sender="bot",
-        )
-        return handle_post_request(
-            session,
-            user,
-            conversation,
-            user_message,
-            bot_message,
-            language,
-            audio_file,
-            text_input,
-            image_file,
-            new_chat,
+    except Exception as e:
+        chat_logger.error(f"Error in chat: {e}")
+        return handle_error(
+            "An error occurred while retrieving the conversation. Please try again later.",
+            500,
         )
 
+
+@chatbot_blueprint.route(
+    "/conversations/stream",
+    defaults={"conversation_id": None},
+    methods=["POST"],
+)
+@chatbot_blueprint.route(
+    "/conversations/<string:conversation_id>/stream",
+    methods=["POST"],
+)
+@jwt_required()
+@limiter.limit("40/minute")
+def chat_stream(conversation_id):
+    """
+    Same as `chat`, but the response is streamed as server-sent events: a
+    `conversation` event, one `token` event per decoded chunk and a final `done`
+    (or `error`) event.
+    """
+    try:
+        chat_context, response = prepare_chat(conversation_id)
+        if response:
+            return response
+
+        chat_context.pop("new_chat")
+        return handle_stream_post_request(session, **chat_context)
+
     except Exception as e:
-        chat_logger.error(f"Error in chat: {e}")
+        chat_logger.error(f"Error in chat_stream: {e}")
         return handle_error(
             "An error occurred while retrieving the conversation. Please try again later.",
             500,
         )
 
 
-@chatbot_blueprint.route("/conversations/<int:conversation_id>", methods=["PUT"])
+@chatbot_blueprint.route("/conversations/<string:conversation_id>", methods=["PUT"])
 @jwt_required()
 def update_conversation_title(conversation_id):
     try:
@@ -174,40 +254,91 @@ def update_conversation_title(conversation_id):
         errors = schema.validate(data)
         if errors:
             return handle_validation_error(errors)
-        conversation = Conversation.objects(id=conversation_id).first()
+        conversation = Conversation.objects(
+            id=conversation_id, user_id=get_jwt_identity()
+        ).first()
         if not conversation:
             return handle_error("Conversation not found", 404)
         conversation.update(**{f"set__{key}": value for key, value in data.items()})
+        conversation_cache.invalidate(conversation_id)
         return jsonify(conversation.to_dict()), 200
     except Exception as e:
         chat_logger.error(f"Error in update_conversation: {e}")
         return handle_error("An error occurred while updating the conversation", 500)
 
 
-@chatbot_blueprint.route("/conversations/<int:conversation_id>", methods=["DELETE"])
+@chatbot_blueprint.route("/conversations/<string:conversation_id>", methods=["DELETE"])
 @jwt_required()
 def delete_conversation(conversation_id):
     try:
-        conversation = Conversation.objects(id=conversation_id).first()
+        conversation = Conversation.objects(
+            id=conversation_id, user_id=get_jwt_identity()
+        ).first()
         if conversation is None:
             return jsonify({"error": "Conversation not found"}), 404
+        Message.objects(conversation_id=conversation.id).delete()
         conversation.delete()
+        conversation_cache.invalidate(conversation_id)
         return jsonify({"message": "Conversation deleted successfully"}), 200
     except Exception as e:
         chat_logger.error(f"Error in delete_conversation: {e}")
         return handle_error("An error occurred while deleting the conversation", 500)
 
 
+@chatbot_blueprint.route("/conversations/<string:conversation_id>/messages")
+@jwt_required()
+def list_messages(conversation_id):
+    """
+    Page through the messages of a conversation, newest first unless
+    `sort_order=asc`. Pass the returned `next_cursor` as `cursor` to get the next
+    page.
+    """
+    try:
+        user_id = get_jwt_identity()
+        per_page = page_size(request.args.get("per_page"), default=20)
+        descending = request.args.get("sort_order", "desc") != "asc"
+
+        if not Conversation.objects(id=conversation_id, user_id=user_id).count():
+            return handle_error("Conversation not found", 404)
+
+        query = keyset_page(
+            Message.objects(conversation_id=conversation_id).no_dereference(),
+            "timestamp",
+            descending,
+            request.args.get("cursor"),
+            per_page,
+        )
+        messages, next_cursor = finish_page(
+            [message.to_dict() for message in query], "timestamp", per_page
+        )
+        return (
+            jsonify(
+                {"messages": messages, "per_page": per_page, "next_cursor": next_cursor}
+            ),
+            200,
+        )
+    except InvalidCursor as e:
+        return handle_error(str(e), 400)
+    except Exception as e:
+        chat_logger.error(f"Error in list_messages: {e}")
+        return handle_error("An error occurred while retrieving the messages", 500)
+
+
 @chatbot_blueprint.route("/conversations", methods=["GET"])
 @jwt_required()
 def list_conversations():
+    """
+    Page through the conversations of the user. Pass the returned `next_cursor`
+    as `cursor` to get the next page, and `include_count=true` to also get the
+    number of conversations, counted up to a limit.
+    """
     try:
         user_id = get_jwt_identity()
-        page = int(request.args.get("page", 1))
-        per_page = int(request.args.get("per_page", 10))
+        per_page = page_size(request.args.get("per_page"))
         dialogue_state = request.args.get("dialogue_state")
         sort_field = request.args.get("sort_field", "timestamp")
         sort_order = request.args.get("sort_order", "desc")
+        view = request.args.get("view", "full")
 
         query = Conversation.objects(user_id=user_id)
         if dialogue_state:
@@ -217,32 +348,32 @@ def list_conversations():
         if sort_field not in ["timestamp", "dialogue_state"]:
             sort_field = "timestamp"
 
-        if sort_order == "asc":
-            conversations = (
-                query.order_by(f"+{sort_field}")
-                .skip((page - 1) * per_page)
-                .limit(per_page)
-            )
+        page_query = keyset_page(
+            query,
+            sort_field,
+            sort_order != "asc",
+            request.args.get("cursor"),
+            per_page,
+        )
+        if view == "summary":
+            conversations = Conversation.summaries(page_query)
         else:
-            conversations = (
-                query.order_by(f"-{sort_field}")
-                .skip((page - 1) * per_page)
-                .limit(per_page)
-            )
+            conversations = Conversation.to_dicts(page_query)
+        conversations, next_cursor = finish_page(conversations, sort_field, per_page)
 
-        total_count = query.count()
+        response_data = {
+            "conversations": conversations,
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+        }
+        if request.args.get("include_count", "false").lower() == "true":
+            response_data["total_count"], response_data["total_count_exact"] = (
+                capped_count(query)
+            )
 
-        return (
-            jsonify(
-                {
-                    "conversations": [conv.to_dict() for conv in conversations],
-                    "page": page,
-                    "per_page": per_page,
-                    "total_count": total_count,
-                }
-            ),
-            200,
-        )
+        return jsonify(response_data), 200
+    except InvalidCursor as e:
+        return handle_error(str(e), 400)
     except Exception as e:
         chat_logger.error(f"Error in list_conversations: {e}")
         return handle_error("An error occurred while retrieving the conversations", 500)
@@ -1,43 +1,132 @@
+import logging
+import time
+
 from flask import current_app
 import requests
 
 from app.chatbot.utils.auth import MicroserviceToken
+from app.metrics import log_upstream_latency
 from app.models.User import User
-from app.utils.utils import (
-    generate_microservice_token,
-    temporary_jwt_secret_key,
-)
+from app.utils.cache import TieredCache
+from app.utils.http import CircuitBreaker, CircuitOpenError, create_session
+from logger import configure_logger
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
 
 microservice_token = MicroserviceToken()
 
+_user_client = None
+_user_cache = None
+
+
+class UserClient:
+    """
+    Looks users up in the PlantID DB API over a pooled keep-alive session, with
+    timeouts and a circuit breaker so that a slow or failing upstream does not
+    hold up workers.
+    """
+
+    def __init__(self, base_url, timeout, pool_size, breaker):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = create_session(pool_size=pool_size)
+        self.breaker = breaker
+
+    def get_user(self, user_id, token):
+        """
+        Fetch a user.
+
+        Returns:
+            requests.Response: The upstream response, for any status below 500.
+
+        Raises:
+            CircuitOpenError: If the upstream is considered unavailable.
+            requests.exceptions.RequestException: If the request failed.
+        """
+        return self.breaker.call(self._get_user, user_id, token)
+
+    def _get_user(self, user_id, token):
+        started = time.monotonic()
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/auth/user/{user_id}",
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.timeout,
+            )
+        finally:
+            log_upstream_latency("plantid_db_api", time.monotonic() - started)
+        if response.status_code >= 500:
+            raise requests.exceptions.HTTPError(
+                f"PlantID DB API returned {response.status_code}", response=response
+            )
+        return response
+
+
+def get_user_client():
+    global _user_client
+    if _user_client is None:
+        config = current_app.config
+        _user_client = UserClient(
+            config["PLANTID_DB_API_BASE_URL"],
+            timeout=(
+                config["USER_API_CONNECT_TIMEOUT"],
+                config["USER_API_READ_TIMEOUT"],
+            ),
+            pool_size=config["USER_API_POOL_SIZE"],
+            breaker=CircuitBreaker(
+                "PlantID DB API",
+                failure_threshold=config["USER_API_FAILURE_THRESHOLD"],
+                reset_timeout=config["USER_API_RESET_TIMEOUT"],
+            ),
+        )
+    return _user_client
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = TieredCache(
+            "user",
+            maxsize=current_app.config["USER_CACHE_SIZE"],
+            ttl=current_app.config["USER_CACHE_TTL"],
+        )
+    return _user_cache
+
 
 def authenticate_user(user_id):
+    """
+    Look up a user, serving recent lookups from the user cache.
+
+    Users the upstream rejects with 401 or 403 are cached as rejected for
+    USER_CACHE_NEGATIVE_TTL seconds. Failed lookups are not cached.
+
+    Returns:
+        User: The user, or None if the user is unknown, rejected or could not be
+            looked up.
+    """
+    cache = get_user_cache()
+    cached = cache.get(user_id)
+    if cached is not None:
+        return User(cached["user"]) if "user" in cached else None
+
     try:
-        if not microservice_token.is_valid():
-            with temporary_jwt_secret_key(
-                current_app, current_app.config["CHATBOT_JWT_SECRET_KEY"]
-            ):
-                token = generate_microservice_token()
-                microservice_token.refresh(
-                    token,
-                    int(current_app.config["CHATBOT_JWT_ACCESS_EXPIRES_IN"]),
-                )
-
-        headers = {"Authorization": f"Bearer {microservice_token.token}"}
-        response = requests.get(
-            f'{current_app.config["PLANTID_DB_API_BASE_URL"]}/api/auth/user/{user_id}',
-            headers=headers,
-        )
+        response = get_user_client().get_user(user_id, microservice_token.get_token())
+    except CircuitOpenError:
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error looking up user {user_id}: {e}")
+        return None
 
-        if response.status_code == 200:
-            user_data = response.json()
-            user = User(user_data)
-            return user
-        elif response.status_code == 401:
-            return None
-        elif response.status_code == 403:
-            return None
-        else:
-            return None
-    except requests.exceptions.RequestException:
+    if response.status_code == 200:
+        user_data = response.json()
+        cache.set(user_id, {"user": user_data})
+        return User(user_data)
+    elif response.status_code in (401, 403):
+        cache.set(
+            user_id,
+            {"rejected": response.status_code},
+            ttl=current_app.config["USER_CACHE_NEGATIVE_TTL"],
+        )
+        return None
+    else:
         return None
@@ -1,20 +1,122 @@
-from datetime import datetime, timedelta
+import json
+import threading
+import time
+import uuid
+
+import jwt
+from flask import current_app
+from redis.exceptions import LockError
 
 from app import chat_logger
+from app.extensions import redis_manager
 
 
 class MicroserviceToken:
-    def __init__(self):
+    """
+    Provides the token the chatbot uses to call other PlantID services.
+
+    The token is shared by every web and Celery process through Redis, together
+    with its expiry. It is renewed `refresh_margin` seconds before it expires by a
+    single process holding a Redis lock, while the other processes keep using the
+    current token. Each process also keeps the token in memory, so most calls do
+    not touch Redis.
+    """
+
+    REDIS_KEY = "microservice-token"
+    LOCK_KEY = "microservice-token-lock"
+
+    def __init__(self, identity="chatbot_microservice", refresh_margin=60):
+        self.identity = identity
+        self.refresh_margin = refresh_margin
         self.token = None
-        self.expiry = None
+        self.expires_at = 0
+        self._lock = threading.Lock()
+
+    def is_valid(self, margin=0):
+        return self.token is not None and self.expires_at - margin > time.time()
+
+    def get_token(self):
+        """
+        Return a valid token, renewing it first if it is about to expire.
+        """
+        if self.is_valid(self.refresh_margin):
+            return self.token
+
+        with self._lock:
+            if self.is_valid(self.refresh_margin):
+                return self.token
+            self._read_shared()
+            if not self.is_valid(self.refresh_margin):
+                self._refresh_shared()
+            if not self.is_valid():
+                # Redis is unavailable or another process failed to renew it
+                self._store(*self._create_token())
+            return self.token
 
-    def is_valid(self):
+    def _read_shared(self):
         try:
-            return self.token and self.expiry and self.expiry > datetime.utcnow()
+            raw_value = redis_manager.get_redis_client().get(self.REDIS_KEY)
         except Exception as e:
-            chat_logger.error(f"Error in MicroserviceToken.is_valid: {e}")
-            return False
+            chat_logger.error(f"Error reading microservice token: {e}")
+            return
+        if raw_value:
+            shared = json.loads(raw_value)
+            if shared["expires_at"] > self.expires_at:
+                self._store(shared["token"], shared["expires_at"])
+
+    def _refresh_shared(self):
+        redis_client = redis_manager.get_redis_client()
+        try:
+            lock = redis_client.lock(self.LOCK_KEY, timeout=10)
+            if not lock.acquire(blocking=not self.is_valid(), blocking_timeout=5):
+                # Another process is renewing the token; keep using the current one
+                return
+        except Exception as e:
+            chat_logger.error(f"Error locking microservice token: {e}")
+            return
+
+        try:
+            self._read_shared()
+            if self.is_valid(self.refresh_margin):
+                return
+            token, expires_at = self._create_token()
+            redis_client.set(
+                self.REDIS_KEY,
+                json.dumps({"token": token, "expires_at": expires_at}),
+                ex=max(int(expires_at - time.time()), 1),
+            )
+            self._store(token, expires_at)
+        except Exception as e:
+            chat_logger.error(f"Error refreshing microservice token: {e}")
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    def _create_token(self):
+        """
+        Sign an access token with the chatbot key, without going through the
+        JWT settings of the app, which belong to the tokens of users.
+        """
+        now = int(time.time())
+        expires_in = int(current_app.config["CHATBOT_JWT_ACCESS_EXPIRES_IN"])
+        claims = {
+            "fresh": False,
+            "iat": now,
+            "nbf": now,
+            "exp": now + expires_in,
+            "jti": str(uuid.uuid4()),
+            "type": "access",
+            current_app.config.get("JWT_IDENTITY_CLAIM", "sub"): self.identity,
+        }
+        token = jwt.encode(
+            claims,
+            current_app.config["CHATBOT_JWT_SECRET_KEY"],
+            algorithm=current_app.config.get("JWT_ALGORITHM", "HS256"),
+        )
+        return token, now + expires_in
 
-    def refresh(self, token, expires_in):
+    def _store(self, token, expires_at):
         self.token = token
-        self.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
+        self.expires_at = expires_at
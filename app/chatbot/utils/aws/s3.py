@@ -1,3 +1,5 @@
+import io
+
 from app.extensions import s3
 
 
@@ -11,3 +13,22 @@ def upload_file_to_s3(file_path, bucket_name, folder, object_name=None):
     # Construct the S3 file URL
     file_url = f"https://{bucket_name}.s3.amazonaws.com/{folder}/{object_name}"
     return file_url, object_name
+
+
+def upload_bytes_to_s3(data, bucket_name, folder, filename):
+    """
+    Upload in-memory file contents to `<folder>/<filename>`.
+
+    Returns:
+        tuple: The URL and the key of the uploaded object.
+    """
+    object_name = f"{folder}/{filename}"
+    s3.upload_fileobj(io.BytesIO(data), bucket_name, object_name)
+    file_url = f"https://{bucket_name}.s3.amazonaws.com/{object_name}"
+    return file_url, object_name
+
+
+def download_bytes_from_s3(bucket_name, object_name):
+    buffer = io.BytesIO()
+    s3.download_fileobj(bucket_name, object_name, buffer)
+    return buffer.getvalue()
@@ -1,49 +1,281 @@
-from pydub import AudioSegment
-import functools
-import tenacity
+import subprocess
+import wave
+from io import BytesIO
+from math import gcd
 
+import numpy as np
+from scipy.signal import resample_poly
 
-@functools.lru_cache(maxsize=None)
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-)
-def split_audio(audio_path, chunk_size=60):
+# Sample rate expected by every speech recognition model
+SAMPLE_RATE = 16000
+
+# Length of the frames audio features are computed on, in seconds
+FRAME_SECONDS = 0.02
+
+# Voice activity detection: frames louder than both the noise floor plus
+# SPEECH_MARGIN_DB and SILENCE_FLOOR_DB are speech, unless the audio has little
+# dynamic range, in which case everything within SPEECH_RANGE_DB of its loud
+# frames is. Unvoiced consonants are quieter but cross zero far more often.
+SPEECH_MARGIN_DB = 12.0
+SPEECH_RANGE_DB = 25.0
+SILENCE_FLOOR_DB = -55.0
+UNVOICED_MARGIN_DB = 6.0
+UNVOICED_ZCR = 0.25
+
+# Sample type, zero offset and scale of PCM WAV samples, by sample width in bytes
+PCM_FORMATS = {
+    1: (np.uint8, 128.0, 128.0),
+    2: (np.int16, 0.0, 32768.0),
+    4: (np.int32, 0.0, 2147483648.0),
+}
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
     """
-    Split the audio file into smaller segments.
+    Decode an uploaded audio file into mono float32 samples in a single pass.
+
+    PCM WAV files are parsed in memory and resampled with a polyphase filter.
+    Other formats, such as the Ogg or AAC voice notes sent by phones, are piped
+    through ffmpeg without touching the disk.
 
     Args:
-        audio_path (str): The path to the audio file.
-        chunk_size (int, optional): The size of each segment in seconds. Defaults to 60.
+        data (bytes): The contents of the audio file.
+        sample_rate (int, optional): The sample rate to decode to.
+
+    Returns:
+        np.ndarray: The samples, between -1 and 1.
+    """
+    try:
+        audio, source_rate = read_wav(data)
+    except (wave.Error, EOFError, KeyError):
+        return decode_with_ffmpeg(data, sample_rate)
+    return resample(audio, source_rate, sample_rate)
+
+
+def read_wav(data):
+    """
+    Read a PCM WAV file from memory, averaging its channels.
 
     Returns:
-        list: A list of audio segments.
+        tuple: The float32 samples and their sample rate.
+
+    Raises:
+        wave.Error: If the file is not a WAV file.
+        KeyError: If its sample width is not supported.
+    """
+    with wave.open(BytesIO(data)) as wav_file:
+        channels = wav_file.getnchannels()
+        source_rate = wav_file.getframerate()
+        dtype, offset, scale = PCM_FORMATS[wav_file.getsampwidth()]
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    samples = (samples - offset) / scale
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, source_rate
+
+
+def resample(audio, source_rate, sample_rate=SAMPLE_RATE):
+    """Resample audio with a vectorized polyphase filter."""
+    if source_rate == sample_rate:
+        return audio
+    divisor = gcd(source_rate, sample_rate)
+    return resample_poly(audio, sample_rate // divisor, source_rate // divisor).astype(
+        np.float32
+    )
+
+
+def decode_with_ffmpeg(data, sample_rate=SAMPLE_RATE):
     """
+    Decode audio in any format ffmpeg supports, through pipes.
+
+    Raises:
+        RuntimeError: If ffmpeg cannot decode the audio.
+    """
+    command = [
+        "ffmpeg",
+        "-threads",
+        "0",
+        "-i",
+        "pipe:0",
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(sample_rate),
+        "pipe:1",
+    ]
     try:
-        audio = AudioSegment.from_wav(audio_path)
-        segments = []
-        for i in range(0, len(audio), chunk_size * 1000):
-            segment = audio[i : i + chunk_size * 1000]
-            segments.append(segment)
-        return segments
-    except Exception as e:
-        print(f"Error splitting audio: {e}")
-        raise
+        output = subprocess.run(command, input=data, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode()}") from e
+    return np.frombuffer(output.stdout, np.int16).astype(np.float32) / 32768.0
 
 
-def convert_to_wav(audio_segment):
+def frame_rms(audio, frame_length):
     """
-    Convert an audio segment to WAV format.
+    Compute the root mean square energy of consecutive frames of audio.
 
     Args:
-        audio_segment (pydub.AudioSegment): The audio segment to convert.
+        audio (np.ndarray): Mono float32 samples.
+        frame_length (int): The number of samples per frame.
 
     Returns:
-        pydub.AudioSegment: The converted audio segment in WAV format.
+        np.ndarray: One value per complete frame.
     """
-    try:
-        wav_segment = audio_segment.export(format="wav")
-        return wav_segment
-    except Exception as e:
-        print(f"Error converting audio to WAV: {e}")
-        raise
+    frame_count = len(audio) // frame_length
+    frames = audio[: frame_count * frame_length].reshape(frame_count, frame_length)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+
+
+def chunk_boundaries(
+    audio,
+    chunk_seconds=30,
+    overlap_seconds=0.0,
+    search_seconds=3.0,
+    sample_rate=SAMPLE_RATE,
+):
+    """
+    Split audio into chunks of at most `chunk_seconds`, cutting at the quietest
+    frame of the last `search_seconds` before each nominal boundary so that cuts
+    fall between words where possible.
+
+    Args:
+        audio (np.ndarray): Mono float32 samples.
+        chunk_seconds (float, optional): The maximum chunk length.
+        overlap_seconds (float, optional): How far each chunk reaches back before
+            its cut, so that words cut anyway appear whole in one of two chunks.
+        search_seconds (float, optional): How far before the nominal boundary to
+            look for a quiet cut.
+        sample_rate (int, optional): The sample rate of the audio.
+
+    Returns:
+        list: (start, cut, end) sample indices per chunk, where `cut` is the start
+            of the chunk without its overlap.
+    """
+    total = len(audio)
+    chunk_length = int(chunk_seconds * sample_rate)
+    if total <= chunk_length:
+        return [(0, 0, total)]
+
+    frame_length = int(FRAME_SECONDS * sample_rate)
+    rms = frame_rms(audio, frame_length)
+    search_length = min(int(search_seconds * sample_rate), chunk_length // 2)
+
+    cuts = [0]
+    while total - cuts[-1] > chunk_length:
+        target = cuts[-1] + chunk_length
+        first_frame = (target - search_length) // frame_length
+        last_frame = target // frame_length
+        if last_frame > first_frame:
+            quietest = first_frame + int(np.argmin(rms[first_frame:last_frame]))
+            cuts.append(quietest * frame_length)
+        else:
+            cuts.append(target)
+    cuts.append(total)
+
+    overlap = int(overlap_seconds * sample_rate)
+    return [(max(cut - overlap, 0), cut, end) for cut, end in zip(cuts[:-1], cuts[1:])]
+
+
+def frame_zcr(audio, frame_length):
+    """
+    Compute the zero-crossing rate of consecutive frames of audio.
+
+    Returns:
+        np.ndarray: The share of sample pairs changing sign, per complete frame.
+    """
+    frame_count = len(audio) // frame_length
+    signs = np.signbit(audio[: frame_count * frame_length]).reshape(
+        frame_count, frame_length
+    )
+    return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+
+def detect_speech(
+    audio,
+    min_silence_seconds=0.5,
+    min_speech_seconds=0.1,
+    padding_seconds=0.2,
+    sample_rate=SAMPLE_RATE,
+):
+    """
+    Find the parts of audio that contain speech from frame energy and zero-crossing
+    features.
+
+    Args:
+        audio (np.ndarray): Mono float32 samples.
+        min_silence_seconds (float, optional): Pauses shorter than this are kept
+            within the surrounding speech.
+        min_speech_seconds (float, optional): Bursts shorter than this are
+            treated as noise.
+        padding_seconds (float, optional): How much audio to keep around speech.
+        sample_rate (int, optional): The sample rate of the audio.
+
+    Returns:
+        list: (start, end) sample indices of the speech regions, in order.
+    """
+    frame_length = int(FRAME_SECONDS * sample_rate)
+    if len(audio) < frame_length:
+        return []
+
+    level = 20 * np.log10(np.maximum(frame_rms(audio, frame_length), 1e-10))
+    noise_floor, loud = np.percentile(level, [10, 95])
+    threshold = max(
+        min(noise_floor + SPEECH_MARGIN_DB, loud - SPEECH_RANGE_DB), SILENCE_FLOOR_DB
+    )
+    speech = (level > threshold) | (
+        (frame_zcr(audio, frame_length) > UNVOICED_ZCR)
+        & (level > threshold - UNVOICED_MARGIN_DB)
+    )
+
+    # Start and end frames of each run of speech frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], speech, [False]))))
+    starts, ends = edges[0::2], edges[1::2]
+
+    keep = ends - starts >= min_speech_seconds / FRAME_SECONDS
+    padding = int(padding_seconds / FRAME_SECONDS)
+    starts, ends = starts[keep] - padding, ends[keep] + padding
+    if not len(starts):
+        return []
+
+    # Join regions separated by short pauses, including overlapping ones
+    breaks = starts[1:] - ends[:-1] >= min_silence_seconds / FRAME_SECONDS
+    starts = starts[np.concatenate(([True], breaks))]
+    ends = ends[np.concatenate((breaks, [True]))]
+
+    total = len(audio)
+    return [
+        (max(start * frame_length, 0), min(end * frame_length, total))
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+
+def remove_silence(audio, regions):
+    """
+    Join the speech regions of audio, dropping the silence between them.
+
+    Returns:
+        tuple: The speech samples and an array of (speech start, original start)
+            sample indices per region, for `original_time`.
+    """
+    lengths = np.array([end - start for start, end in regions])
+    offsets = np.stack(
+        (np.concatenate(([0], np.cumsum(lengths)[:-1])), [s for s, _ in regions]),
+        axis=1,
+    )
+    speech = np.concatenate([audio[start:end] for start, end in regions])
+    return speech, offsets
+
+
+def original_time(seconds, offsets, sample_rate=SAMPLE_RATE):
+    """
+    Map times in audio returned by `remove_silence` back to the original audio.
+    """
+    position = np.asarray(seconds) * sample_rate
+    index = np.maximum(np.searchsorted(offsets[:, 0], position, side="right") - 1, 0)
+    return (position - offsets[index, 0] + offsets[index, 1]) / sample_rate
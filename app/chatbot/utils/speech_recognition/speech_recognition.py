@@ -1,52 +1,98 @@
-from multiprocessing import Pool
-import functools
+import hashlib
+
+import numpy as np
 import tenacity
 from flask import current_app
 
 from app.chatbot.utils.speech_recognition.audio_processing import (
-    convert_to_wav,
-    split_audio,
+    SAMPLE_RATE,
+    decode_audio,
 )
+from app.utils.cache import TieredCache
+
+# The models each language is transcribed with, by model manager name. Languages
+# are keyed by their lowercase name
+SPEECH_MODELS = {
+    "yoruba": ("whisper_yoruba_processor", "whisper_yoruba_model"),
+    "fon": ("whisper_fon_processor", "whisper_fon_model"),
+}
+DEFAULT_SPEECH_MODELS = ("whisper_base_model",)
+
+# The checkpoint each language is transcribed with. Transcripts are cached per
+# checkpoint, so changing one here invalidates its cached transcripts.
+SPEECH_MODEL_VERSIONS = {
+    "yoruba": "neoform-ai/whisper-medium-yoruba",
+    "fon": "chrisjay/fonxlsr",
+}
+DEFAULT_SPEECH_MODEL_VERSION = "openai-whisper-base"
+
+_transcription_cache = None
+
+
+def speech_models(language):
+    """Return the names of the models used to transcribe a language."""
+    return SPEECH_MODELS.get(language, DEFAULT_SPEECH_MODELS)
+
+
+def get_transcription_cache():
+    global _transcription_cache
+    if _transcription_cache is None:
+        _transcription_cache = TieredCache(
+            "transcription",
+            maxsize=current_app.config["TRANSCRIPTION_CACHE_SIZE"],
+            ttl=current_app.config["TRANSCRIPTION_CACHE_TTL"],
+            redis_ttl=current_app.config["TRANSCRIPTION_CACHE_REDIS_TTL"],
+        )
+    return _transcription_cache
+
+
+def transcription_cache_key(audio, language):
+    """Key a transcript by the decoded audio, its language and the model version."""
+    digest = hashlib.sha256(np.ascontiguousarray(audio, np.float32).data).hexdigest()
+    model_version = SPEECH_MODEL_VERSIONS.get(language, DEFAULT_SPEECH_MODEL_VERSION)
+    return f"{model_version}:{language}:{digest}"
 
 
-@functools.lru_cache(maxsize=None)
 @tenacity.retry(
     stop=tenacity.stop_after_attempt(3),
     wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
 )
-def transcribe_audio(audio_path: str, language: str) -> str:
-    """Transcribes an audio segment using the Whisper model.
+def transcribe_audio(audio: np.ndarray, language: str, model) -> list:
+    """Transcribes audio using the Whisper model.
 
     Args:
-        audio_path (str): Path to the audio segment.
+        audio (np.ndarray): 16 kHz mono float32 samples.
         language (str): Language of the audio
+        model: The Whisper model.
 
     Returns:
-        str: The transcribed text.
+        list: The transcribed segments, as dicts with `start`, `end` and `text`.
 
     Raises:
         Exception: If the transcription process encounters an error.
     """
     try:
-        transcript = current_app.whisper_base_model.transcribe(
-            audio_path, language=language
-        )
-        return transcript["text"]
+        transcript = model.transcribe(audio, language=language)
+        return [
+            {"start": s["start"], "end": s["end"], "text": s["text"].strip()}
+            for s in transcript["segments"]
+        ]
     except Exception as e:
         print(f"Error transcribing audio: {e}")
         raise
 
 
-@functools.lru_cache(maxsize=None)
 @tenacity.retry(
     stop=tenacity.stop_after_attempt(3),
     wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
 )
-def transcribe_yoruba(audio_path: str) -> str:
-    """Transcribes a Yoruba audio segment.
+def transcribe_yoruba(audio: np.ndarray, processor, model) -> str:
+    """Transcribes Yoruba audio with the Yoruba Whisper seq2seq model.
 
     Args:
-        audio_path (str): Path to the audio segment.
+        audio (np.ndarray): 16 kHz mono float32 samples.
+        processor: The Yoruba Whisper processor.
+        model: The Yoruba Whisper model.
 
     Returns:
         str: The transcribed text.
@@ -54,24 +100,33 @@ def transcribe_yoruba(audio_path: str) -> str:
     Raises:
         Exception: If the transcription process encounters an error.
     """
+    import torch
+
     try:
-        transcript = current_app.whisper_yoruba_model(audio_path)["text"]
-        return transcript
+        features = processor(
+            audio, sampling_rate=SAMPLE_RATE, return_tensors="pt"
+        ).input_features
+        with torch.inference_mode():
+            generated_ids = model.generate(features.to(model.dtype))
+        return processor.batch_decode(generated_ids, skip_special_tokens=True)[
+            0
+        ].strip()
     except Exception as e:
         print(f"Error transcribing Yoruba audio: {e}")
         raise
 
 
-@functools.lru_cache(maxsize=None)
 @tenacity.retry(
     stop=tenacity.stop_after_attempt(3),
     wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
 )
-def transcribe_fon(audio_path: str) -> str:
-    """Transcribes a Fon audio segment.
+def transcribe_fon(audio: np.ndarray, processor, model) -> str:
+    """Transcribes Fon audio with the Fon CTC model.
 
     Args:
-        audio_path (str): Path to the audio segment.
+        audio (np.ndarray): 16 kHz mono float32 samples.
+        processor: The Fon processor.
+        model: The Fon CTC model.
 
     Returns:
         str: The transcribed text.
@@ -79,40 +134,85 @@ def transcribe_fon(audio_path: str) -> str:
     Raises:
         Exception: If the transcription process encounters an error.
     """
+    import torch
+
     try:
-        transcript = current_app.whisper_fon_model(audio_path)["text"]
-        return transcript
+        values = processor(
+            audio, sampling_rate=SAMPLE_RATE, return_tensors="pt"
+        ).input_values
+        with torch.inference_mode():
+            logits = model(values).logits
+        return processor.batch_decode(torch.argmax(logits, dim=-1))[0].strip()
     except Exception as e:
         print(f"Error transcribing Fon audio: {e}")
         raise
 
 
-def transcribe(audio_path: str, language: str) -> str:
-    """Transcribes an audio file by splitting it into segments
-    and transcribing each segment in parallel.
+def transcribe_segments(audio: np.ndarray, language: str, get_model) -> list:
+    """Transcribes audio with the models for its language.
+
+    The Yoruba and Fon models do not produce timestamps, so their transcript is
+    returned as a single segment spanning the whole audio.
 
     Args:
-        audio_path (str): Path to the audio file.
+        audio (np.ndarray): 16 kHz mono float32 samples.
         language (str): Language of the audio
+        get_model (callable): Returns a loaded model given its name.
 
     Returns:
-        str: The complete transcribed text.
+        list: The transcribed segments, as dicts with `start`, `end` and `text`.
+    """
+    if language == "yoruba":
+        text = transcribe_yoruba(
+            audio,
+            get_model("whisper_yoruba_processor"),
+            get_model("whisper_yoruba_model"),
+        )
+    elif language == "fon":
+        text = transcribe_fon(
+            audio, get_model("whisper_fon_processor"), get_model("whisper_fon_model")
+        )
+    else:
+        return transcribe_audio(audio, language, get_model("whisper_base_model"))
+    return [{"start": 0.0, "end": len(audio) / SAMPLE_RATE, "text": text}]
 
-    Raises:
-        Exception: If the transcription process encounters an error.
+
+def transcribe(audio: np.ndarray, language: str) -> str:
+    """Transcribes audio of any length by splitting it into chunks that are
+    transcribed in parallel by the transcription engine.
+
+    Transcripts are cached by the content of the audio, so repeated or forwarded
+    voice messages are not transcribed again.
+
+    Args:
+        audio (np.ndarray): 16 kHz mono float32 samples.
+        language (str): Language of the audio, as named in LANGUAGE_MAP
+
+    Returns:
+        str: The complete transcribed text.
     """
-    try:
-        # Split audio into segments
-        segments = split_audio(audio_path)
+    from app.chatbot.utils.speech_recognition.transcription_engine import (
+        get_transcription_engine,
+    )
 
-        # Convert segments to WAV format
-        wav_segments = [convert_to_wav(segment) for segment in segments]
+    language = language.lower()
+    cache = get_transcription_cache()
+    cache_key = transcription_cache_key(audio, language)
+    transcript = cache.get(cache_key)
+    if transcript is None:
+        transcript = get_transcription_engine().transcribe(audio, language)
+        cache.set(cache_key, transcript)
+    return transcript
 
-        # Perform parallel transcription using multiprocessing
-        with Pool() as pool:
-            transcripts = pool.map(transcribe_audio, wav_segments)
 
-        return " ".join(transcripts)
-    except Exception as e:
-        print(f"Error transcribing video: {e}")
-        raise
+def transcribe_by_language(audio_data: bytes, language: str) -> str:
+    """Transcribes an uploaded audio file with the model for its language.
+
+    Args:
+        audio_data (bytes): The contents of the audio file.
+        language (str): Language of the audio
+
+    Returns:
+        str: The transcribed text.
+    """
+    return transcribe(decode_audio(audio_data), language)
@@ -0,0 +1,240 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+from logger import configure_logger
+from app.chatbot.utils.speech_recognition.audio_processing import (
+    SAMPLE_RATE,
+    chunk_boundaries,
+    detect_speech,
+    original_time,
+    remove_silence,
+)
+from app.chatbot.utils.speech_recognition.speech_recognition import (
+    transcribe_segments,
+)
+from app.extensions import model_manager
+from app.metrics import log_vad
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Models loaded by a pool worker process, by model manager name
+_worker_models = {}
+
+
+def _init_worker(torch_threads):
+    import torch
+
+    torch.set_num_threads(torch_threads)
+
+
+def _get_worker_model(name):
+    model = _worker_models.get(name)
+    if model is None:
+        import app
+
+        loaders = {
+            "whisper_base_model": app.load_whisper_base_model,
+            "whisper_yoruba_processor": app.load_whisper_yoruba_processor,
+            "whisper_yoruba_model": app.load_whisper_yoruba_model,
+            "whisper_fon_processor": app.load_whisper_fon_processor,
+            "whisper_fon_model": app.load_whisper_fon_model,
+        }
+        model = _worker_models[name] = loaders[name](None)
+    return model
+
+
+def _transcribe_chunk(audio, language):
+    return transcribe_segments(audio, language, _get_worker_model)
+
+
+class TranscriptionEngine:
+    """
+    Transcribes long audio by cutting it into chunks at quiet points and
+    transcribing the chunks in parallel on a persistent pool of worker processes,
+    each of which loads the speech models once.
+
+    Whisper chunks overlap by `overlap_seconds` and their timestamped segments are
+    merged at the middle of each overlap. The other models do not produce
+    timestamps, so their chunks do not overlap.
+
+    With `vad` enabled, silence is detected and removed before chunking, and the
+    segment timestamps are mapped back to the original audio.
+
+    Daemonic processes, such as Celery prefork workers, cannot have children, so
+    transcription tasks are routed to the "transcription" queue, whose worker runs
+    with the threads pool. In a daemonic process, or if the pool cannot be
+    started, chunks are transcribed one after the other with the models of the
+    model manager.
+    """
+
+    # Runs in the pool workers, so it has to be importable by reference
+    transcribe_chunk = staticmethod(_transcribe_chunk)
+
+    def __init__(self, workers=2, chunk_seconds=30, overlap_seconds=1.0, vad=True):
+        self.workers = workers
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.vad = vad
+        self._pool = None
+        self._pool_failed = workers <= 1
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Tasks of a threads pool worker share the engine
+        with self._pool_lock:
+            if self._pool is None and not self._pool_failed:
+                if multiprocessing.current_process().daemon:
+                    logger.warning(
+                        "Transcribing chunks one at a time: daemonic processes"
+                        " cannot start the pool. Run the transcription queue with"
+                        " --pool=threads."
+                    )
+                    self._pool_failed = True
+                    return None
+                try:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(max((os.cpu_count() or 1) // self.workers, 1),),
+                    )
+                except (AssertionError, OSError) as e:
+                    logger.warning(f"Transcribing in-process, pool unavailable: {e}")
+                    self._pool_failed = True
+            return self._pool
+
+    def transcribe(self, audio, language):
+        """
+        Transcribe audio of any length.
+
+        Args:
+            audio (np.ndarray): 16 kHz mono float32 samples.
+            language (str): The language of the audio.
+
+        Returns:
+            str: The transcript.
+        """
+        segments = self.transcribe_segments(audio, language)
+        return " ".join(segment["text"] for segment in segments if segment["text"])
+
+    def transcribe_segments(self, audio, language):
+        """
+        Transcribe audio of any length into segments with absolute timestamps.
+
+        Returns:
+            list: The segments, as dicts with `start`, `end` and `text`.
+        """
+        offsets = None
+        if self.vad:
+            regions = detect_speech(audio)
+            total_seconds = len(audio) / SAMPLE_RATE
+            if not regions:
+                log_vad(total_seconds, 0)
+                return []
+            audio, offsets = remove_silence(audio, regions)
+            log_vad(total_seconds, len(audio) / SAMPLE_RATE)
+
+        overlap_seconds = 0 if language in ("yoruba", "fon") else self.overlap_seconds
+        chunks = chunk_boundaries(audio, self.chunk_seconds, overlap_seconds)
+
+        results = None
+        pool = self._get_pool()
+        if pool is not None:
+            try:
+                futures = [
+                    pool.submit(self.transcribe_chunk, audio[start:end], language)
+                    for start, _, end in chunks
+                ]
+                results = [future.result() for future in futures]
+            except AssertionError as e:
+                # Starting the worker processes fails at the first submit
+                logger.warning(f"Transcribing in-process, pool unavailable: {e}")
+                self.shutdown()
+                self._pool_failed = True
+            except BrokenProcessPool as e:
+                logger.error(f"Transcription pool failed, restarting it: {e}")
+                self._pool = None
+                raise
+        if results is None:
+            results = [
+                transcribe_segments(audio[start:end], language, model_manager.get)
+                for start, _, end in chunks
+            ]
+
+        segments = merge_segments(chunks, results, overlap_seconds)
+        if offsets is not None and segments:
+            starts = original_time([segment["start"] for segment in segments], offsets)
+            ends = original_time([segment["end"] for segment in segments], offsets)
+            for segment, start, end in zip(segments, starts, ends):
+                segment["start"], segment["end"] = float(start), float(end)
+        return segments
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def merge_segments(chunks, results, overlap_seconds):
+    """
+    Merge the segments of overlapping chunks into one timeline.
+
+    A segment in the overlap between two chunks is kept from the earlier chunk if
+    it starts in the first half of the overlap and from the later chunk otherwise,
+    so that words heard by both chunks are transcribed once.
+
+    Args:
+        chunks (list): (start, cut, end) sample indices per chunk.
+        results (list): The segments of each chunk, with times relative to the
+            chunk start.
+        overlap_seconds (float): The overlap between consecutive chunks.
+
+    Returns:
+        list: The segments with absolute times.
+    """
+    merged = []
+    half_overlap = overlap_seconds / 2
+    for index, ((start, cut, _), segments) in enumerate(zip(chunks, results)):
+        offset = start / SAMPLE_RATE
+        lower = cut / SAMPLE_RATE - half_overlap if index > 0 else float("-inf")
+        upper = (
+            chunks[index + 1][1] / SAMPLE_RATE - half_overlap
+            if index + 1 < len(chunks)
+            else float("inf")
+        )
+        for segment in segments:
+            segment_start = segment["start"] + offset
+            if lower <= segment_start < upper:
+                merged.append(
+                    {
+                        "start": segment_start,
+                        "end": segment["end"] + offset,
+                        "text": segment["text"],
+                    }
+                )
+    return merged
+
+
+def get_transcription_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TranscriptionEngine(
+                    workers=current_app.config["TRANSCRIPTION_WORKERS"],
+                    chunk_seconds=current_app.config["TRANSCRIPTION_CHUNK_SECONDS"],
+                    overlap_seconds=current_app.config[
+                        "TRANSCRIPTION_CHUNK_OVERLAP_SECONDS"
+                    ],
+                    vad=current_app.config["TRANSCRIPTION_VAD"],
+                )
+    return _engine
@@ -1,9 +1,11 @@
+import hashlib
 import logging
-from mmtafrica.mmtafrica import translate, load_params
-from functools import lru_cache
 from flask import current_app
+from nltk.tokenize import sent_tokenize
 
 from logger import configure_logger
+from app.extensions import model_manager
+from app.utils.cache import TieredCache
 from app.utils.utils import handle_translation_error, validate_text
 
 logger = configure_logger(log_level=logging.DEBUG, log_file="logs/translation.log")
@@ -19,6 +21,25 @@ LANGUAGE_MAP = {
     "French": "fr",
 }
 
+_translation_cache = None
+
+
+def get_translation_cache():
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TieredCache(
+            "translation",
+            maxsize=current_app.config["TRANSLATION_CACHE_SIZE"],
+            ttl=current_app.config["TRANSLATION_CACHE_TTL"],
+            redis_ttl=current_app.config["TRANSLATION_CACHE_REDIS_TTL"],
+        )
+    return _translation_cache
+
+
+def translation_cache_key(source_lang_code, target_lang_code, sentence):
+    digest = hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+    return f"{source_lang_code}:{target_lang_code}:{digest}"
+
 
 class TranslationService:
     """
@@ -33,6 +54,8 @@ class TranslationService:
         Returns:
             dict: The loaded model parameters.
         """
+        from mmtafrica.mmtafrica import load_params
+
         try:
             checkpoint = "ai_models/mmt_translation.pt"
             params = load_params({"checkpoint": checkpoint, "device": device})
@@ -41,7 +64,6 @@ class TranslationService:
             raise Exception(f"Failed to load MMTAFRICA model: {e}") from e
 
     @classmethod
-    @lru_cache(maxsize=128)
     def get_translation(cls, source_lang, target_lang, source_text):
         """
         Translate the given source text from the source language to the target language.
@@ -59,13 +81,176 @@ class TranslationService:
         except ValueError as e:
             return handle_translation_error(e)
 
+        return cls.translate_batch(source_lang, target_lang, [source_text])[0]
+
+    @classmethod
+    def translate_batch(cls, source_lang, target_lang, source_texts):
+        """
+        Translate several texts at once.
+
+        Every text is split into sentences and the distinct sentences of all the
+        texts are run through the model together as padded batches, so a long text
+        takes about as long as its longest sentence. The translated sentences are
+        then put back together in their original order.
+
+        Args:
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+            source_texts (list): The texts to translate.
+
+        Returns:
+            list: The translated texts, in the same order as `source_texts`.
+        """
         try:
             source_lang_code = LANGUAGE_MAP[source_lang]
             target_lang_code = LANGUAGE_MAP[target_lang]
-            translated_text = translate(
-                current_app.mmt_params, source_text, source_lang_code, target_lang_code
+            layouts = [split_sentences(text) for text in source_texts]
+            sentences = list(
+                dict.fromkeys(
+                    sentence
+                    for layout in layouts
+                    for line in layout
+                    for sentence in line
+                )
+            )
+
+            # Sentences already translated by any process are served from the
+            # shared cache; only the remaining ones go through the model.
+            cache = get_translation_cache()
+            keys = {
+                sentence: translation_cache_key(
+                    source_lang_code, target_lang_code, sentence
+                )
+                for sentence in sentences
+            }
+            cached = cache.get_many(list(keys.values()))
+            translations = {
+                sentence: cached[key] for sentence, key in keys.items() if key in cached
+            }
+            missing = [
+                sentence for sentence in sentences if sentence not in translations
+            ]
+            new_translations = dict(
+                zip(
+                    missing,
+                    cls._translate_sentences(
+                        missing, source_lang_code, target_lang_code
+                    ),
+                )
             )
-            return translated_text
+            if new_translations:
+                cache.set_many(
+                    {
+                        keys[sentence]: translation
+                        for sentence, translation in new_translations.items()
+                    }
+                )
+            translations.update(new_translations)
+            return [
+                "\n".join(
+                    " ".join(translations[sentence] for sentence in line)
+                    for line in layout
+                )
+                for layout in layouts
+            ]
         except Exception as e:
             logger.error(f"Issue with translation: {e}")
             raise Exception(f"Failed to translate text: {e}") from e
+
+    @classmethod
+    def _translate_sentences(cls, sentences, source_lang_code, target_lang_code):
+        if not sentences:
+            return []
+
+        params = model_manager.get("mmt_params")
+        try:
+            components = get_mmt_components(params)
+        except KeyError as e:
+            from mmtafrica.mmtafrica import translate
+
+            logger.warning(
+                f"Batched translation unavailable ({e}), translating serially"
+            )
+            return [
+                translate(params, sentence, source_lang_code, target_lang_code)
+                for sentence in sentences
+            ]
+
+        # Batch sentences of similar length together to keep padding small.
+        batch_size = current_app.config["TRANSLATION_BATCH_SIZE"]
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        translated = [None] * len(sentences)
+        for start in range(0, len(order), batch_size):
+            indices = order[start : start + batch_size]
+            outputs = generate_translations(
+                components, [sentences[i] for i in indices], target_lang_code
+            )
+            for i, output in zip(indices, outputs):
+                translated[i] = output
+        return translated
+
+
+def split_sentences(text):
+    """
+    Split text into lines and each line into sentences.
+
+    Returns:
+        list: One list of sentences per line of the text.
+    """
+    return [sent_tokenize(line) for line in text.split("\n")]
+
+
+def get_mmt_components(params):
+    """
+    Extract the tokenizer, model and generation settings from the MMTAFRICA params.
+
+    Raises:
+        KeyError: If the params do not expose what batched generation needs.
+    """
+
+    def get(name, default=None):
+        if isinstance(params, dict):
+            value = params.get(name, default)
+        else:
+            value = getattr(params, name, default)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    try:
+        lang_token_map = get("lang_token_map")
+    except KeyError:
+        lang_token_map = get("LANG_TOKEN_MAPPING")
+
+    return {
+        "tokenizer": get("tokenizer"),
+        "model": get("model"),
+        "lang_token_map": lang_token_map,
+        "device": get("device", "cpu"),
+        "max_seq_len": get("max_seq_len", 128),
+        "num_beams": get("num_beams", 1),
+    }
+
+
+def generate_translations(components, sentences, target_lang_code):
+    """
+    Translate a batch of sentences with a single padded generate call.
+    """
+    import torch
+
+    tokenizer = components["tokenizer"]
+    target_lang_token = components["lang_token_map"][target_lang_code]
+    encoded = tokenizer(
+        [target_lang_token + sentence for sentence in sentences],
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=components["max_seq_len"],
+    ).to(components["device"])
+    with torch.inference_mode():
+        output_tokens = components["model"].generate(
+            **encoded,
+            num_beams=components["num_beams"],
+            max_length=components["max_seq_len"],
+        )
+    return tokenizer.batch_decode(output_tokens, skip_special_tokens=True)
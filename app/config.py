@@ -28,12 +28,32 @@ class Config:
     REDIS_URL = os.environ.get("REDIS_URL")
 
     # Celery Configuration
+    # Without an inference engine or Ollama, each process that generates responses
+    # loads its own LLaVA, so the tasks that generate go to the "generation" queue,
+    # consumed by a single worker process, see the README
+    CELERY_GENERATION_QUEUE = os.environ.get(
+        "CELERY_GENERATION_QUEUE",
+        (
+            "celery"
+            if os.environ.get("LLAVA_ENGINE_ADDRESS")
+            or os.environ.get("LLM_BACKEND", "transformers") != "transformers"
+            else "generation"
+        ),
+    )
     CELERY = dict(
         broker_url=os.environ.get("REDIS_URL"),
         result_backend=os.environ.get("REDIS_URL"),
         task_ignore_result=True,
         broker_connection_retry_on_startup=True,
-        include=["app.tasks.tasks"],
+        include=["app.tasks.tasks", "app.tasks.chat_tasks"],
+        # Transcription starts a pool of worker processes, which the daemonic
+        # children of the prefork pool cannot have. Its queue is consumed by a
+        # worker with the threads pool, see the README
+        task_routes={
+            "transcribe_turn_task": {"queue": "transcription"},
+            "complete_chat_turn_task": {"queue": CELERY_GENERATION_QUEUE},
+            "summarize_conversation_task": {"queue": CELERY_GENERATION_QUEUE},
+        },
     )
 
     SWAGGER = {
@@ -51,6 +71,20 @@ class Config:
 
     PLANTID_DB_API_BASE_URL = os.environ.get("PLANTID_DB_API_BASE_URL")
 
+    # User lookups: timeouts in seconds, connection pool size, and the number of
+    # consecutive failures after which lookups stop for USER_API_RESET_TIMEOUT
+    USER_API_CONNECT_TIMEOUT = float(os.environ.get("USER_API_CONNECT_TIMEOUT", 2))
+    USER_API_READ_TIMEOUT = float(os.environ.get("USER_API_READ_TIMEOUT", 5))
+    USER_API_POOL_SIZE = int(os.environ.get("USER_API_POOL_SIZE", 20))
+    USER_API_FAILURE_THRESHOLD = int(os.environ.get("USER_API_FAILURE_THRESHOLD", 5))
+    USER_API_RESET_TIMEOUT = float(os.environ.get("USER_API_RESET_TIMEOUT", 30))
+
+    # Looked up users are cached in-process and in Redis for USER_CACHE_TTL
+    # seconds, and rejected users for USER_CACHE_NEGATIVE_TTL seconds
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 300))
+    USER_CACHE_NEGATIVE_TTL = int(os.environ.get("USER_CACHE_NEGATIVE_TTL", 30))
+
     # Redis for Token Blocklist
     JWT_BLOCKLIST_ENABLED = True
     JWT_BLOCKLIST_TOKEN_CHECKS = ["access", "refresh"]
@@ -62,6 +96,152 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
     ALLOWED_EXTENSIONS = {"wav", "jpg", "png"}
 
+    # Models loaded at startup by web and Celery workers; every other model is
+    # loaded the first time it is used. Models that are not pinned are evicted,
+    # least recently used first, once the loaded models exceed the memory budget.
+    WEB_WARM_MODELS = [
+        name
+        for name in os.environ.get(
+            "WEB_WARM_MODELS", "sentence_embedding_model,intent_index"
+        ).split(",")
+        if name
+    ]
+    # A worker of the "generation" queue can warm llava_model, see
+    # CELERY_GENERATION_QUEUE
+    CELERY_WARM_MODELS = [
+        name for name in os.environ.get("CELERY_WARM_MODELS", "").split(",") if name
+    ]
+    MODEL_MEMORY_BUDGET_MB = os.environ.get("MODEL_MEMORY_BUDGET_MB")
+
+    # Sentence embedding model and the on-disk cache of intent phrase embeddings
+    SENTENCE_EMBEDDING_MODEL = os.environ.get(
+        "SENTENCE_EMBEDDING_MODEL", "all-mpnet-base-v2"
+    )
+    INTENT_INDEX_CACHE_DIR = os.environ.get("INTENT_INDEX_CACHE_DIR")
+
+    # Backend that generates the chatbot responses: "transformers" runs LLaVA in
+    # this process or in the inference engine, "ollama" calls an Ollama-compatible
+    # server at OLLAMA_BASE_URL serving OLLAMA_MODEL, which keeps it loaded for
+    # OLLAMA_KEEP_ALIVE after each request
+    LLM_BACKEND = os.environ.get("LLM_BACKEND", "transformers")
+    OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+    OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llava:7b-v1.6-mistral-q4_0")
+    OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 2))
+    OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", 120))
+    OLLAMA_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", 20))
+    OLLAMA_FAILURE_THRESHOLD = int(os.environ.get("OLLAMA_FAILURE_THRESHOLD", 5))
+    OLLAMA_RESET_TIMEOUT = int(os.environ.get("OLLAMA_RESET_TIMEOUT", 30))
+    OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+    # LLaVA inference engine: a Unix socket path or "host:port". When unset, each
+    # worker loads its own copy of the model and generates in-process. The engine
+    # unpickles the requests it receives, so a "host:port" address also requires a
+    # secret LLAVA_ENGINE_AUTHKEY. Requests that get no reply within
+    # LLAVA_ENGINE_TIMEOUT seconds fail
+    LLAVA_ENGINE_ADDRESS = os.environ.get("LLAVA_ENGINE_ADDRESS")
+    LLAVA_ENGINE_AUTHKEY = os.environ.get("LLAVA_ENGINE_AUTHKEY")
+    LLAVA_ENGINE_TIMEOUT = float(os.environ.get("LLAVA_ENGINE_TIMEOUT", 300))
+    LLAVA_ENGINE_MAX_BATCH_SIZE = int(os.environ.get("LLAVA_ENGINE_MAX_BATCH_SIZE", 8))
+    LLAVA_ENGINE_BATCH_WINDOW_MS = int(
+        os.environ.get("LLAVA_ENGINE_BATCH_WINDOW_MS", 50)
+    )
+
+    # Precision of the LLaVA weights on CPU: float16, bfloat16, float32, int8
+    # (dynamic quantization), int4 (needs optimum-quanto) or auto (bfloat16 where
+    # the CPU supports it, int8 otherwise). LLAVA_TORCH_THREADS caps the threads
+    # of each process that runs the model; compare them with benchmark_llava.py
+    LLAVA_PRECISION = os.environ.get("LLAVA_PRECISION", "float16")
+    LLAVA_TORCH_THREADS = int(os.environ.get("LLAVA_TORCH_THREADS", 0)) or None
+
+    # Image features of the LLaVA vision tower are cached per image in memory, up
+    # to VISION_CACHE_MEMORY_MB, and in VISION_CACHE_DIR, up to VISION_CACHE_DISK_MB,
+    # so repeated photos skip the vision tower. A memory budget of 0 disables it
+    VISION_CACHE_MEMORY_MB = int(os.environ.get("VISION_CACHE_MEMORY_MB", 512))
+    VISION_CACHE_DIR = os.environ.get("VISION_CACHE_DIR")
+    VISION_CACHE_DISK_MB = int(os.environ.get("VISION_CACHE_DISK_MB", 4096))
+
+    # When generating in-process, the past key values of the last turn of active
+    # conversations are kept for CONVERSATION_KV_CACHE_TTL seconds, up to
+    # CONVERSATION_KV_CACHE_MB in total, and reused by the next turn. 0 disables it
+    CONVERSATION_KV_CACHE_MB = int(os.environ.get("CONVERSATION_KV_CACHE_MB", 2048))
+    CONVERSATION_KV_CACHE_TTL = int(os.environ.get("CONVERSATION_KV_CACHE_TTL", 600))
+
+    # Prompts include the most recent of the last CONTEXT_MAX_MESSAGES messages of
+    # a conversation that fit in CONTEXT_TOKEN_BUDGET tokens, after a summary of
+    # the older ones. Summaries are extended in the background with up to
+    # CONTEXT_SUMMARY_BATCH_SIZE messages at a time. Message token counts are cached
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1024))
+    CONTEXT_MAX_MESSAGES = int(os.environ.get("CONTEXT_MAX_MESSAGES", 20))
+    CONTEXT_SUMMARY_BATCH_SIZE = int(os.environ.get("CONTEXT_SUMMARY_BATCH_SIZE", 20))
+    CONTEXT_SUMMARY_MESSAGE_CHARACTERS = int(
+        os.environ.get("CONTEXT_SUMMARY_MESSAGE_CHARACTERS", 1000)
+    )
+    CONTEXT_SUMMARY_MAX_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_MAX_TOKENS", 150))
+    CONTEXT_SUMMARY_LOCK_TTL = int(os.environ.get("CONTEXT_SUMMARY_LOCK_TTL", 300))
+    MESSAGE_TOKEN_CACHE_SIZE = int(os.environ.get("MESSAGE_TOKEN_CACHE_SIZE", 10000))
+    MESSAGE_TOKEN_CACHE_TTL = int(os.environ.get("MESSAGE_TOKEN_CACHE_TTL", 86400))
+
+    # Number of sentences translated together in one padded batch
+    TRANSLATION_BATCH_SIZE = int(os.environ.get("TRANSLATION_BATCH_SIZE", 16))
+
+    # Translated sentences are cached in-process (size and TTL in seconds) and in
+    # Redis, where they are shared by every worker
+    TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", 4096))
+    TRANSLATION_CACHE_TTL = int(os.environ.get("TRANSLATION_CACHE_TTL", 3600))
+    TRANSLATION_CACHE_REDIS_TTL = int(
+        os.environ.get("TRANSLATION_CACHE_REDIS_TTL", 7 * 24 * 3600)
+    )
+
+    # Pre-translated static dialogue replies, built by `flask build-response-catalog`
+    RESPONSE_CATALOG_PATH = os.environ.get(
+        "RESPONSE_CATALOG_PATH", "ai_models/response_catalog.json"
+    )
+
+    # Chat persistence: "sync" writes each turn in the request, "async" hands the
+    # writes to a Celery task that retries them
+    CHAT_PERSISTENCE_MODE = os.environ.get("CHAT_PERSISTENCE_MODE", "sync")
+
+    # Voice messages are processed by Celery as background chat turns, whose
+    # status is kept for CHAT_TURN_TTL seconds. Uploads are handed to the workers
+    # through Redis for UPLOAD_SPOOL_TTL seconds before falling back to S3
+    CHAT_TURN_TTL = int(os.environ.get("CHAT_TURN_TTL", 3600))
+    CHAT_TURN_STREAM_TIMEOUT = int(os.environ.get("CHAT_TURN_STREAM_TIMEOUT", 120))
+    UPLOAD_SPOOL_TTL = int(os.environ.get("UPLOAD_SPOOL_TTL", 3600))
+
+    # Long audio is transcribed in chunks of TRANSCRIPTION_CHUNK_SECONDS that
+    # overlap by TRANSCRIPTION_CHUNK_OVERLAP_SECONDS, on a pool of
+    # TRANSCRIPTION_WORKERS processes that each load the speech models once.
+    # One worker transcribes in-process with the model manager's models. With
+    # TRANSCRIPTION_VAD, silence is removed before transcription
+    TRANSCRIPTION_WORKERS = int(
+        os.environ.get("TRANSCRIPTION_WORKERS", min(4, os.cpu_count() or 1))
+    )
+    TRANSCRIPTION_CHUNK_SECONDS = float(
+        os.environ.get("TRANSCRIPTION_CHUNK_SECONDS", 30)
+    )
+    TRANSCRIPTION_CHUNK_OVERLAP_SECONDS = float(
+        os.environ.get("TRANSCRIPTION_CHUNK_OVERLAP_SECONDS", 1.0)
+    )
+    TRANSCRIPTION_VAD = os.environ.get("TRANSCRIPTION_VAD", "true").lower() == "true"
+
+    # Transcripts are cached by audio content in-process for
+    # TRANSCRIPTION_CACHE_TTL seconds and in Redis for TRANSCRIPTION_CACHE_REDIS_TTL
+    TRANSCRIPTION_CACHE_SIZE = int(os.environ.get("TRANSCRIPTION_CACHE_SIZE", 1024))
+    TRANSCRIPTION_CACHE_TTL = int(os.environ.get("TRANSCRIPTION_CACHE_TTL", 3600))
+    TRANSCRIPTION_CACHE_REDIS_TTL = int(
+        os.environ.get("TRANSCRIPTION_CACHE_REDIS_TTL", 7 * 24 * 3600)
+    )
+
+    # Conversations are cached in Redis for this many seconds, unless their
+    # serialized size exceeds the limit in bytes
+    CONVERSATION_CACHE_TTL = int(os.environ.get("CONVERSATION_CACHE_TTL", 3600))
+    CONVERSATION_CACHE_MAX_BYTES = int(
+        os.environ.get("CONVERSATION_CACHE_MAX_BYTES", 16 * 1024)
+    )
+    CONVERSATION_CACHE_LOCK_TIMEOUT = float(
+        os.environ.get("CONVERSATION_CACHE_LOCK_TIMEOUT", 5)
+    )
+
     # Stability API credentials
     STABILITY_API_KEY = os.environ.get("STABILITY_API_KEY")
     STABILITY_API_HOST = os.environ.get("STABILITY_API_HOST")
@@ -1,4 +1,4 @@
-from mongoengine import connect
+from mongoengine import connect, disconnect
 
 
 def initialize_db(app):
@@ -10,3 +10,12 @@ def initialize_db(app):
     connect(
         host=f"mongodb+srv://{db_username}:{db_password}@{db_host}/{db_name}?retryWrites=true&w=majority&appName=Cluster0"
     )
+
+
+def reconnect_db(app):
+    """
+    Replace the MongoDB client inherited from a parent process, since MongoClient
+    is not fork-safe.
+    """
+    disconnect()
+    initialize_db(app)
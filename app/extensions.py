@@ -8,7 +8,7 @@ import boto3
 
 from app.managers.celery_manager import CeleryManager
 from app.managers.redis_manager import RedisManager
-
+from app.managers.model_manager import ModelManager
 
 s3 = boto3.client("s3", region_name=os.environ.get("AWS_REGION"))
 events = boto3.client("events", region_name=os.environ.get("AWS_REGION"))
@@ -17,6 +17,7 @@ jwt = JWTManager()
 session = Session()
 celery_manager = CeleryManager()
 redis_manager = RedisManager()
+model_manager = ModelManager()
 limiter = Limiter(
     key_func=lambda: (
         get_jwt_identity()
@@ -1,14 +1,48 @@
+import glob
+import logging
 import multiprocessing
+import os
 
 # Bind to a specific address and port
 bind = "0.0.0.0:5000"
 
 # Number of worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
 
 # Worker class
 worker_class = "sync"
 
+# Load the application, and with it the warm models, once in the master process.
+# Workers are forked from the master and share the model weights copy-on-write.
+preload_app = os.environ.get("GUNICORN_PRELOAD_APP", "false").lower() == "true"
+
+# Without an inference engine every worker generates with its own LLaVA, which is
+# most of its memory, so preload LLaVA too unless WEB_WARM_MODELS says otherwise
+if (
+    preload_app
+    and not os.environ.get("LLAVA_ENGINE_ADDRESS")
+    and os.environ.get("LLM_BACKEND", "transformers") == "transformers"
+):
+    os.environ.setdefault(
+        "WEB_WARM_MODELS", "sentence_embedding_model,intent_index,llava_model"
+    )
+
+# Also move the preloaded weights to shared memory
+share_model_memory = os.environ.get("GUNICORN_SHARE_MODEL_MEMORY", "").lower() == "true"
+
+# Port of the Prometheus metrics server, started once in the master. Workers write
+# their metrics to PROMETHEUS_MULTIPROC_DIR, which the server aggregates; it has to
+# be set before prometheus_client is first imported
+metrics_port = int(os.environ.get("METRICS_PORT", 7000))
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/plantid-prometheus")
+
+# Torch threads per worker, so that workers do not oversubscribe the CPU cores
+torch_threads = int(
+    os.environ.get(
+        "GUNICORN_TORCH_THREADS", max(multiprocessing.cpu_count() // workers, 1)
+    )
+)
+
 # Maximum number of requests a worker will process before restarting
 max_requests = 1000
 max_requests_jitter = 50
@@ -20,3 +54,69 @@ loglevel = "info"
 
 # Daemonize the Gunicorn process (detach & run in background)
 daemon = False
+
+
+def on_starting(server):
+    # Metrics of the processes of a previous run would otherwise be exported again
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(path)
+
+
+def when_ready(server):
+    from app.metrics import start_metrics_server
+
+    start_metrics_server(port=metrics_port)
+    server.log.info(f"Serving metrics on port {metrics_port}")
+
+    if not preload_app:
+        return
+
+    from app.extensions import model_manager
+
+    model_manager.prepare_for_fork(share_memory=share_model_memory)
+    for model in model_manager.report():
+        server.log.info(
+            "Preloaded {name}: {memory_mb} MB in {load_time}s".format(**model)
+        )
+
+
+def post_fork(server, worker):
+    try:
+        import torch
+
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    if preload_app:
+        # The connections opened by the master are not fork-safe
+        from app.database import reconnect_db
+        from app.extensions import redis_manager
+
+        reconnect_db(server.app.wsgi())
+        redis_manager.reset_connections()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    from app.utils.memory import read_memory_usage
+
+    try:
+        usage = read_memory_usage()
+    except OSError:
+        return
+    worker.log.log(
+        logging.INFO,
+        "Worker %s memory: rss=%.0f MB shared=%.0f MB private=%.0f MB",
+        worker.pid,
+        usage["rss"] / 1024 / 1024,
+        usage["shared"] / 1024 / 1024,
+        usage["private"] / 1024 / 1024,
+    )
@@ -0,0 +1,279 @@
+import base64
+import json
+import logging
+import time
+from io import BytesIO
+from threading import Thread
+
+from logger import configure_logger
+from app.extensions import model_manager
+from app.inference.client import InferenceClient, engine_authkey
+from app.inference.kv_cache import ConversationKVCache
+from app.metrics import log_upstream_latency
+from app.utils.http import CircuitBreaker, create_session
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/inference.log")
+
+
+class TransformersBackend:
+    """
+    Generates with the LLaVA model loaded in this process, or with the batching
+    inference engine when `engine_address` is set.
+
+    Prompts are prepared into LLaVA processor outputs. In-process generation
+    reuses the past key values of a conversation's previous turn when a
+    `kv_cache` is given.
+    """
+
+    def __init__(
+        self,
+        engine_address=None,
+        engine_authkey=None,
+        engine_timeout=300,
+        kv_cache=None,
+    ):
+        self.engine_client = (
+            InferenceClient(engine_address, engine_authkey, timeout=engine_timeout)
+            if engine_address
+            else None
+        )
+        self.kv_cache = kv_cache
+
+    @property
+    def device(self):
+        # With an inference engine the model lives in the engine process, which
+        # moves the inputs to its own device.
+        if self.engine_client:
+            return "cpu"
+        return model_manager.get("llava_model").device
+
+    def prepare(self, messages, image=None):
+        """
+        Build the inputs for a chat.
+
+        Args:
+            messages (list): Chat messages whose content is a list of text and
+                image parts, as accepted by chat templates.
+            image (PIL.Image.Image, optional): The image of the image part.
+
+        Returns:
+            BatchFeature: The LLaVA processor outputs.
+        """
+        processor = model_manager.get("llava_processor")
+        prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
+        return processor(text=prompt, images=image, return_tensors="pt").to(self.device)
+
+    def _generate_kwargs(self, llava_model, inputs, conversation_id):
+        kv_cache = self.kv_cache if conversation_id else None
+        generate_kwargs = dict(inputs)
+        if kv_cache is not None:
+            generate_kwargs, _ = kv_cache.take(
+                conversation_id, inputs, llava_model.config.image_token_index
+            )
+            generate_kwargs["return_dict_in_generate"] = True
+        return generate_kwargs, kv_cache
+
+    def generate(self, inputs, max_new_tokens=200, conversation_id=None):
+        if self.engine_client:
+            return self.engine_client.generate(inputs, max_new_tokens=max_new_tokens)
+
+        llava_model = model_manager.get("llava_model")
+        generate_kwargs, kv_cache = self._generate_kwargs(
+            llava_model, inputs, conversation_id
+        )
+        output = llava_model.generate(**generate_kwargs, max_new_tokens=max_new_tokens)
+        if kv_cache is not None:
+            kv_cache.store(conversation_id, output.sequences[0], output.past_key_values)
+            generated_ids = output.sequences
+        else:
+            generated_ids = output
+        new_tokens = generated_ids[:, inputs["input_ids"].shape[1] :]
+        response = model_manager.get("llava_processor").batch_decode(
+            new_tokens, skip_special_tokens=True
+        )[0]
+        return response.strip()
+
+    def stream(self, inputs, max_new_tokens=200, conversation_id=None):
+        """
+        Yield text chunks as the tokens are decoded. The inference engine does not
+        stream, so its response is yielded as a single chunk.
+        """
+        if self.engine_client:
+            yield self.generate(inputs, max_new_tokens=max_new_tokens)
+            return
+
+        from transformers import TextIteratorStreamer
+
+        llava_model = model_manager.get("llava_model")
+        streamer = TextIteratorStreamer(
+            model_manager.get("llava_processor").tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+        )
+        errors = []
+
+        generate_kwargs, kv_cache = self._generate_kwargs(
+            llava_model, inputs, conversation_id
+        )
+
+        def generate():
+            try:
+                output = llava_model.generate(
+                    **generate_kwargs, max_new_tokens=max_new_tokens, streamer=streamer
+                )
+                if kv_cache is not None:
+                    kv_cache.store(
+                        conversation_id, output.sequences[0], output.past_key_values
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=generate, daemon=True)
+        thread.start()
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        thread.join()
+        if errors:
+            raise errors[0]
+
+
+class OllamaBackend:
+    """
+    Generates with a model served by an Ollama-compatible server, over a pooled
+    keep-alive session with timeouts and a circuit breaker. Web workers then need
+    no model weights, and one optimized server is shared by all of them.
+    """
+
+    def __init__(self, base_url, model, timeout, pool_size, breaker, keep_alive):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.session = create_session(pool_size=pool_size)
+        self.breaker = breaker
+        self.keep_alive = keep_alive
+
+    def prepare(self, messages, image=None):
+        """
+        Convert chat messages to the Ollama format, attaching the image to the
+        message that refers to it.
+
+        Returns:
+            dict: The messages to send.
+        """
+        encoded_image = encode_image(image) if image is not None else None
+        ollama_messages = []
+        for message in messages:
+            texts = []
+            images = []
+            for part in message["content"]:
+                if part["type"] == "text":
+                    texts.append(part["text"])
+                elif part["type"] == "image" and encoded_image:
+                    images.append(encoded_image)
+            ollama_message = {"role": message["role"], "content": "\n".join(texts)}
+            if images:
+                ollama_message["images"] = images
+            ollama_messages.append(ollama_message)
+        return {"messages": ollama_messages}
+
+    def _post_chat(self, inputs, max_new_tokens, stream):
+        response = self.session.post(
+            f"{self.base_url}/api/chat",
+            json={
+                "model": self.model,
+                "messages": inputs["messages"],
+                "stream": stream,
+                "keep_alive": self.keep_alive,
+                "options": {"num_predict": max_new_tokens},
+            },
+            timeout=self.timeout,
+            stream=stream,
+        )
+        response.raise_for_status()
+        return response
+
+    def generate(self, inputs, max_new_tokens=200, conversation_id=None):
+        started = time.monotonic()
+        try:
+            response = self.breaker.call(self._post_chat, inputs, max_new_tokens, False)
+        finally:
+            log_upstream_latency("ollama", time.monotonic() - started)
+        return response.json()["message"]["content"].strip()
+
+    def stream(self, inputs, max_new_tokens=200, conversation_id=None):
+        """
+        Yield text chunks as the server streams them.
+        """
+        started = time.monotonic()
+        try:
+            response = self.breaker.call(self._post_chat, inputs, max_new_tokens, True)
+        finally:
+            log_upstream_latency("ollama", time.monotonic() - started)
+
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise Exception(f"Ollama error: {chunk['error']}")
+                text = chunk.get("message", {}).get("content")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    return
+
+
+def encode_image(image):
+    """Encode an image as base64 JPEG, as the Ollama API expects."""
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def create_backend(config):
+    """
+    Create the generation backend selected by LLM_BACKEND.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    backend = config["LLM_BACKEND"]
+    if backend == "transformers":
+        kv_cache = None
+        if (
+            config["CONVERSATION_KV_CACHE_MB"] > 0
+            and not config["LLAVA_ENGINE_ADDRESS"]
+        ):
+            kv_cache = ConversationKVCache(
+                config["CONVERSATION_KV_CACHE_MB"] * 1024 * 1024,
+                ttl=config["CONVERSATION_KV_CACHE_TTL"],
+            )
+        return TransformersBackend(
+            engine_address=config["LLAVA_ENGINE_ADDRESS"],
+            engine_authkey=(
+                engine_authkey(
+                    config["LLAVA_ENGINE_ADDRESS"], config["LLAVA_ENGINE_AUTHKEY"]
+                )
+                if config["LLAVA_ENGINE_ADDRESS"]
+                else None
+            ),
+            engine_timeout=config["LLAVA_ENGINE_TIMEOUT"],
+            kv_cache=kv_cache,
+        )
+    if backend == "ollama":
+        return OllamaBackend(
+            config["OLLAMA_BASE_URL"],
+            config["OLLAMA_MODEL"],
+            timeout=(config["OLLAMA_CONNECT_TIMEOUT"], config["OLLAMA_READ_TIMEOUT"]),
+            pool_size=config["OLLAMA_POOL_SIZE"],
+            breaker=CircuitBreaker(
+                "Ollama",
+                failure_threshold=config["OLLAMA_FAILURE_THRESHOLD"],
+                reset_timeout=config["OLLAMA_RESET_TIMEOUT"],
+            ),
+            keep_alive=config["OLLAMA_KEEP_ALIVE"],
+        )
+    raise ValueError(f"Unknown LLM backend {backend!r}")
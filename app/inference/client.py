@@ -0,0 +1,119 @@
+import threading
+from multiprocessing.connection import Client
+
+
+def parse_address(address):
+    """
+    Parse an engine address into a form accepted by multiprocessing.connection.
+
+    Args:
+        address (str): Either "host:port" for a TCP socket or a filesystem path
+            for a Unix domain socket.
+
+    Returns:
+        tuple or str: The parsed address.
+    """
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def engine_authkey(address, authkey):
+    """
+    Return the authkey to listen on or connect to an engine address with.
+
+    Connections unpickle whatever they receive, so an engine listening on TCP
+    without an authkey would run code sent by anyone who can reach its port.
+
+    Args:
+        address (str): The engine address.
+        authkey (str): The configured authkey, if any.
+
+    Returns:
+        bytes: The encoded authkey, or None for a Unix socket without one.
+
+    Raises:
+        ValueError: If a "host:port" address has no authkey.
+    """
+    if authkey:
+        return authkey.encode()
+    if isinstance(parse_address(address), tuple):
+        raise ValueError(
+            f"LLAVA_ENGINE_AUTHKEY must be set to use the TCP engine address {address}"
+        )
+    return None
+
+
+class InferenceClient:
+    """
+    Submits generation requests to a running LLaVA inference engine.
+
+    Each thread keeps its own connection, so concurrent requests from a worker
+    reach the engine in parallel and can be batched together. A request that gets
+    no reply within `timeout` seconds fails, and its connection is closed so that
+    a late reply is not read by the next request.
+    """
+
+    def __init__(self, address, authkey, timeout=300):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def _request(self, message):
+        connection = self._connection()
+        connection.send(message)
+        if not connection.poll(self.timeout):
+            self._reset()
+            raise TimeoutError(
+                f"Inference engine did not reply within {self.timeout} seconds"
+            )
+        return connection.recv()
+
+    def generate(self, inputs, max_new_tokens=200):
+        """
+        Generate a response for a single prompt.
+
+        Args:
+            inputs (dict): The LLaVA processor outputs for the prompt.
+            max_new_tokens (int, optional): The maximum number of tokens to generate.
+
+        Returns:
+            str: The generated text.
+
+        Raises:
+            TimeoutError: If the engine did not reply in time.
+        """
+        message = {
+            "inputs": {key: value.cpu() for key, value in inputs.items()},
+            "max_new_tokens": max_new_tokens,
+        }
+        try:
+            reply = self._request(message)
+        except TimeoutError:
+            raise
+        except (EOFError, OSError):
+            # The engine may have restarted; retry once on a fresh connection.
+            self._reset()
+            reply = self._request(message)
+
+        if "error" in reply:
+            raise Exception(f"Inference engine error: {reply['error']}")
+        return reply["text"]
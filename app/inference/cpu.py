@@ -0,0 +1,100 @@
+import logging
+
+import torch
+
+from logger import configure_logger
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/inference.log")
+
+# Precisions the LLaVA model can be served in. "auto" picks bfloat16 on CPUs with
+# native bfloat16 support and int8 elsewhere
+PRECISIONS = ("float16", "bfloat16", "float32", "int8", "int4", "auto")
+
+# Precisions whose weights are loaded in a float type and then quantized
+QUANTIZED_PRECISIONS = ("int8", "int4")
+
+# Modules left unquantized by int4, whose accuracy matters most for the images
+INT4_EXCLUDE = ["*vision_tower*", "*multi_modal_projector*", "lm_head"]
+
+
+def cpu_supports_bf16():
+    """Return whether the CPU has native bfloat16 instructions."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(
+                next(line for line in f if line.startswith("flags")).split()[2:]
+            )
+    except (OSError, StopIteration):
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+
+def resolve_precision(precision):
+    """
+    Validate a configured precision and resolve "auto" for this machine.
+
+    Raises:
+        ValueError: If the precision is unknown.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown LLaVA precision {precision!r}, expected one of {PRECISIONS}"
+        )
+    if precision == "auto":
+        return "bfloat16" if cpu_supports_bf16() else "int8"
+    return precision
+
+
+def load_dtype(precision):
+    """Return the dtype to load the weights in for a resolved precision."""
+    if precision == "float16":
+        return torch.float16
+    if precision == "bfloat16" or (precision == "int4" and cpu_supports_bf16()):
+        return torch.bfloat16
+    # Dynamic int8 quantization converts float32 linear layers
+    return torch.float32
+
+
+def configure_threads(threads):
+    """
+    Set the number of intra-op threads torch uses in this process. Processes
+    sharing a machine should split its cores between them rather than each use
+    all of them.
+    """
+    if not threads:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only possible before the first parallel operation of the process
+        pass
+
+
+def quantize_model(model, precision):
+    """
+    Quantize the weights of a model loaded with `load_dtype(precision)`.
+
+    int8 uses torch dynamic quantization of every linear layer. int4 quantizes
+    the language model weights with optimum-quanto, which has to be installed.
+
+    Returns:
+        The quantized model.
+    """
+    if precision == "int8":
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+    if precision == "int4":
+        try:
+            from optimum.quanto import freeze, qint4, quantize
+        except ImportError as e:
+            raise ImportError(
+                "int4 LLaVA precision requires optimum-quanto to be installed"
+            ) from e
+        quantize(model, weights=qint4, exclude=INT4_EXCLUDE)
+        freeze(model)
+        return model
+
+    return model
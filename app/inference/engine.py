@@ -0,0 +1,193 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Listener
+
+import torch
+
+from logger import configure_logger
+from app.inference.client import parse_address
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/inference.log")
+
+
+class GenerationRequest:
+    def __init__(self, inputs, max_new_tokens):
+        self.inputs = inputs
+        self.max_new_tokens = max_new_tokens
+        self.future = Future()
+
+    @property
+    def batch_key(self):
+        # Text-only and image prompts cannot share a LLaVA forward pass.
+        return "pixel_values" in self.inputs
+
+
+class BatchingEngine:
+    """
+    Owns a single LLaVA model and runs concurrent generation requests as padded
+    batches. Requests arriving within `batch_window` seconds of the first one are
+    grouped together, up to `max_batch_size` requests per batch.
+    """
+
+    def __init__(self, model, processor, max_batch_size=8, batch_window=0.05):
+        self.model = model
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.pad_token_id = processor.tokenizer.pad_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = processor.tokenizer.eos_token_id
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._worker.start()
+
+    def submit(self, inputs, max_new_tokens):
+        """
+        Queue a generation request.
+
+        Args:
+            inputs (dict): The processor outputs for a single prompt.
+            max_new_tokens (int): The maximum number of tokens to generate.
+
+        Returns:
+            Future: Resolves to the decoded response text.
+        """
+        request = GenerationRequest(inputs, max_new_tokens)
+        self._queue.put(request)
+        return request.future
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.batch_key, []).append(request)
+            for requests in groups.values():
+                self._generate(requests)
+
+    def _generate(self, requests):
+        try:
+            inputs = collate([r.inputs for r in requests], self.pad_token_id)
+            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+            max_new_tokens = max(r.max_new_tokens for r in requests)
+            started = time.time()
+            with torch.inference_mode():
+                generated_ids = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=self.pad_token_id,
+                )
+            new_tokens = generated_ids[:, inputs["input_ids"].shape[1] :]
+            logger.info(
+                f"Generated batch of {len(requests)} in {time.time() - started:.2f}s"
+            )
+            for request, tokens in zip(requests, new_tokens):
+                text = self.processor.decode(
+                    tokens[: request.max_new_tokens], skip_special_tokens=True
+                )
+                request.future.set_result(text.strip())
+        except Exception as e:
+            logger.error(f"Error generating batch: {e}")
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+
+def collate(inputs_list, pad_token_id):
+    """
+    Merge single-prompt processor outputs into one left-padded batch.
+
+    Args:
+        inputs_list (list): A list of dicts of tensors, each with a batch size of 1.
+        pad_token_id (int): The token ID used for padding.
+
+    Returns:
+        dict: The batched tensors.
+    """
+    max_length = max(inputs["input_ids"].shape[1] for inputs in inputs_list)
+    input_ids = []
+    attention_mask = []
+    for inputs in inputs_list:
+        ids = inputs["input_ids"]
+        mask = inputs.get("attention_mask", torch.ones_like(ids))
+        padding = max_length - ids.shape[1]
+        input_ids.append(torch.nn.functional.pad(ids, (padding, 0), value=pad_token_id))
+        attention_mask.append(torch.nn.functional.pad(mask, (padding, 0), value=0))
+
+    batch = {
+        "input_ids": torch.cat(input_ids),
+        "attention_mask": torch.cat(attention_mask),
+    }
+
+    if "pixel_values" in inputs_list[0]:
+        # LLaVA-Next pixel values are (batch, patches, channels, height, width); the
+        # model uses image_sizes to ignore the zero patches added here.
+        max_patches = max(inputs["pixel_values"].shape[1] for inputs in inputs_list)
+        pixel_values = []
+        for inputs in inputs_list:
+            values = inputs["pixel_values"]
+            padding = max_patches - values.shape[1]
+            if padding:
+                zeros = values.new_zeros((values.shape[0], padding, *values.shape[2:]))
+                values = torch.cat([values, zeros], dim=1)
+            pixel_values.append(values)
+        batch["pixel_values"] = torch.cat(pixel_values)
+        batch["image_sizes"] = torch.cat(
+            [inputs["image_sizes"] for inputs in inputs_list]
+        )
+
+    return batch
+
+
+def serve(engine, address, authkey):
+    """
+    Accept connections from web workers and answer their generation requests.
+
+    Each connection carries one request at a time; a client thread sends a dict
+    with `inputs` and `max_new_tokens` and receives a dict with either `text` or
+    `error`.
+    """
+    engine.start()
+    with Listener(parse_address(address), authkey=authkey) as listener:
+        logger.info(f"LLaVA inference engine listening on {address}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                logger.error(f"Error accepting connection: {e}")
+                continue
+            threading.Thread(
+                target=_handle_connection, args=(engine, connection), daemon=True
+            ).start()
+
+
+def _handle_connection(engine, connection):
+    with connection:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                future = engine.submit(message["inputs"], message["max_new_tokens"])
+                connection.send({"text": future.result()})
+            except Exception as e:
+                connection.send({"error": str(e)})
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Reusing fewer cached tokens than this saves less than the bookkeeping costs
+MIN_REUSED_TOKENS = 16
+
+
+def cache_bytes(past_key_values):
+    """Return the memory held by the key and value tensors of a cache."""
+    total = 0
+    for index in range(len(past_key_values)):
+        for tensor in past_key_values[index]:
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def common_prefix_length(cached_ids, input_ids):
+    length = min(len(cached_ids), len(input_ids))
+    mismatches = (cached_ids[:length] != input_ids[:length]).nonzero()
+    return int(mismatches[0]) if len(mismatches) else length
+
+
+class KVCacheEntry:
+    def __init__(self, token_ids, past_key_values):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.size = cache_bytes(past_key_values)
+        self.stored_at = time.monotonic()
+
+
+class ConversationKVCache:
+    """
+    Keeps the past key values of the last turn of active conversations, so the
+    next turn of a conversation only encodes the tokens its prompt does not
+    share with the previous prompt and response.
+
+    Entries are evicted least recently used first when their total size exceeds
+    `max_bytes`, and expire `ttl` seconds after they were stored. An entry is
+    taken out of the cache while a turn uses it, since generation extends it in
+    place.
+    """
+
+    def __init__(self, max_bytes, ttl=600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def take(self, conversation_id, inputs, image_token_index=None):
+        """
+        Find the cached prefix of a prompt and remove it from the cache.
+
+        Args:
+            conversation_id (str): The conversation of the prompt.
+            inputs (dict): The processor outputs for the prompt, with a batch size
+                of 1.
+            image_token_index (int, optional): The token ID of image features.
+
+        Returns:
+            tuple: The inputs to generate with, including the cropped past key
+                values when a prefix was reused, and the number of reused tokens.
+        """
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._total_bytes -= entry.size
+        if entry is None or time.monotonic() - entry.stored_at > self.ttl:
+            return inputs, 0
+
+        input_ids = inputs["input_ids"][0].cpu()
+        # At least one token has to be encoded to generate from
+        prefix_length = min(
+            common_prefix_length(entry.token_ids, input_ids), len(input_ids) - 1
+        )
+
+        if "pixel_values" in inputs:
+            # Image features are only merged when the prompt is encoded from its
+            # first token, so every image token has to be in the reused prefix.
+            image_positions = (input_ids == image_token_index).nonzero()
+            if len(image_positions) and int(image_positions[-1]) >= prefix_length:
+                return inputs, 0
+
+        if prefix_length < MIN_REUSED_TOKENS:
+            return inputs, 0
+
+        entry.past_key_values.crop(prefix_length)
+        inputs = {
+            key: value
+            for key, value in inputs.items()
+            if key not in ("pixel_values", "image_sizes")
+        }
+        inputs["past_key_values"] = entry.past_key_values
+        return inputs, prefix_length
+
+    def store(self, conversation_id, sequence, past_key_values):
+        """
+        Cache the past key values of a finished generation.
+
+        Args:
+            conversation_id (str): The conversation of the generation.
+            sequence (torch.Tensor): The prompt and generated token IDs.
+            past_key_values: The cache returned by `generate`.
+        """
+        cached_length = past_key_values.get_seq_length()
+        entry = KVCacheEntry(sequence[:cached_length].cpu(), past_key_values)
+        if entry.size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(conversation_id, None)
+            if previous is not None:
+                self._total_bytes -= previous.size
+            self._entries[conversation_id] = entry
+            self._total_bytes += entry.size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+
+    def discard(self, conversation_id):
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._total_bytes -= entry.size
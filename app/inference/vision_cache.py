@@ -0,0 +1,241 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+from logger import configure_logger
+from app.metrics import log_cache_hit, log_cache_miss
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/inference.log")
+
+CACHE_NAME = "vision_features"
+
+
+def perceptual_hash(pixel_values):
+    """
+    Compute a 64-bit difference hash of the overview patch of a LLaVA-Next image.
+
+    Args:
+        pixel_values (torch.Tensor): The (patches, channels, height, width) pixel
+            values of one image, starting with the resized full image.
+
+    Returns:
+        str: The hash as 16 hex digits.
+    """
+    gray = pixel_values[0].float().mean(dim=0, keepdim=True)
+    small = torch.nn.functional.adaptive_avg_pool2d(gray, (8, 9))[0]
+    bits = (small[:, 1:] > small[:, :-1]).flatten().tolist()
+    return f"{sum(1 << i for i, bit in enumerate(bits) if bit):016x}"
+
+
+def content_hash(pixel_values, *parts):
+    digest = hashlib.sha256()
+    digest.update(pixel_values.detach().cpu().contiguous().view(torch.uint8).numpy())
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def feature_bytes(features):
+    if isinstance(features, torch.Tensor):
+        return features.numel() * features.element_size()
+    return sum(feature_bytes(feature) for feature in features)
+
+
+def map_features(features, function):
+    if isinstance(features, torch.Tensor):
+        return function(features)
+    return type(features)(map_features(feature, function) for feature in features)
+
+
+def concat_features(parts):
+    """Combine the features of single images as if they were computed together."""
+    if isinstance(parts[0], torch.Tensor):
+        return torch.cat(parts)
+    return type(parts[0])(feature for part in parts for feature in part)
+
+
+class VisionFeatureCache:
+    """
+    Image features of the LLaVA vision tower, kept in an in-process LRU bounded by
+    `max_memory_bytes` and optionally in a directory bounded by `max_disk_bytes`,
+    which every process of the host can share.
+    """
+
+    def __init__(self, max_memory_bytes, directory=None, max_disk_bytes=0):
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pt")
+
+    def get(self, key):
+        """
+        Return the cached features for the key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                log_cache_hit(CACHE_NAME, "memory")
+                return entry[0]
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                features = torch.load(path, map_location="cpu", weights_only=True)
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error reading cached vision features {key}: {e}")
+            else:
+                self._remember(key, features)
+                log_cache_hit(CACHE_NAME, "disk")
+                return features
+
+        log_cache_miss(CACHE_NAME)
+        return None
+
+    def set(self, key, features):
+        """
+        Store CPU features in memory and, if configured, on disk.
+        """
+        self._remember(key, features)
+        if self.directory:
+            try:
+                self._write(key, features)
+            except Exception as e:
+                logger.error(f"Error writing cached vision features {key}: {e}")
+
+    def _remember(self, key, features):
+        size = feature_bytes(features)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous[1]
+            self._entries[key] = (features, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _write(self, key, features):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(features, temporary_path)
+        size = os.path.getsize(temporary_path)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._disk_bytes += size
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+        self._prune_disk()
+
+    def _disk_entries(self):
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _prune_disk(self):
+        """
+        Delete the least recently used files until the directory is back under
+        90% of its budget. The directory is rescanned since other processes may
+        share it.
+        """
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_disk_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+def install_vision_feature_cache(model, cache):
+    """
+    Serve the image features of a LLaVA-Next model from a cache, so that the
+    vision tower only runs for images it has not seen.
+
+    Features are cached per image, keyed by a perceptual hash of the image and a
+    hash of its exact pixel values. Only exact matches are reused, since features
+    of a merely similar photo would change the response; the perceptual hash
+    groups near-duplicate photos together on disk.
+
+    Args:
+        model: A LlavaNextForConditionalGeneration model.
+        cache (VisionFeatureCache): The cache to use.
+    """
+    # Recent transformers versions compute image features in the inner model
+    target = getattr(model, "model", None)
+    if target is None or not hasattr(target, "get_image_features"):
+        target = model
+    if not hasattr(target, "get_image_features"):
+        logger.warning(
+            f"{type(model).__name__} has no get_image_features, not caching vision"
+            " features"
+        )
+        return
+    get_image_features = target.get_image_features
+    model_name = getattr(model.config, "_name_or_path", "")
+
+    def cached_get_image_features(pixel_values, image_sizes, *args, **kwargs):
+        if pixel_values.shape[0] > 1:
+            return concat_features(
+                [
+                    cached_get_image_features(
+                        pixel_values[index : index + 1],
+                        image_sizes[index : index + 1],
+                        *args,
+                        **kwargs,
+                    )
+                    for index in range(pixel_values.shape[0])
+                ]
+            )
+
+        # Drop the zero patches added when batching images with fewer patches
+        patch_count = int(pixel_values[0].flatten(1).any(dim=1).sum())
+        pixel_values = pixel_values[:, :patch_count]
+
+        key = "-".join(
+            (
+                perceptual_hash(pixel_values[0]),
+                content_hash(
+                    pixel_values, image_sizes.tolist(), model_name, args, kwargs
+                ),
+            )
+        )
+        features = cache.get(key)
+        if features is not None:
+            return map_features(features, lambda f: f.to(pixel_values.device))
+
+        features = get_image_features(pixel_values, image_sizes, *args, **kwargs)
+        cache.set(key, map_features(features, lambda f: f.detach().cpu()))
+        return features
+
+    target.get_image_features = cached_get_image_features
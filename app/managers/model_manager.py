@@ -0,0 +1,210 @@
+# model_manager.py
+
+import gc
+import logging
+import os
+import threading
+import time
+
+from flask import Flask
+
+from logger import configure_logger
+from app.metrics import log_model_evicted, log_model_loaded
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/app.log")
+
+
+def get_rss_bytes():
+    """Return the resident set size of the current process, if available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def get_tensor_bytes(model):
+    """Return the size of the parameters and buffers of a torch module."""
+    if not hasattr(model, "parameters") or not hasattr(model, "buffers"):
+        return None
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class LoadedModel:
+    def __init__(self, model, load_time, memory_bytes):
+        self.model = model
+        self.load_time = load_time
+        self.memory_bytes = memory_bytes or 0
+        self.last_used = time.monotonic()
+
+
+class ModelManager:
+    """
+    A registry of models that are imported and loaded the first time they are
+    needed and then shared by every thread of the process.
+
+    Models that are not pinned may be evicted, least recently used first, when the
+    total memory of the loaded models exceeds the configured budget.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.memory_budget = None
+        self._loaders = {}
+        self._pinned = set()
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        self.app = app
+        budget_mb = app.config["MODEL_MEMORY_BUDGET_MB"]
+        self.memory_budget = int(budget_mb) * 1024 * 1024 if budget_mb else None
+        app.extensions["model_manager"] = self
+
+    def register(self, name, loader, pinned=False):
+        """
+        Register a model loader.
+
+        Args:
+            name (str): The name the model is requested by.
+            loader (callable): Called with the Flask app to load the model.
+            pinned (bool, optional): Whether the model is exempt from eviction.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            if pinned:
+                self._pinned.add(name)
+
+    def get(self, name):
+        """
+        Return a model, loading it first if needed.
+
+        Args:
+            name (str): The name of the model.
+
+        Returns:
+            object: The loaded model.
+        """
+        loaded = self._models.get(name)
+        if loaded is None:
+            loaded = self._load(name)
+        loaded.last_used = time.monotonic()
+        return loaded.model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm(self, names):
+        """Load the given models ahead of their first use."""
+        for name in names:
+            self.get(name)
+
+    def _load(self, name):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            loaded = self._models.get(name)
+            if loaded is not None:
+                return loaded
+
+            rss_before = get_rss_bytes()
+            started = time.monotonic()
+            try:
+                with self.app.app_context():
+                    model = self._loaders[name](self.app)
+            except Exception as e:
+                logger.error(f"Failed to load model {name}: {e}")
+                raise
+            load_time = time.monotonic() - started
+
+            memory_bytes = get_tensor_bytes(model)
+            if memory_bytes is None and rss_before is not None:
+                memory_bytes = max(get_rss_bytes() - rss_before, 0)
+
+            loaded = LoadedModel(model, load_time, memory_bytes)
+            with self._lock:
+                self._models[name] = loaded
+
+        logger.info(
+            f"Loaded model {name} in {load_time:.1f}s"
+            f" ({loaded.memory_bytes / 1024 / 1024:.0f} MB)"
+        )
+        log_model_loaded(name, load_time, loaded.memory_bytes)
+        self._enforce_budget(keep=name)
+        return loaded
+
+    def evict(self, name):
+        """Drop the registry's reference to a model so that it can be freed."""
+        with self._lock:
+            loaded = self._models.pop(name, None)
+        if loaded is not None:
+            logger.info(f"Evicted model {name}")
+            log_model_evicted(name)
+            gc.collect()
+
+    def _enforce_budget(self, keep=None):
+        if not self.memory_budget:
+            return
+        while self.total_memory() > self.memory_budget:
+            with self._lock:
+                candidates = [
+                    (loaded.last_used, name)
+                    for name, loaded in self._models.items()
+                    if name != keep and name not in self._pinned
+                ]
+            if not candidates:
+                logger.warning(
+                    "Loaded models exceed the memory budget but none can be evicted"
+                )
+                return
+            self.evict(min(candidates)[1])
+
+    def prepare_for_fork(self, share_memory=False):
+        """
+        Make the loaded models safe to share copy-on-write with forked workers.
+
+        Weights are switched to inference mode so that nothing writes to their
+        pages, and existing objects are frozen out of the garbage collector so
+        that collections in the workers do not touch the parent's pages.
+
+        Args:
+            share_memory (bool, optional): Also move the weights to shared memory,
+                so that they stay shared even if a worker writes to them.
+        """
+        for name, loaded in list(self._models.items()):
+            model = loaded.model
+            if hasattr(model, "eval") and hasattr(model, "parameters"):
+                model.eval()
+                for parameter in model.parameters():
+                    parameter.requires_grad_(False)
+                if share_memory:
+                    model.share_memory()
+                logger.info(f"Prepared model {name} for sharing with workers")
+        gc.collect()
+        gc.freeze()
+
+    def total_memory(self):
+        return sum(loaded.memory_bytes for loaded in list(self._models.values()))
+
+    def report(self):
+        """
+        Describe the loaded models.
+
+        Returns:
+            list: One dict per loaded model with its load time, memory and idle time.
+        """
+        now = time.monotonic()
+        return [
+            {
+                "name": name,
+                "load_time": round(loaded.load_time, 2),
+                "memory_mb": round(loaded.memory_bytes / 1024 / 1024, 1),
+                "idle_seconds": round(now - loaded.last_used, 1),
+                "pinned": name in self._pinned,
+            }
+            for name, loaded in sorted(self._models.items())
+        ]
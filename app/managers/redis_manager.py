@@ -35,3 +35,8 @@ class RedisManager:
         if self.redis_client is None:
             raise RuntimeError("Redis client has not been initialized.")
         return self.redis_client
+
+    def reset_connections(self):
+        """Drop the connections a forked process inherited from its parent."""
+        if self.redis_client is not None:
+            self.redis_client.connection_pool.reset()
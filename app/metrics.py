@@ -1,4 +1,13 @@
-from prometheus_client import Counter, Histogram, start_http_server
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
 
 REQUEST_COUNT = Counter(
     "chatbot_request_count", "Number of requests received", ["endpoint"]
@@ -6,10 +15,39 @@ REQUEST_COUNT = Counter(
 REQUEST_LATENCY = Histogram(
     "chatbot_request_latency", "Request latency in seconds", ["endpoint"]
 )
+CACHE_HITS = Counter("chatbot_cache_hits", "Number of cache hits", ["cache", "tier"])
+CACHE_MISSES = Counter("chatbot_cache_misses", "Number of cache misses", ["cache"])
+MODEL_LOAD_TIME = Gauge(
+    "chatbot_model_load_seconds", "Time taken to load a model", ["model"]
+)
+MODEL_MEMORY = Gauge(
+    "chatbot_model_memory_bytes", "Memory held by a loaded model", ["model"]
+)
+MODEL_EVICTIONS = Counter(
+    "chatbot_model_evictions", "Number of times a model was evicted", ["model"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "chatbot_upstream_latency", "Upstream service latency in seconds", ["service"]
+)
+VAD_SECONDS = Counter(
+    "chatbot_vad_seconds",
+    "Seconds of audio kept for or skipped by speech recognition",
+    ["kind"],
+)
 
 
 def start_metrics_server(port=7000):
-    start_http_server(port)
+    """
+    Serve the metrics of this process. With PROMETHEUS_MULTIPROC_DIR set, serve
+    the metrics that every process writes to that directory instead, so that one
+    server exports the metrics of all the gunicorn workers.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
 
 
 def log_request(endpoint):
@@ -18,3 +56,30 @@ def log_request(endpoint):
 
 def log_latency(endpoint, latency):
     REQUEST_LATENCY.labels(endpoint=endpoint).observe(latency)
+
+
+def log_model_loaded(model, load_time, memory_bytes):
+    MODEL_LOAD_TIME.labels(model=model).set(load_time)
+    MODEL_MEMORY.labels(model=model).set(memory_bytes)
+
+
+def log_model_evicted(model):
+    MODEL_MEMORY.labels(model=model).set(0)
+    MODEL_EVICTIONS.labels(model=model).inc()
+
+
+def log_cache_hit(cache, tier):
+    CACHE_HITS.labels(cache=cache, tier=tier).inc()
+
+
+def log_cache_miss(cache):
+    CACHE_MISSES.labels(cache=cache).inc()
+
+
+def log_upstream_latency(service, latency):
+    UPSTREAM_LATENCY.labels(service=service).observe(latency)
+
+
+def log_vad(total_seconds, speech_seconds):
+    VAD_SECONDS.labels(kind="speech").inc(speech_seconds)
+    VAD_SECONDS.labels(kind="skipped").inc(total_seconds - speech_seconds)
@@ -3,11 +3,13 @@ from mongoengine import (
     Document,
     StringField,
     DateTimeField,
-    ReferenceField,
-    ListField,
-    DictField,
+    IntField,
+    ObjectIdField,
 )
 
+# Length of the last message text kept on the conversation for previews
+LAST_MESSAGE_PREVIEW_LENGTH = 200
+
 
 class Conversation(Document):
     user_id = StringField(required=True)
@@ -16,7 +18,19 @@ class Conversation(Document):
     input_language = StringField()
     output_language = StringField()
     dialogue_state = StringField(default="greeting")
-    messages = ListField(ReferenceField("Message"))
+
+    # Messages are stored in the Message collection; the conversation only keeps
+    # their count and a preview of the last one
+    message_count = IntField(default=0)
+    last_message_id = ObjectIdField()
+    last_message_text = StringField()
+    last_message_sender = StringField()
+    last_message_at = DateTimeField()
+
+    # Summary of the messages sent up to `summarized_until`, which prompts include
+    # in place of those messages
+    summary = StringField()
+    summarized_until = DateTimeField()
 
     # Fields for tracking image generation task
     image_task_id = StringField()
@@ -32,10 +46,40 @@ class Conversation(Document):
                 "fields": ["user_id", "timestamp"],
                 "unique": False,
             }
-        ]
+        ],
+        # Documents that have not been migrated yet still hold a `messages` array
+        "strict": False,
     }
 
-    def to_dict(self):
+    @staticmethod
+    def last_message_fields(message_document):
+        """
+        Return the conversation fields describing its last message.
+
+        Args:
+            message_document (dict): The raw Mongo document of the message.
+        """
+        return {
+            "last_message_id": message_document["_id"],
+            "last_message_text": (message_document.get("text") or "")[
+                :LAST_MESSAGE_PREVIEW_LENGTH
+            ],
+            "last_message_sender": message_document.get("sender"),
+            "last_message_at": message_document.get("timestamp"),
+        }
+
+    def to_dict(self, messages=None):
+        """
+        Serialize the conversation and its messages.
+
+        Args:
+            messages (list, optional): The serialized messages of the conversation.
+                Loaded with one query if omitted.
+        """
+        from app.models.Message import Message
+
+        if messages is None:
+            messages = Message.to_dicts_by_conversation([self.id]).get(self.id, [])
         return {
             "id": str(self.id),
             "user_id": self.user_id,
@@ -44,7 +88,8 @@ class Conversation(Document):
             "input_language": self.input_language,
             "output_language": self.output_language,
             "dialogue_state": self.dialogue_state,
-            "messages": [message.to_dict() for message in self.messages],
+            "message_count": self.message_count,
+            "messages": messages,
             "image_task_id": self.image_task_id,
             "image_task_status": self.image_task_status,
             "image_task_started_at": (
@@ -58,3 +103,60 @@ class Conversation(Document):
                 else None
             ),
         }
+
+    def to_summary_dict(self):
+        """Serialize the conversation without its message history."""
+        return {
+            "id": str(self.id),
+            "title": self.title,
+            "timestamp": self.timestamp.isoformat(),
+            "input_language": self.input_language,
+            "output_language": self.output_language,
+            "dialogue_state": self.dialogue_state,
+            "image_task_status": self.image_task_status,
+            "message_count": self.message_count,
+            "last_message": (
+                {
+                    "id": str(self.last_message_id),
+                    "text": self.last_message_text,
+                    "sender": self.last_message_sender,
+                    "timestamp": (
+                        self.last_message_at.isoformat()
+                        if self.last_message_at
+                        else None
+                    ),
+                }
+                if self.last_message_id
+                else None
+            ),
+        }
+
+    @classmethod
+    def to_dicts(cls, conversations):
+        """
+        Serialize a page of conversations, loading all of their messages with a
+        single query.
+        """
+        from app.models.Message import Message
+
+        conversations = list(conversations)
+        messages = Message.to_dicts_by_conversation(
+            [conversation.id for conversation in conversations]
+        )
+        return [
+            conversation.to_dict(messages.get(conversation.id, []))
+            for conversation in conversations
+        ]
+
+    @classmethod
+    def summaries(cls, queryset):
+        """
+        Summarize a page of conversations without loading their history.
+
+        Args:
+            queryset (QuerySet): The filtered, sorted and paginated conversations.
+
+        Returns:
+            list: One dict per conversation.
+        """
+        return [conversation.to_summary_dict() for conversation in queryset]
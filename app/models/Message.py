@@ -5,6 +5,8 @@ from mongoengine import Document, StringField, DateTimeField, ReferenceField, UR
 class Message(Document):
     conversation_id = ReferenceField("Conversation", required=True)
     text = StringField()
+    # The English text the model saw or produced, used to build prompt context
+    model_text = StringField()
     timestamp = DateTimeField(default=datetime.utcnow)
     sender = StringField(required=True, choices=["user", "bot"])
     image_url = URLField()
@@ -20,12 +22,37 @@ class Message(Document):
     }
 
     def to_dict(self):
+        # Read the raw reference so that serializing does not load the conversation
+        conversation_id = self._data.get("conversation_id")
         return {
             "id": str(self.id),
-            "conversation_id": str(self.conversation_id.id),
+            "conversation_id": str(getattr(conversation_id, "id", conversation_id)),
             "text": self.text,
             "timestamp": self.timestamp.isoformat(),
             "sender": self.sender,
             "image_url": self.image_url,
             "audio_data": self.audio_data,
         }
+
+    @classmethod
+    def to_dicts_by_conversation(cls, conversation_ids):
+        """
+        Serialize the messages of several conversations using a single query.
+
+        Returns:
+            dict: The serialized messages of each conversation in chronological
+                order, keyed by conversation ID.
+        """
+        if not conversation_ids:
+            return {}
+        messages = {}
+        query = (
+            cls.objects(conversation_id__in=list(conversation_ids))
+            .order_by("conversation_id", "timestamp", "id")
+            .no_dereference()
+        )
+        for message in query:
+            conversation_id = message._data["conversation_id"]
+            conversation_id = getattr(conversation_id, "id", conversation_id)
+            messages.setdefault(conversation_id, []).append(message.to_dict())
+        return messages
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import uuid
+
+from celery import chain
+from flask import current_app
+
+from logger import configure_logger
+from app.chatbot.input_processing import file_extension, upload_user_file_async
+from app.chatbot.utils.aws.s3 import download_bytes_from_s3
+from app.extensions import redis_manager
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+TURN_PENDING = "pending"
+TURN_TRANSCRIBING = "transcribing"
+TURN_GENERATING = "generating"
+TURN_DONE = "done"
+TURN_FAILED = "failed"
+
+
+def turn_key(turn_id):
+    return f"chat-turn:{turn_id}"
+
+
+def create_turn(user_id, conversation_id):
+    """
+    Record a chat turn that is processed in the background.
+
+    Returns:
+        str: The ID of the turn.
+    """
+    turn_id = uuid.uuid4().hex
+    turn = {
+        "turn_id": turn_id,
+        "user_id": user_id,
+        "conversation_id": str(conversation_id),
+        "status": TURN_PENDING,
+    }
+    redis_manager.get_redis_client().set(
+        turn_key(turn_id), json.dumps(turn), ex=current_app.config["CHAT_TURN_TTL"]
+    )
+    return turn_id
+
+
+def get_turn(turn_id):
+    raw_value = redis_manager.get_redis_client().get(turn_key(turn_id))
+    return json.loads(raw_value) if raw_value else None
+
+
+def update_turn(turn_id, **fields):
+    turn = get_turn(turn_id) or {"turn_id": turn_id}
+    turn.update(fields)
+    redis_manager.get_redis_client().set(
+        turn_key(turn_id), json.dumps(turn), ex=current_app.config["CHAT_TURN_TTL"]
+    )
+    return turn
+
+
+def spool_file(data):
+    """
+    Hand an uploaded file over to Celery workers through Redis. The caller adds
+    the S3 key of the file to the handle, as a fallback in case the spooled copy
+    has expired.
+
+    Returns:
+        dict: The handle to pass to `read_spooled_file`.
+    """
+    spool_key = f"spool:{uuid.uuid4().hex}"
+    redis_manager.get_redis_client().set(
+        spool_key, data, ex=current_app.config["UPLOAD_SPOOL_TTL"]
+    )
+    return {"spool_key": spool_key}
+
+
+def read_spooled_file(handle):
+    redis_client = redis_manager.get_redis_client()
+    data = redis_client.get(handle["spool_key"])
+    if data is None:
+        logger.warning(f"Spooled file {handle['spool_key']} expired, reading from S3")
+        return download_bytes_from_s3(
+            os.environ.get("AWS_BUCKET_NAME"), handle["object_key"]
+        )
+    redis_client.delete(handle["spool_key"])
+    return data
+
+
+def start_audio_turn(session, user, conversation, audio_file, image_file, language):
+    """
+    Upload a voice message and start the Celery workflow that transcribes it,
+    runs the dialogue and saves the turn.
+
+    Returns:
+        str: The ID of the turn, to poll with `get_turn`.
+    """
+    from app.tasks.chat_tasks import complete_chat_turn_task, transcribe_turn_task
+
+    # The original bytes are uploaded to S3 while they are spooled to the workers
+    audio_data = audio_file.read()
+    audio_upload = upload_user_file_async(audio_data, "audios", user.id, "wav")
+    image_upload = None
+    if image_file:
+        image_data = image_file.read()
+        image_upload = upload_user_file_async(
+            image_data, "images", user.id, file_extension(image_file.filename)
+        )
+
+    audio = spool_file(audio_data)
+    image = spool_file(image_data) if image_upload else None
+
+    audio_file_url, audio["object_key"] = audio_upload.result()
+    if image_upload:
+        image["url"], image["object_key"] = image_upload.result()
+
+    turn_id = create_turn(user.id, conversation.id)
+    context = {
+        "user": {"_id": user.id, "languagePreference": user.language_preference},
+        "conversation_id": str(conversation.id),
+        "language": language,
+        "audio_file_url": audio_file_url,
+        "image": image,
+        # The worker has no access to the Flask session; the dialogue state it
+        # keeps there is sent along and returned with the turn.
+        "session": {
+            "consecutive_short_responses": session.get("consecutive_short_responses", 0)
+        },
+    }
+    chain(
+        transcribe_turn_task.s(turn_id, audio, language),
+        complete_chat_turn_task.s(turn_id, context),
+    ).apply_async()
+    return turn_id
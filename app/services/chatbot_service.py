@@ -1,9 +1,24 @@
-from flask import jsonify
+import json
+import time
+
+from flask import Response, current_app, jsonify, stream_with_context
 from app import chat_logger
-from app.chatbot.dialogue_management import generate_title, manage_dialogue
+from app.chatbot.dialogue_management import (
+    generate_title,
+    manage_dialogue,
+    stream_dialogue,
+)
 from app.chatbot.input_processing import process_input
 from app.chatbot.error_handling import handle_error
 from app.extensions import redis_manager
+from app.services.chat_turns import (
+    TURN_DONE,
+    TURN_FAILED,
+    TURN_PENDING,
+    get_turn,
+    start_audio_turn,
+)
+from app.services.persistence import persist_chat_turn
 
 redis_client = redis_manager.get_redis_client()
 
@@ -41,13 +56,13 @@ def handle_post_request(
     new_chat,
 ):
     try:
+        error = validate_chat_inputs(audio_file, text_input, image_file)
+        if error:
+            return error
 
-        if audio_file and text_input:
-            return handle_error("Please provide only one type of input", 400)
-
-        if image_file and not allowed_file(image_file.filename):
-            return handle_error(
-                "Invalid file type. Only PNG, JPG and JPEG are allowed.", 400
+        if audio_file:
+            return handle_audio_chat(
+                session, user, conversation, audio_file, image_file, language
             )
 
         bot_message.text = text_input
@@ -55,7 +70,6 @@ def handle_post_request(
         return handle_chat(
             session,
             user,
-            audio_file,
             text_input,
             image_file,
             language,
@@ -73,10 +87,55 @@ def handle_post_request(
         )
 
 
+def validate_chat_inputs(audio_file, text_input, image_file):
+    if audio_file and text_input:
+        return handle_error("Please provide only one type of input", 400)
+
+    if image_file and not allowed_file(image_file.filename):
+        return handle_error(
+            "Invalid file type. Only PNG, JPG and JPEG are allowed.", 400
+        )
+
+    return None
+
+
+def save_chat_turn(
+    user,
+    conversation,
+    user_message,
+    bot_message,
+    message_fields,
+    bot_message_fields,
+    translated_text,
+    language,
+    new_state,
+    image_task_id,
+):
+    for attr, message_field in message_fields.items():
+        if message_field:
+            setattr(user_message, attr, message_field)
+
+    for attr, field in bot_message_fields.items():
+        if field:
+            setattr(bot_message, attr, field)
+
+    conversation_updates = {
+        "user_id": str(user.id),
+        "title": generate_title(translated_text),
+        "input_language": language,
+        "output_language": user.language_preference,
+        "dialogue_state": new_state,
+        "image_task_id": image_task_id,
+    }
+    persist_chat_turn(conversation, [user_message, bot_message], conversation_updates)
+
+    for attr, value in conversation_updates.items():
+        setattr(conversation, attr, value)
+
+
 def handle_chat(
     session,
     user,
-    audio_file,
     text_input,
     image_file,
     language,
@@ -86,44 +145,35 @@ def handle_chat(
     new_chat,
 ):
     try:
-        inputs, translated_text, image_file_url, audio_file_url = process_input(
-            audio_file, text_input, image_file, language, conversation.user_id
+        inputs, translated_text, image_file_url = process_input(
+            text_input, image_file, language, conversation
         )
 
         message_fields = {
             "text": text_input,
+            "model_text": translated_text,
             "image_url": image_file_url,
-            "audio_data": audio_file_url,
         }
 
-        for attr, message_field in message_fields.items():
-            if message_field:
-                setattr(user_message, attr, message_field)
-        user_message.save()
-
         translated_response, new_state, image_task_id, bot_message_fields = (
             manage_dialogue(session, translated_text, inputs, language, conversation)
         )
 
-        for attr, field in bot_message_fields.items():
-            if field:
-                setattr(bot_message, attr, field)
-        bot_message.save()
-
-        conversation.update(
-            set__user_id=user.id,
-            set__title=generate_title(translated_text),
-            set__input_language=language,
-            set__output_language=user.language_preference,
-            set__dialogue_state=new_state,
-            set__image_task_id=image_task_id,
+        save_chat_turn(
+            user,
+            conversation,
+            user_message,
+            bot_message,
+            message_fields,
+            bot_message_fields,
+            translated_text,
+            language,
+            new_state,
+            image_task_id,
         )
 
-        conversation.messages.extend([user_message, bot_message])
-        conversation.save()
-
         if new_chat:
-            response_data = {"conversation_id": conversation.to_dict()["id"]}
+            response_data = {"conversation_id": str(conversation.id)}
         else:
             response_data = {"response": translated_response}
 
@@ -137,3 +187,205 @@ def handle_chat(
         return handle_error(
             "An error occurred while processing the chat. Please try again later.", 500
         )
+
+
+def handle_audio_chat(session, user, conversation, audio_file, image_file, language):
+    """
+    Start an audio chat turn in the background and return its ID right away. The
+    response is available from the turn once its status is "done".
+    """
+    try:
+        turn_id = start_audio_turn(
+            session, user, conversation, audio_file, image_file, language
+        )
+        return (
+            jsonify(
+                {
+                    "turn_id": turn_id,
+                    "conversation_id": str(conversation.id),
+                    "status": TURN_PENDING,
+                }
+            ),
+            202,
+        )
+    except Exception as e:
+        chat_logger.error(f"Error in handle_audio_chat: {e}")
+        return handle_error(
+            "An error occurred while processing the audio. Please try again later.",
+            500,
+        )
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def handle_stream_post_request(
+    session,
+    user,
+    conversation,
+    user_message,
+    bot_message,
+    language,
+    audio_file,
+    text_input,
+    image_file,
+):
+    """
+    Handle a chat turn and stream the response as server-sent events.
+
+    The input is processed before the response starts so that input errors are
+    still returned as regular JSON errors. The messages and the conversation are
+    persisted once the whole response has been generated, before the final event
+    is sent, even if the client disconnects in the meantime.
+    """
+    try:
+        error = validate_chat_inputs(audio_file, text_input, image_file)
+        if error:
+            return error
+
+        if audio_file:
+            turn_id = start_audio_turn(
+                session, user, conversation, audio_file, image_file, language
+            )
+            return event_stream(stream_turn(session, conversation, turn_id))
+
+        inputs, translated_text, image_file_url = process_input(
+            text_input, image_file, language, conversation
+        )
+    except Exception as e:
+        chat_logger.error(f"Error in handle_stream_post_request: {e}")
+        return handle_error(
+            "An error occurred while processing the request. Please try again later.",
+            500,
+        )
+
+    message_fields = {
+        "text": text_input,
+        "model_text": translated_text,
+        "image_url": image_file_url,
+    }
+
+    def save_turn(result):
+        translated_response, new_state, image_task_id, bot_message_fields = result
+        try:
+            save_chat_turn(
+                user,
+                conversation,
+                user_message,
+                bot_message,
+                message_fields,
+                bot_message_fields,
+                translated_text,
+                language,
+                new_state,
+                image_task_id,
+            )
+            save_streamed_session(session)
+        except Exception as e:
+            chat_logger.error(f"Error saving streamed chat turn: {e}")
+
+    def events():
+        dialogue = stream_dialogue(
+            session, translated_text, inputs, language, conversation
+        )
+        finished = False
+        try:
+            yield format_sse("conversation", {"conversation_id": str(conversation.id)})
+            while True:
+                try:
+                    chunk = next(dialogue)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+                yield format_sse("token", {"text": chunk})
+
+            finished = True
+            save_turn(result)
+            translated_response, _, image_task_id, _ = result
+            done_data = {"response": translated_response}
+            if image_task_id:
+                done_data["image_task_id"] = image_task_id
+            yield format_sse("done", done_data)
+        except GeneratorExit:
+            if not finished:
+                # The client disconnected; the turn is still completed and saved
+                try:
+                    save_turn(exhaust(dialogue))
+                except Exception as e:
+                    chat_logger.error(f"Error in handle_stream_post_request: {e}")
+            raise
+        except Exception as e:
+            chat_logger.error(f"Error in handle_stream_post_request: {e}")
+            yield format_sse(
+                "error",
+                {
+                    "error": "An error occurred while processing the chat."
+                    " Please try again later."
+                },
+            )
+
+    return event_stream(events())
+
+
+def exhaust(generator):
+    """Consume the rest of a generator and return its return value."""
+    while True:
+        try:
+            next(generator)
+        except StopIteration as stop:
+            return stop.value
+
+
+def save_streamed_session(session):
+    """
+    Save changes made to the session while a response is streamed. The session
+    is saved before the body of a response is sent, so they would be lost.
+    """
+    current_app.session_interface.save_session(current_app, session, Response())
+
+
+def event_stream(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def stream_turn(session, conversation, turn_id):
+    """
+    Stream the progress of a background chat turn: a `conversation` and a `turn`
+    event, a `status` event whenever its status changes, and a final `done` (or
+    `error`) event. The dialogue state of a done turn is saved to the session.
+    """
+    yield format_sse("conversation", {"conversation_id": str(conversation.id)})
+    yield format_sse("turn", {"turn_id": turn_id})
+
+    status = None
+    deadline = time.monotonic() + current_app.config["CHAT_TURN_STREAM_TIMEOUT"]
+    while time.monotonic() < deadline:
+        turn = get_turn(turn_id) or {"status": TURN_FAILED}
+        if turn["status"] != status:
+            status = turn["status"]
+            yield format_sse("status", {"status": status})
+
+        if status == TURN_DONE:
+            session.update(turn.get("session", {}))
+            save_streamed_session(session)
+            done_data = {"response": turn["response"]}
+            if turn.get("image_task_id"):
+                done_data["image_task_id"] = turn["image_task_id"]
+            yield format_sse("done", done_data)
+            return
+        if status == TURN_FAILED:
+            break
+        time.sleep(0.25)
+
+    yield format_sse(
+        "error",
+        {
+            "error": "An error occurred while processing the chat."
+            " Please try again later."
+        },
+    )
@@ -0,0 +1,165 @@
+import logging
+import time
+import uuid
+
+from bson.errors import InvalidId
+from flask import current_app
+from mongoengine.errors import ValidationError
+
+from logger import configure_logger
+from app.extensions import redis_manager
+from app.metrics import log_cache_hit, log_cache_miss
+from app.models.Conversation import Conversation
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+# Deletes the lock only if it still belongs to the process that set it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Writes an entry only if the conversation was not invalidated while it was loaded
+WRITE_ENTRY_SCRIPT = """
+if (redis.call("get", KEYS[2]) or "0") == ARGV[1] then
+    return redis.call("set", KEYS[1], ARGV[2], "EX", ARGV[3])
+end
+return 0
+"""
+
+
+class ConversationCache:
+    """
+    Caches conversation documents in Redis, where every web and Celery process
+    sees the same entries. Messages are not cached, so entries stay small however
+    long the conversation runs.
+
+    Entries expire after CONVERSATION_CACHE_TTL seconds and conversations whose
+    serialized form exceeds CONVERSATION_CACHE_MAX_BYTES are not cached. Every
+    change to a conversation or its messages must call `invalidate`, and entries
+    loaded while an invalidation happened are dropped rather than written. On a
+    miss, only one process loads the conversation from MongoDB while concurrent
+    requests for it wait for the entry to appear.
+    """
+
+    def _key(self, conversation_id):
+        # Versioned so that entries in an older format are never read
+        return f"conversation:v2:{conversation_id}"
+
+    def _lock_key(self, conversation_id):
+        return f"conversation-lock:{conversation_id}"
+
+    def _version_key(self, conversation_id):
+        return f"conversation-version:{conversation_id}"
+
+    def get(self, conversation_id, user_id):
+        """
+        Return a conversation of a user, loading it from MongoDB on a miss.
+
+        Args:
+            conversation_id (str): The ID of the conversation.
+            user_id (str): The ID of the user the conversation must belong to.
+
+        Returns:
+            Conversation: The conversation, or None if the user has no
+                conversation with this ID.
+        """
+        conversation = self._read(conversation_id)
+        if conversation is None:
+            log_cache_miss("conversation")
+            conversation = self._load_once(conversation_id)
+        else:
+            log_cache_hit("conversation", "redis")
+        if conversation is None or conversation.user_id != user_id:
+            return None
+        return conversation
+
+    def invalidate(self, conversation_id):
+        try:
+            pipeline = redis_manager.get_redis_client().pipeline()
+            pipeline.incr(self._version_key(conversation_id))
+            pipeline.expire(
+                self._version_key(conversation_id),
+                current_app.config["CONVERSATION_CACHE_TTL"],
+            )
+            pipeline.delete(self._key(conversation_id))
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Error invalidating conversation {conversation_id}: {e}")
+
+    def _read(self, conversation_id):
+        try:
+            raw_value = redis_manager.get_redis_client().get(self._key(conversation_id))
+        except Exception as e:
+            logger.error(f"Error reading conversation cache: {e}")
+            raw_value = None
+        if raw_value is None:
+            return None
+        return Conversation.from_json(raw_value)
+
+    def _load_once(self, conversation_id):
+        redis_client = redis_manager.get_redis_client()
+        lock_timeout = current_app.config["CONVERSATION_CACHE_LOCK_TIMEOUT"]
+        token = uuid.uuid4().hex
+        try:
+            locked = redis_client.set(
+                self._lock_key(conversation_id),
+                token,
+                nx=True,
+                px=int(lock_timeout * 1000),
+            )
+        except Exception as e:
+            logger.error(f"Error locking conversation cache: {e}")
+            return self._load(conversation_id)
+
+        if not locked:
+            # Another request is loading this conversation; wait for its entry.
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                conversation = self._read(conversation_id)
+                if conversation is not None:
+                    return conversation
+            return self._load(conversation_id)
+
+        try:
+            version = redis_client.get(self._version_key(conversation_id)) or b"0"
+            conversation = self._load(conversation_id)
+            if conversation is not None:
+                self._write(conversation_id, conversation, version.decode())
+            return conversation
+        finally:
+            try:
+                redis_client.eval(
+                    RELEASE_LOCK_SCRIPT, 1, self._lock_key(conversation_id), token
+                )
+            except Exception as e:
+                logger.error(f"Error unlocking conversation cache: {e}")
+
+    def _load(self, conversation_id):
+        try:
+            return Conversation.objects(id=conversation_id).first()
+        except (InvalidId, ValidationError):
+            return None
+
+    def _write(self, conversation_id, conversation, version):
+        payload = conversation.to_json()
+        if len(payload) > current_app.config["CONVERSATION_CACHE_MAX_BYTES"]:
+            return
+        try:
+            redis_manager.get_redis_client().eval(
+                WRITE_ENTRY_SCRIPT,
+                2,
+                self._key(conversation_id),
+                self._version_key(conversation_id),
+                version,
+                payload,
+                current_app.config["CONVERSATION_CACHE_TTL"],
+            )
+        except Exception as e:
+            logger.error(f"Error writing conversation cache: {e}")
+
+
+conversation_cache = ConversationCache()
@@ -0,0 +1,86 @@
+import logging
+
+from bson import ObjectId, json_util
+from flask import current_app
+from pymongo import ReplaceOne
+
+from logger import configure_logger
+from app.models.Conversation import Conversation
+from app.models.Message import Message
+from app.services.conversation_cache import conversation_cache
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+
+def write_chat_turn(conversation_id, message_documents, conversation_updates):
+    """
+    Write the messages of a chat turn and update their conversation.
+
+    The messages are upserted with one bulk write, and the conversation fields,
+    message count and last message are updated in one update, so the cost of a
+    turn does not depend on the length of the conversation. Both writes are
+    idempotent and safe to retry.
+
+    Args:
+        conversation_id (ObjectId): The ID of the conversation.
+        message_documents (list): The raw Mongo documents of the messages, with
+            their `_id` already set.
+        conversation_updates (dict): The conversation fields to set.
+    """
+    Message._get_collection().bulk_write(
+        [
+            ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+            for document in message_documents
+        ],
+        ordered=False,
+    )
+    # Skip the update if a previous attempt already recorded these messages.
+    Conversation._get_collection().update_one(
+        {
+            "_id": conversation_id,
+            "last_message_id": {"$ne": message_documents[-1]["_id"]},
+        },
+        {
+            "$set": {
+                **conversation_updates,
+                **Conversation.last_message_fields(message_documents[-1]),
+            },
+            "$inc": {"message_count": len(message_documents)},
+        },
+    )
+    conversation_cache.invalidate(conversation_id)
+
+
+def persist_chat_turn(conversation, messages, conversation_updates):
+    """
+    Persist the messages of a chat turn and the updated conversation fields.
+
+    Depending on CHAT_PERSISTENCE_MODE the writes happen in the request
+    ("sync") or are handed to a Celery task that retries them until they succeed
+    ("async"). If the task cannot be queued the writes happen in the request.
+
+    Args:
+        conversation (Conversation): The conversation of the turn.
+        messages (list): The unsaved Message documents of the turn.
+        conversation_updates (dict): The conversation fields to set.
+    """
+    for message in messages:
+        if message.id is None:
+            message.id = ObjectId()
+        message.validate()
+    message_documents = [message.to_mongo().to_dict() for message in messages]
+
+    if current_app.config["CHAT_PERSISTENCE_MODE"] == "async":
+        from app.tasks.tasks import persist_chat_turn_task
+
+        try:
+            persist_chat_turn_task.delay(
+                str(conversation.id),
+                json_util.dumps(message_documents),
+                conversation_updates,
+            )
+            return
+        except Exception as e:
+            logger.error(f"Could not queue chat turn, writing it directly: {e}")
+
+    write_chat_turn(conversation.id, message_documents, conversation_updates)
@@ -0,0 +1,171 @@
+import logging
+from datetime import datetime
+
+from celery import shared_task
+from flask import current_app
+
+from app.chatbot.context_builder import build_context, message_text
+from app.chatbot.dialogue_management import manage_dialogue
+from app.chatbot.input_processing import (
+    build_model_inputs,
+    chat_messages,
+    load_image,
+    translate_to_english,
+)
+from app.chatbot.utils.speech_recognition.speech_recognition import (
+    transcribe_by_language,
+)
+from app.chatbot.llava_response import generate_response, prepare_inputs
+from app.extensions import redis_manager
+from app.models.Conversation import Conversation
+from app.models.Message import Message
+from app.models.User import User
+from app.services.chat_turns import (
+    TURN_DONE,
+    TURN_FAILED,
+    TURN_GENERATING,
+    TURN_TRANSCRIBING,
+    read_spooled_file,
+    update_turn,
+)
+from app.services.chatbot_service import save_chat_turn
+from app.services.conversation_cache import conversation_cache
+from logger import configure_logger
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
+
+SUMMARY_INSTRUCTION = (
+    "Summarize the conversation below between a user and a plant assistant in a"
+    " few sentences. Keep the plants, problems, and advice that were mentioned."
+)
+
+
+@shared_task(name="transcribe_turn_task", acks_late=True)
+def transcribe_turn_task(turn_id, audio, language):
+    """
+    First step of an audio chat turn: transcribe the spooled voice message.
+    """
+    update_turn(turn_id, status=TURN_TRANSCRIBING)
+    try:
+        transcript = transcribe_by_language(read_spooled_file(audio), language)
+    except Exception as e:
+        logger.error(f"Transcription error in turn {turn_id}: {e}")
+        update_turn(turn_id, status=TURN_FAILED, error="Could not transcribe audio")
+        raise
+
+    if not transcript:
+        update_turn(turn_id, status=TURN_FAILED, error="No speech detected in audio")
+        raise ValueError(f"No speech detected in turn {turn_id}")
+    return transcript
+
+
+@shared_task(name="complete_chat_turn_task", acks_late=True)
+def complete_chat_turn_task(transcript, turn_id, context):
+    """
+    Second step of an audio chat turn: translate the transcript, run the dialogue
+    and save the turn.
+    """
+    update_turn(turn_id, status=TURN_GENERATING)
+    try:
+        user = User(context["user"])
+        language = context["language"]
+        conversation = conversation_cache.get(context["conversation_id"], user.id)
+        if conversation is None:
+            raise ValueError(f"Conversation {context['conversation_id']} not found")
+
+        translated_text = translate_to_english(transcript, language)
+        image = None
+        if context["image"]:
+            image = load_image(read_spooled_file(context["image"]))
+        inputs = build_model_inputs(translated_text, image, build_context(conversation))
+
+        session = dict(context["session"])
+        translated_response, new_state, image_task_id, bot_message_fields = (
+            manage_dialogue(session, translated_text, inputs, language, conversation)
+        )
+
+        message_fields = {
+            "model_text": translated_text,
+            "image_url": context["image"]["url"] if context["image"] else None,
+            "audio_data": context["audio_file_url"],
+        }
+        save_chat_turn(
+            user,
+            conversation,
+            Message(conversation_id=conversation, sender="user"),
+            Message(conversation_id=conversation, sender="bot"),
+            message_fields,
+            bot_message_fields,
+            translated_text,
+            language,
+            new_state,
+            image_task_id,
+        )
+    except Exception as e:
+        logger.error(f"Error completing chat turn {turn_id}: {e}")
+        update_turn(
+            turn_id,
+            status=TURN_FAILED,
+            error="An error occurred while processing the chat.",
+        )
+        raise
+
+    update_turn(
+        turn_id,
+        status=TURN_DONE,
+        response=translated_response,
+        image_task_id=image_task_id,
+        session=session,
+    )
+
+
+@shared_task(name="summarize_conversation_task", ignore_result=True)
+def summarize_conversation_task(conversation_id, until):
+    """
+    Fold the messages of a conversation sent before `until` into its summary,
+    a batch at a time, so that prompts can include the summary instead.
+    """
+    until = datetime.fromisoformat(until)
+    try:
+        conversation = Conversation.objects(id=conversation_id).first()
+        if conversation is None:
+            return
+
+        query = Message.objects(conversation_id=conversation.id, timestamp__lt=until)
+        if conversation.summarized_until:
+            query = query.filter(timestamp__gt=conversation.summarized_until)
+        messages = list(
+            query.order_by("timestamp", "id")
+            .only("sender", "text", "model_text", "timestamp")
+            .limit(current_app.config["CONTEXT_SUMMARY_BATCH_SIZE"])
+            .no_dereference()
+        )
+        if not messages:
+            return
+
+        lines = []
+        if conversation.summary:
+            lines.append(f"Earlier summary: {conversation.summary}")
+        max_characters = current_app.config["CONTEXT_SUMMARY_MESSAGE_CHARACTERS"]
+        for message in messages:
+            speaker = "User" if message.sender == "user" else "Assistant"
+            lines.append(f"{speaker}: {message_text(message)[:max_characters]}")
+
+        prompt = SUMMARY_INSTRUCTION + "\n\n" + "\n".join(lines)
+        inputs = prepare_inputs(chat_messages(prompt, False))
+        summary = generate_response(
+            inputs, max_new_tokens=current_app.config["CONTEXT_SUMMARY_MAX_TOKENS"]
+        )
+
+        # Only apply the summary if no other one was saved in the meantime
+        updated = Conversation.objects(
+            id=conversation.id, summarized_until=conversation.summarized_until
+        ).update_one(set__summary=summary, set__summarized_until=messages[-1].timestamp)
+        if updated:
+            conversation_cache.invalidate(conversation_id)
+    except Exception as e:
+        logger.error(f"Error summarizing conversation {conversation_id}: {e}")
+    finally:
+        redis_manager.get_redis_client().delete(
+            f"conversation-summary:{conversation_id}"
+        )
@@ -1,18 +1,16 @@
 from datetime import datetime
 import logging
+from bson import ObjectId, json_util
 from celery import shared_task
 from flask import current_app
 
-from app.chatbot.utils.speech_recognition.speech_recognition import (
-    transcribe_audio,
-    transcribe_fon,
-    transcribe_yoruba,
-)
 from app.chatbot.utils.text_to_image.text_to_image import (
     TextToImageGenerator,
 )
 from app.extensions import celery_manager
 from app.models.Conversation import Conversation
+from app.services.conversation_cache import conversation_cache
+from app.services.persistence import write_chat_turn
 from logger import configure_logger
 
 logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
@@ -20,21 +18,6 @@ logger = configure_logger(log_level=logging.DEBUG, log_file="logs/chat.log")
 celery_app = celery_manager.get_celery_app()
 
 
-@shared_task(name="transcribe_task", ignore_result=False)
-def transcribe_task(audio_path, language):
-    try:
-        if language == "yoruba":
-            transcript = transcribe_yoruba(audio_path)
-        elif language == "fon":
-            transcript = transcribe_fon(audio_path)
-        else:
-            transcript = transcribe_audio(audio_path, language=language)
-        return transcript
-    except Exception as e:
-        logger.error(f"Transcription error: {e}")
-        return "Could not transcribe audio"
-
-
 # Image generation task
 @shared_task(name="generate_image_task", ignore_result=False)
 def generate_image_task(prompt, conversation_id):
@@ -46,6 +29,7 @@ def generate_image_task(prompt, conversation_id):
         conversation.image_task_status = "STARTED"
         conversation.image_task_started_at = datetime.utcnow()
         conversation.save()
+        conversation_cache.invalidate(conversation_id)
 
         try:
             generate_image_data = (
@@ -58,3 +42,19 @@ def generate_image_task(prompt, conversation_id):
             conversation.image_task_status = "FAILURE"
         finally:
             conversation.save()
+            conversation_cache.invalidate(conversation_id)
+
+
+@shared_task(
+    name="persist_chat_turn_task",
+    acks_late=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=8,
+)
+def persist_chat_turn_task(conversation_id, message_documents, conversation_updates):
+    write_chat_turn(
+        ObjectId(conversation_id),
+        json_util.loads(message_documents),
+        conversation_updates,
+    )
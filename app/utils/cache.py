@@ -0,0 +1,151 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.extensions import redis_manager
+from app.metrics import log_cache_hit, log_cache_miss
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    A thread-safe in-process LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    A two-tier cache: an in-process TTLCache in front of Redis, which is shared by
+    every web and Celery process. Values are stored in Redis as JSON.
+
+    Redis errors are logged and treated as misses so that the cache never fails a
+    request. Hits per tier and misses are exported as Prometheus metrics.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=3600, redis_ttl=None):
+        self.name = name
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis_ttl = redis_ttl or ttl
+
+    def _redis_key(self, key):
+        return f"{self.name}:{key}"
+
+    def get(self, key):
+        """
+        Return the cached value for the key, or None.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        Look up several keys, querying Redis once for those missing in memory.
+
+        Returns:
+            dict: The cached values of the keys that were found.
+        """
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+                log_cache_hit(self.name, "memory")
+
+        if remaining:
+            try:
+                # Read the remaining TTL of each value too, so that values set with
+                # a short TTL do not outlive it in memory
+                pipeline = redis_manager.get_redis_client().pipeline(transaction=False)
+                for key in remaining:
+                    pipeline.get(self._redis_key(key))
+                    pipeline.pttl(self._redis_key(key))
+                results = pipeline.execute()
+            except Exception as e:
+                logger.error(f"Error reading {self.name} cache: {e}")
+                results = [None, -2] * len(remaining)
+
+            for key, raw_value, pttl in zip(remaining, results[0::2], results[1::2]):
+                if raw_value is None:
+                    log_cache_miss(self.name)
+                    continue
+                value = json.loads(raw_value)
+                ttl = self.memory.ttl
+                if pttl is not None and pttl >= 0:
+                    ttl = min(ttl, pttl / 1000)
+                self.memory.set(key, value, ttl=ttl)
+                found[key] = value
+                log_cache_hit(self.name, "redis")
+
+        return found
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, values, ttl=None):
+        """
+        Store several values in both tiers, writing to Redis in one round trip.
+        """
+        for key, value in values.items():
+            self.memory.set(key, value, ttl=ttl)
+        try:
+            pipeline = redis_manager.get_redis_client().pipeline(transaction=False)
+            for key, value in values.items():
+                pipeline.set(
+                    self._redis_key(key),
+                    json.dumps(value),
+                    ex=int(ttl if ttl is not None else self.redis_ttl),
+                )
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Error writing {self.name} cache: {e}")
+
+    def delete(self, key):
+        self.memory.delete(key)
+        try:
+            redis_manager.get_redis_client().delete(self._redis_key(key))
+        except Exception as e:
+            logger.error(f"Error deleting from {self.name} cache: {e}")
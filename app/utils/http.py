@@ -0,0 +1,84 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream service after `failure_threshold` consecutive
+    failures. After `reset_timeout` seconds one trial call is let through; the
+    circuit closes again if it succeeds.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let one trial call through and keep the others out until it ends
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call `func` through the breaker. Exceptions raised by `func` count as
+        failures.
+
+        Raises:
+            CircuitOpenError: If the circuit is open.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def create_session(pool_size=10, retries=1):
+    """
+    Create a requests session that keeps up to `pool_size` connections alive per
+    host and retries failed connections, but not requests that reached the
+    server.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries, connect=retries, read=0, status=0, backoff_factor=0.1
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
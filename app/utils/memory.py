@@ -0,0 +1,102 @@
+import os
+import sys
+
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def read_memory_usage(pid="self"):
+    """
+    Read the memory usage of a process from /proc/<pid>/smaps_rollup.
+
+    Returns:
+        dict: Sizes in bytes of the resident, proportional, shared and private
+            memory of the process.
+    """
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0].rstrip(":") in SMAPS_FIELDS:
+                usage[SMAPS_FIELDS[parts[0].rstrip(":")]] = int(parts[1]) * 1024
+    usage["shared"] = usage.get("shared_clean", 0) + usage.get("shared_dirty", 0)
+    usage["private"] = usage.get("private_clean", 0) + usage.get("private_dirty", 0)
+    return usage
+
+
+def get_child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def worker_memory_report(master_pid):
+    """
+    Collect the memory usage of a gunicorn master process and its workers.
+
+    Returns:
+        list: One dict per process with its pid, role and memory usage.
+    """
+    report = [{"pid": master_pid, "role": "master", **read_memory_usage(master_pid)}]
+    for pid in get_child_pids(master_pid):
+        try:
+            report.append({"pid": pid, "role": "worker", **read_memory_usage(pid)})
+        except OSError:
+            continue
+    return report
+
+
+def format_memory_report(report):
+    megabyte = 1024 * 1024
+    lines = [
+        "{:>8} {:8} {:>10} {:>10} {:>10} {:>10}".format(
+            "pid", "role", "rss_mb", "pss_mb", "shared_mb", "private_mb"
+        )
+    ]
+    for process in report:
+        lines.append(
+            "{:>8} {:8} {:>10.0f} {:>10.0f} {:>10.0f} {:>10.0f}".format(
+                process["pid"],
+                process["role"],
+                process["rss"] / megabyte,
+                process["pss"] / megabyte,
+                process["shared"] / megabyte,
+                process["private"] / megabyte,
+            )
+        )
+
+    workers = [process for process in report if process["role"] == "worker"]
+    if workers:
+        private = max(process["private"] for process in workers)
+        total_pss = sum(process["pss"] for process in report)
+        lines.append(
+            f"Total PSS: {total_pss / megabyte:.0f} MB;"
+            f" each extra worker adds about {private / megabyte:.0f} MB"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m app.utils.memory <gunicorn_master_pid>")
+        sys.exit(1)
+
+    master_pid = int(sys.argv[1])
+    if not os.path.exists(f"/proc/{master_pid}"):
+        print(f"No process with pid {master_pid}")
+        sys.exit(1)
+
+    print(format_memory_report(worker_memory_report(master_pid)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import logging
+
+from pymongo import UpdateMany, UpdateOne
+
+from logger import configure_logger
+from app.models.Conversation import Conversation
+from app.models.Message import Message
+
+logger = configure_logger(log_level=logging.DEBUG, log_file="logs/app.log")
+
+
+def migrate_conversations(batch_size=500):
+    """
+    Move conversations that still embed a `messages` array of message references
+    to the counter-based storage: the array is replaced by the message count and
+    the last message fields, and every referenced message is pointed at its
+    conversation. Conversations are migrated in bulk writes of `batch_size`.
+
+    The migration can be interrupted and run again; migrated conversations no
+    longer match its query.
+
+    Returns:
+        int: The number of conversations migrated.
+    """
+    conversations = Conversation._get_collection()
+    documents = conversations.find(
+        {"messages": {"$exists": True}}, {"messages": 1}, batch_size=batch_size
+    )
+
+    migrated = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            migrated += migrate_batch(batch)
+            batch = []
+    if batch:
+        migrated += migrate_batch(batch)
+    return migrated
+
+
+def migrate_batch(documents):
+    conversations = Conversation._get_collection()
+    messages = Message._get_collection()
+
+    message_ids = {
+        document["_id"]: [getattr(ref, "id", ref) for ref in document["messages"]]
+        for document in documents
+    }
+
+    message_updates = [
+        UpdateMany({"_id": {"$in": ids}}, {"$set": {"conversation_id": _id}})
+        for _id, ids in message_ids.items()
+        if ids
+    ]
+    if message_updates:
+        messages.bulk_write(message_updates, ordered=False)
+
+    last_messages = {
+        message["_id"]: message
+        for message in messages.find(
+            {"_id": {"$in": [ids[-1] for ids in message_ids.values() if ids]}},
+            {"text": 1, "sender": 1, "timestamp": 1},
+        )
+    }
+
+    conversation_updates = []
+    for _id, ids in message_ids.items():
+        fields = {"message_count": len(ids)}
+        if ids and ids[-1] in last_messages:
+            fields.update(Conversation.last_message_fields(last_messages[ids[-1]]))
+        conversation_updates.append(
+            UpdateOne({"_id": _id}, {"$set": fields, "$unset": {"messages": ""}})
+        )
+    conversations.bulk_write(conversation_updates, ordered=False)
+
+    logger.info(f"Migrated {len(conversation_updates)} conversations")
+    return len(conversation_updates)
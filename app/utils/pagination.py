@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine import Q
+
+MAX_PAGE_SIZE = 100
+
+# Counts stop at this many documents so that they cost the same for every user
+COUNT_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size(value, default=10):
+    """Parse a page size argument and clamp it to [1, MAX_PAGE_SIZE]."""
+    try:
+        size = int(value) if value is not None else default
+    except ValueError:
+        size = default
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort_field, item):
+    """
+    Build the opaque cursor pointing after a serialized item.
+
+    Args:
+        sort_field (str): The field the page is sorted by.
+        item (dict): The last serialized item of the page, with an `id` key.
+    """
+    payload = {"field": sort_field, "value": item[sort_field], "id": item["id"]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor, sort_field):
+    """
+    Decode a cursor built by `encode_cursor`.
+
+    Returns:
+        tuple: The sort value and the ObjectId of the last item of the previous page.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or was built for another sort.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        field, value = payload["field"], payload["value"]
+        last_id = ObjectId(payload["id"])
+        if sort_field == "timestamp":
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, InvalidId, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if field != sort_field:
+        raise InvalidCursor("The cursor does not match the requested sort")
+    return value, last_id
+
+
+def keyset_page(queryset, sort_field, descending, cursor, limit):
+    """
+    Restrict a queryset to the page following a cursor.
+
+    Results are ordered by the sort field and then by ID, and the page starts
+    right after the item the cursor points to, so every page is read from the
+    index at the same cost. One extra item is fetched to tell whether another page
+    follows; pass the serialized results to `finish_page`.
+
+    Args:
+        queryset (QuerySet): The filtered documents.
+        sort_field (str): The field to sort by.
+        descending (bool): Whether to sort in descending order.
+        cursor (str): The cursor returned with the previous page, or None.
+        limit (int): The page size.
+
+    Returns:
+        QuerySet: The ordered and limited queryset.
+    """
+    operator = "lt" if descending else "gt"
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field)
+        queryset = queryset.filter(
+            Q(**{f"{sort_field}__{operator}": value})
+            | (Q(**{sort_field: value}) & Q(**{f"id__{operator}": last_id}))
+        )
+    direction = "-" if descending else "+"
+    return queryset.order_by(f"{direction}{sort_field}", f"{direction}id").limit(
+        limit + 1
+    )
+
+
+def finish_page(items, sort_field, limit):
+    """
+    Drop the extra item fetched by `keyset_page`.
+
+    Returns:
+        tuple: The items of the page and the cursor of the next page, or None.
+    """
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(sort_field, items[-1])
+
+
+def capped_count(queryset):
+    """
+    Count documents up to COUNT_LIMIT.
+
+    Returns:
+        tuple: The count and whether it is exact.
+    """
+    count = queryset.limit(COUNT_LIMIT + 1).count(with_limit_and_skip=True)
+    return min(count, COUNT_LIMIT), count <= COUNT_LIMIT
@@ -1,5 +1,3 @@
-from flask_jwt_extended import create_access_token
-from contextlib import contextmanager
 import tempfile
 import requests
 import time
@@ -9,23 +7,6 @@ from functools import wraps
 logger = logging.getLogger(__name__)
 
 
-def generate_microservice_token():
-    try:
-        return create_access_token(identity="chatbot_microservice")
-    except Exception as e:
-        raise Exception(f"Failed to generate microservice token: {e}") from e
-
-
-@contextmanager
-def temporary_jwt_secret_key(app, new_secret_key):
-    original_secret_key = app.config["JWT_SECRET_KEY"]
-    app.config["JWT_SECRET_KEY"] = new_secret_key
-    try:
-        yield
-    finally:
-        app.config["JWT_SECRET_KEY"] = original_secret_key
-
-
 # Function to get a temporary file path
 def get_temp_file_path(suffix=".tmp"):
     temp_dir = tempfile.gettempdir()
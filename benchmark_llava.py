@@ -0,0 +1,131 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_PROMPT = "What are common causes of yellow leaves on a tomato plant?"
+
+
+def run_benchmark(precision, threads, prompt, image_path, max_new_tokens, runs):
+    """
+    Load LLaVA in one precision and time its generation. Runs in a fresh process
+    so that memory figures only cover that precision.
+    """
+    # The config reads the environment when it is first imported
+    os.environ["LLAVA_PRECISION"] = precision
+    if threads:
+        os.environ["LLAVA_TORCH_THREADS"] = str(threads)
+    # Repeated runs on the same image would otherwise skip the vision tower
+    os.environ["VISION_CACHE_MEMORY_MB"] = "0"
+
+    import torch
+    from PIL import Image
+
+    from app import load_llava_model, load_llava_processor
+    from app.managers.model_manager import get_rss_bytes
+
+    started = time.perf_counter()
+    model = load_llava_model()
+    load_seconds = time.perf_counter() - started
+    processor = load_llava_processor()
+
+    content = [{"type": "text", "text": prompt}]
+    image = None
+    if image_path:
+        image = Image.open(image_path)
+        content.insert(0, {"type": "image"})
+    text = processor.apply_chat_template(
+        [{"role": "user", "content": content}], add_generation_prompt=True
+    )
+    inputs = processor(text=text, images=image, return_tensors="pt")
+
+    def generate(new_tokens):
+        started = time.perf_counter()
+        with torch.inference_mode():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+            )
+        generated = output.shape[1] - inputs["input_ids"].shape[1]
+        return time.perf_counter() - started, generated
+
+    generate(1)
+    first_token_seconds = statistics.median(generate(1)[0] for _ in range(runs))
+    tokens_per_second = []
+    for _ in range(runs):
+        seconds, generated = generate(max_new_tokens)
+        tokens_per_second.append(generated / seconds)
+
+    return {
+        "precision": precision,
+        "load_seconds": load_seconds,
+        "first_token_seconds": first_token_seconds,
+        "tokens_per_second": statistics.median(tokens_per_second),
+        "rss_mb": (get_rss_bytes() or 0) / 1024**2,
+        # Linux reports the peak in kilobytes
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="PLANTID - compare LLaVA CPU precisions by speed and memory"
+    )
+    parser.add_argument(
+        "--precisions",
+        nargs="+",
+        default=["float16", "bfloat16", "int8"],
+        help="Precisions to compare, as accepted by LLAVA_PRECISION.",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=0, help="Torch threads per process."
+    )
+    parser.add_argument("--prompt", type=str, default=DEFAULT_PROMPT)
+    parser.add_argument("--image", type=str, help="Path to an image to include.")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for precision in args.precisions:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            try:
+                results.append(
+                    executor.submit(
+                        run_benchmark,
+                        precision,
+                        args.threads,
+                        args.prompt,
+                        args.image,
+                        args.max_new_tokens,
+                        args.runs,
+                    ).result()
+                )
+            except Exception as e:
+                print(f"{precision}: failed: {e}")
+
+    columns = (
+        ("precision", 10, "s"),
+        ("load_seconds", 12, ".1f"),
+        ("first_token_seconds", 19, ".2f"),
+        ("tokens_per_second", 17, ".2f"),
+        ("rss_mb", 8, ".0f"),
+        ("peak_rss_mb", 11, ".0f"),
+    )
+    print(" ".join(f"{name:>{width}}" for name, width, _ in columns))
+    for result in results:
+        print(
+            " ".join(f"{result[name]:>{width}{spec}}" for name, width, spec in columns)
+        )
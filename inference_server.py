@@ -0,0 +1,30 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import load_llava_model, load_llava_processor
+from app.config import ProdConfig
+from app.inference.client import engine_authkey
+from app.inference.engine import BatchingEngine, serve
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="PLANTID - LLaVA inference engine")
+    parser.add_argument(
+        "--address",
+        type=str,
+        default=ProdConfig.LLAVA_ENGINE_ADDRESS or "/tmp/plantid-llava.sock",
+        help="Address to listen on, either a Unix socket path or host:port, which"
+        " requires LLAVA_ENGINE_AUTHKEY.",
+    )
+    args = parser.parse_args()
+    # Refuse to listen on TCP without an authkey before loading the model
+    authkey = engine_authkey(args.address, ProdConfig.LLAVA_ENGINE_AUTHKEY)
+    engine = BatchingEngine(
+        load_llava_model(),
+        load_llava_processor(),
+        max_batch_size=ProdConfig.LLAVA_ENGINE_MAX_BATCH_SIZE,
+        batch_window=ProdConfig.LLAVA_ENGINE_BATCH_WINDOW_MS / 1000,
+    )
+    serve(engine, args.address, authkey)
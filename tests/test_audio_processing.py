@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+from app.chatbot.utils.speech_recognition.audio_processing import (
+    SAMPLE_RATE,
+    detect_speech,
+    original_time,
+    remove_silence,
+)
+
+
+def tone(seconds, amplitude=0.5, frequency=200):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class DetectSpeechTestCase(unittest.TestCase):
+    def test_silent_audio_has_no_speech(self):
+        self.assertEqual(detect_speech(silence(3)), [])
+
+    def test_faint_noise_has_no_speech(self):
+        noise = np.random.default_rng(0).normal(0, 1e-4, 3 * SAMPLE_RATE)
+        self.assertEqual(detect_speech(noise.astype(np.float32)), [])
+
+    def test_audio_shorter_than_a_frame_has_no_speech(self):
+        self.assertEqual(detect_speech(tone(0.01)), [])
+
+    def test_speech_is_padded(self):
+        audio = np.concatenate((silence(1), tone(1), silence(1)))
+        self.assertEqual(
+            detect_speech(audio, padding_seconds=0.2),
+            [(int(0.8 * SAMPLE_RATE), int(2.2 * SAMPLE_RATE))],
+        )
+
+    def test_padding_is_clipped_to_the_audio(self):
+        audio = np.concatenate((tone(1), silence(1)))
+        self.assertEqual(
+            detect_speech(audio, padding_seconds=0.2),
+            [(0, int(1.2 * SAMPLE_RATE))],
+        )
+
+    def test_short_pauses_are_merged(self):
+        audio = np.concatenate((silence(1), tone(1), silence(0.3), tone(1), silence(1)))
+        self.assertEqual(
+            detect_speech(audio, min_silence_seconds=0.5, padding_seconds=0.2),
+            [(int(0.8 * SAMPLE_RATE), int(3.5 * SAMPLE_RATE))],
+        )
+
+    def test_long_pauses_split_regions(self):
+        audio = np.concatenate((silence(1), tone(1), silence(2), tone(1), silence(1)))
+        self.assertEqual(
+            detect_speech(audio, min_silence_seconds=0.5, padding_seconds=0.2),
+            [
+                (int(0.8 * SAMPLE_RATE), int(2.2 * SAMPLE_RATE)),
+                (int(3.8 * SAMPLE_RATE), int(5.2 * SAMPLE_RATE)),
+            ],
+        )
+
+    def test_short_bursts_are_noise(self):
+        audio = np.concatenate((silence(1), tone(0.04), silence(1)))
+        self.assertEqual(detect_speech(audio, min_speech_seconds=0.1), [])
+
+
+class RemoveSilenceTestCase(unittest.TestCase):
+    def test_regions_are_joined(self):
+        audio = np.arange(10 * SAMPLE_RATE, dtype=np.float32)
+        regions = [
+            (1 * SAMPLE_RATE, 2 * SAMPLE_RATE),
+            (4 * SAMPLE_RATE, 5 * SAMPLE_RATE),
+        ]
+
+        speech, offsets = remove_silence(audio, regions)
+
+        np.testing.assert_array_equal(
+            speech,
+            np.concatenate(
+                (
+                    audio[SAMPLE_RATE : 2 * SAMPLE_RATE],
+                    audio[4 * SAMPLE_RATE : 5 * SAMPLE_RATE],
+                )
+            ),
+        )
+        np.testing.assert_array_equal(
+            offsets, [[0, 1 * SAMPLE_RATE], [1 * SAMPLE_RATE, 4 * SAMPLE_RATE]]
+        )
+
+    def test_times_are_mapped_back_to_the_original_audio(self):
+        audio = silence(10)
+        regions = [
+            (1 * SAMPLE_RATE, 2 * SAMPLE_RATE),
+            (4 * SAMPLE_RATE, 5 * SAMPLE_RATE),
+        ]
+        _, offsets = remove_silence(audio, regions)
+
+        np.testing.assert_allclose(
+            original_time([0.0, 0.5, 1.0, 1.5, 2.0], offsets), [1.0, 1.5, 4.0, 4.5, 5.0]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+from app.utils.cache import MISSING, TieredCache, TTLCache
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch("app.utils.cache.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing_key_returns_default(self):
+        cache = TTLCache()
+        self.assertIs(cache.get("key"), MISSING)
+        self.assertIsNone(cache.get("key", None))
+
+    def test_falsy_values_are_cached(self):
+        cache = TTLCache()
+        cache.set("key", None)
+        self.assertIsNone(cache.get("key"))
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(ttl=60)
+        cache.set("key", "value")
+
+        self.now += 60
+        self.assertEqual(cache.get("key"), "value")
+        self.now += 1
+        self.assertIs(cache.get("key"), MISSING)
+        self.assertEqual(len(cache), 0)
+
+    def test_entry_ttl_overrides_default(self):
+        cache = TTLCache(ttl=60)
+        cache.set("short", "value", ttl=5)
+        cache.set("long", "value")
+
+        self.now += 10
+        self.assertIs(cache.get("short"), MISSING)
+        self.assertEqual(cache.get("long"), "value")
+
+    def test_setting_again_refreshes_expiry(self):
+        cache = TTLCache(ttl=60)
+        cache.set("key", "old")
+        self.now += 50
+        cache.set("key", "new")
+
+        self.now += 50
+        self.assertEqual(cache.get("key"), "new")
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_delete_and_clear(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.delete("a")
+        cache.delete("missing")
+        self.assertIs(cache.get("a"), MISSING)
+        self.assertEqual(cache.get("b"), 2)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TieredCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.redis = fakeredis.FakeRedis()
+        for patcher in (
+            patch("app.utils.cache.time.monotonic", side_effect=lambda: self.now),
+            patch(
+                "app.utils.cache.redis_manager.get_redis_client",
+                return_value=self.redis,
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_values_are_shared_through_redis(self):
+        TieredCache("test", ttl=300).set("key", {"value": 1})
+        self.assertEqual(TieredCache("test", ttl=300).get("key"), {"value": 1})
+
+    def test_missing_key_returns_none(self):
+        self.assertIsNone(TieredCache("test").get("key"))
+
+    def test_redis_ttl_is_kept_in_other_processes(self):
+        TieredCache("test", ttl=300).set("key", "value", ttl=30)
+        other = TieredCache("test", ttl=300)
+
+        self.assertEqual(other.get("key"), "value")
+        self.now += 29
+        self.assertEqual(other.memory.get("key"), "value")
+        self.now += 2
+        self.assertIs(other.memory.get("key"), MISSING)
+
+    def test_memory_ttl_caps_longer_redis_ttl(self):
+        TieredCache("test", ttl=300, redis_ttl=3600).set("key", "value")
+        other = TieredCache("test", ttl=300)
+
+        other.get("key")
+        self.now += 301
+        self.assertIs(other.memory.get("key"), MISSING)
+
+    def test_redis_errors_are_misses(self):
+        cache = TieredCache("test")
+        with patch(
+            "app.utils.cache.redis_manager.get_redis_client",
+            side_effect=ConnectionError("down"),
+        ):
+            cache.set("key", "value")
+            self.assertIsNone(TieredCache("test").get("key"))
+        # The value still reached the memory tier of the process that set it
+        self.assertEqual(cache.get("key"), "value")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,13 @@ import os
 import unittest
 import json
 import tempfile
+from unittest.mock import patch
 import pyttsx3
 from PIL import Image
 import requests_mock
 
 from app import create_app
+from app.extensions import celery_manager
 from app.models.Conversation import Conversation
 
 
@@ -89,17 +91,27 @@ class ChatbotTestCase(unittest.TestCase):
 
     def test_chat_voice_input(self):
         temp_audio_path = self._create_temp_audio()
-        with open(temp_audio_path, "rb") as audio:
+        # Run the transcription and dialogue tasks in the request
+        with open(temp_audio_path, "rb") as audio, patch.object(
+            celery_manager.get_celery_app().conf, "task_always_eager", True
+        ):
             response = self.client.post(
-                "/chat",
+                "/api/v1/conversations",
                 headers={"Authorization": f"Bearer {self.access_token}"},
                 data={"language": "English", "audio": (audio, "test_audio.wav")},
             )
         os.remove(temp_audio_path)
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
         data = json.loads(response.data)
-        self.assertIn("response", data)
-        self.assertTrue(len(data["response"]) > 0)
+        self.assertIn("turn_id", data)
+
+        response = self.client.get(
+            f"/api/v1/turns/{data['turn_id']}",
+            headers={"Authorization": f"Bearer {self.access_token}"},
+        )
+        turn = json.loads(response.data)
+        self.assertEqual(turn["status"], "done")
+        self.assertTrue(len(turn["response"]) > 0)
 
     def test_chat_image_input(self):
         temp_image_path = self._create_temp_image()
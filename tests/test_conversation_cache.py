@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from flask import Flask
+from mongoengine.errors import ValidationError
+
+from app.models.Conversation import Conversation
+from app.services import conversation_cache as conversation_cache_module
+from app.services.conversation_cache import conversation_cache
+
+
+class ConversationCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.app = Flask(__name__)
+        self.app.config.update(
+            CONVERSATION_CACHE_TTL=600,
+            CONVERSATION_CACHE_LOCK_TIMEOUT=5,
+            CONVERSATION_CACHE_MAX_BYTES=64 * 1024,
+        )
+        patcher = patch(
+            "app.services.conversation_cache.redis_manager.get_redis_client",
+            return_value=self.redis,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+    def test_cached_conversation_of_another_user_is_not_returned(self):
+        conversation = Conversation(user_id="user", title="Ferns")
+        self.redis.set(conversation_cache._key("id"), conversation.to_json())
+
+        self.assertEqual(conversation_cache.get("id", "user").title, "Ferns")
+        self.assertIsNone(conversation_cache.get("id", "other"))
+
+    def test_invalid_conversation_id_is_not_found(self):
+        with patch.object(
+            conversation_cache_module.Conversation,
+            "objects",
+            side_effect=ValidationError("not a valid ObjectId"),
+        ):
+            self.assertIsNone(conversation_cache.get("not-an-id", "user"))
+
+    def test_miss_is_counted_once_while_waiting_for_the_lock(self):
+        # Another request holds the lock and writes the entry after a few polls
+        self.redis.set(conversation_cache._lock_key("id"), "other")
+        conversation = Conversation(user_id="user", title="Ferns")
+        polls = []
+
+        def sleep(seconds):
+            polls.append(seconds)
+            if len(polls) == 3:
+                self.redis.set(conversation_cache._key("id"), conversation.to_json())
+
+        with patch.object(
+            conversation_cache_module.time, "sleep", side_effect=sleep
+        ), patch.object(
+            conversation_cache_module, "log_cache_miss"
+        ) as log_cache_miss, patch.object(
+            conversation_cache_module, "log_cache_hit"
+        ) as log_cache_hit:
+            self.assertEqual(conversation_cache.get("id", "user").title, "Ferns")
+
+        self.assertEqual(len(polls), 3)
+        log_cache_miss.assert_called_once_with("conversation")
+        log_cache_hit.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
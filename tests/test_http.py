@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from app.utils.http import CircuitBreaker, CircuitOpenError
+
+
+def failing():
+    raise ConnectionError("upstream down")
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch("app.utils.http.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("upstream", failure_threshold=3, reset_timeout=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(failing)
+
+    def test_closed_circuit_passes_calls_through(self):
+        self.assertEqual(self.breaker.call(lambda x: x * 2, 21), 42)
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(3)
+        func = Mock()
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+
+    def test_success_resets_the_failure_count(self):
+        self.fail(2)
+        self.breaker.call(lambda: None)
+        self.fail(2)
+
+        self.assertTrue(self.breaker.allow())
+
+    def test_one_trial_call_after_reset_timeout(self):
+        self.fail(3)
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+        # Other calls wait for the trial call to end
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.fail(3)
+        self.now += 30
+
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_opens_the_circuit_again(self):
+        self.fail(3)
+        self.now += 30
+        self.fail(1)
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(lambda: None)
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
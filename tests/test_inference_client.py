@@ -0,0 +1,63 @@
+import os
+import tempfile
+import threading
+import unittest
+from multiprocessing.connection import Listener
+
+import torch
+
+from app.inference.client import InferenceClient
+
+
+class InferenceClientTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.address = os.path.join(directory.name, "engine.sock")
+        self.listener = Listener(self.address)
+        self.addCleanup(self.listener.close)
+        self.inputs = {"input_ids": torch.tensor([[1, 2, 3]])}
+
+    def serve(self, reply):
+        """Answer one request with `reply(message)`, or not at all if it is None."""
+
+        def run():
+            with self.listener.accept() as connection:
+                message = connection.recv()
+                if reply is not None:
+                    connection.send(reply(message))
+                else:
+                    # Wait for the client to give up and close the connection
+                    try:
+                        connection.recv()
+                    except EOFError:
+                        pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+
+    def test_generate_returns_the_reply(self):
+        self.serve(lambda message: {"text": f"{message['max_new_tokens']} tokens"})
+        client = InferenceClient(self.address, None)
+
+        self.assertEqual(client.generate(self.inputs, max_new_tokens=7), "7 tokens")
+
+    def test_engine_errors_are_raised(self):
+        self.serve(lambda message: {"error": "out of memory"})
+        client = InferenceClient(self.address, None)
+
+        with self.assertRaisesRegex(Exception, "out of memory"):
+            client.generate(self.inputs)
+
+    def test_request_without_reply_times_out(self):
+        self.serve(None)
+        client = InferenceClient(self.address, None, timeout=0.1)
+
+        with self.assertRaises(TimeoutError):
+            client.generate(self.inputs)
+        self.assertIsNone(client._local.connection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+from unittest.mock import patch
+
+import torch
+
+from app.inference.kv_cache import (
+    MIN_REUSED_TOKENS,
+    ConversationKVCache,
+    cache_bytes,
+)
+
+IMAGE_TOKEN = 9
+
+
+class FakeCache:
+    """Stands in for a transformers DynamicCache of `length` tokens."""
+
+    def __init__(self, length, layers=2, width=4):
+        self.layers = [
+            (torch.zeros(1, 1, length, width), torch.zeros(1, 1, length, width))
+            for _ in range(layers)
+        ]
+
+    def __len__(self):
+        return len(self.layers)
+
+    def __getitem__(self, index):
+        return self.layers[index]
+
+    def get_seq_length(self):
+        return self.layers[0][0].shape[2]
+
+    def crop(self, length):
+        self.layers = [(k[:, :, :length], v[:, :, :length]) for k, v in self.layers]
+
+
+def prompt(token_ids, image=False):
+    inputs = {
+        "input_ids": torch.tensor([token_ids]),
+        "attention_mask": torch.ones(1, len(token_ids), dtype=torch.long),
+    }
+    if image:
+        inputs["pixel_values"] = torch.zeros(1, 3, 2, 2)
+        inputs["image_sizes"] = torch.tensor([[2, 2]])
+    return inputs
+
+
+def store_turn(cache, conversation_id, token_ids):
+    # The cache holds every token of the sequence but the last generated one
+    cache.store(conversation_id, torch.tensor(token_ids), FakeCache(len(token_ids) - 1))
+
+
+class ConversationKVCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch(
+            "app.inference.kv_cache.time.monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ConversationKVCache(max_bytes=1024 * 1024, ttl=600)
+        self.history = list(range(100, 140))
+
+    def test_unknown_conversation_is_not_reused(self):
+        inputs = prompt(self.history)
+        self.assertEqual(self.cache.take("conversation", inputs), (inputs, 0))
+
+    def test_shared_prefix_is_reused(self):
+        store_turn(self.cache, "conversation", self.history)
+
+        generate_inputs, reused = self.cache.take(
+            "conversation", prompt(self.history + [1, 2, 3])
+        )
+
+        self.assertEqual(reused, len(self.history) - 1)
+        self.assertEqual(
+            generate_inputs["past_key_values"].get_seq_length(), len(self.history) - 1
+        )
+        self.assertEqual(generate_inputs["input_ids"].shape[1], len(self.history) + 3)
+
+    def test_diverging_prompt_is_cropped_to_the_shared_prefix(self):
+        store_turn(self.cache, "conversation", self.history)
+        token_ids = self.history[:30] + [1, 2, 3]
+
+        generate_inputs, reused = self.cache.take("conversation", prompt(token_ids))
+
+        self.assertEqual(reused, 30)
+        self.assertEqual(generate_inputs["past_key_values"].get_seq_length(), 30)
+
+    def test_one_prompt_token_is_left_to_encode(self):
+        store_turn(self.cache, "conversation", self.history + [1])
+
+        _, reused = self.cache.take("conversation", prompt(self.history))
+
+        self.assertEqual(reused, len(self.history) - 1)
+
+    def test_short_prefix_is_not_reused(self):
+        store_turn(self.cache, "conversation", self.history)
+        token_ids = self.history[: MIN_REUSED_TOKENS - 1] + [1, 2, 3]
+
+        _, reused = self.cache.take("conversation", prompt(token_ids))
+
+        self.assertEqual(reused, 0)
+
+    def test_image_in_reused_prefix_drops_pixel_values(self):
+        token_ids = [1, IMAGE_TOKEN] + self.history
+        store_turn(self.cache, "conversation", token_ids)
+
+        generate_inputs, reused = self.cache.take(
+            "conversation", prompt(token_ids + [1, 2], image=True), IMAGE_TOKEN
+        )
+
+        self.assertEqual(reused, len(token_ids) - 1)
+        self.assertNotIn("pixel_values", generate_inputs)
+        self.assertNotIn("image_sizes", generate_inputs)
+
+    def test_image_after_reused_prefix_is_not_reused(self):
+        store_turn(self.cache, "conversation", self.history)
+        inputs = prompt(self.history + [IMAGE_TOKEN, 1, 2], image=True)
+
+        self.assertEqual(
+            self.cache.take("conversation", inputs, IMAGE_TOKEN), (inputs, 0)
+        )
+
+    def test_entries_are_taken_out(self):
+        store_turn(self.cache, "conversation", self.history)
+        self.cache.take("conversation", prompt(self.history + [1]))
+
+        _, reused = self.cache.take("conversation", prompt(self.history + [1]))
+
+        self.assertEqual(reused, 0)
+
+    def test_entries_expire(self):
+        store_turn(self.cache, "conversation", self.history)
+        self.now += 601
+
+        _, reused = self.cache.take("conversation", prompt(self.history + [1]))
+
+        self.assertEqual(reused, 0)
+
+    def test_least_recently_stored_entry_is_evicted(self):
+        entry_bytes = cache_bytes(FakeCache(len(self.history) - 1))
+        cache = ConversationKVCache(max_bytes=2 * entry_bytes)
+        for conversation_id in ("a", "b", "c"):
+            store_turn(cache, conversation_id, self.history)
+
+        self.assertEqual(cache.take("a", prompt(self.history + [1]))[1], 0)
+        self.assertGreater(cache.take("b", prompt(self.history + [1]))[1], 0)
+        self.assertGreater(cache.take("c", prompt(self.history + [1]))[1], 0)
+
+    def test_entry_larger_than_the_cache_is_not_stored(self):
+        cache = ConversationKVCache(max_bytes=1024)
+        store_turn(cache, "conversation", self.history)
+
+        self.assertEqual(cache.take("conversation", prompt(self.history + [1]))[1], 0)
+
+    def test_discard(self):
+        store_turn(self.cache, "conversation", self.history)
+        self.cache.discard("conversation")
+        self.cache.discard("unknown")
+
+        _, reused = self.cache.take("conversation", prompt(self.history + [1]))
+
+        self.assertEqual(reused, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.utils.pagination import (
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    finish_page,
+    page_size,
+)
+
+
+class CursorTestCase(unittest.TestCase):
+    def test_timestamp_cursor_round_trip(self):
+        timestamp = datetime(2024, 5, 1, 12, 30, 15, 250000)
+        item = {"id": str(ObjectId()), "timestamp": timestamp.isoformat()}
+
+        value, last_id = decode_cursor(encode_cursor("timestamp", item), "timestamp")
+
+        self.assertEqual(value, timestamp)
+        self.assertEqual(last_id, ObjectId(item["id"]))
+
+    def test_string_cursor_round_trip(self):
+        item = {"id": str(ObjectId()), "dialogue_state": "default"}
+
+        value, last_id = decode_cursor(
+            encode_cursor("dialogue_state", item), "dialogue_state"
+        )
+
+        self.assertEqual(value, "default")
+        self.assertEqual(last_id, ObjectId(item["id"]))
+
+    def test_cursor_for_another_sort_is_rejected(self):
+        item = {"id": str(ObjectId()), "dialogue_state": "default"}
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(encode_cursor("dialogue_state", item), "timestamp")
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in (
+            "not a cursor",
+            "",
+            "e30=",
+            encode_cursor("timestamp", {"id": "1", "timestamp": "x"}),
+        ):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, "timestamp")
+
+
+class PageTestCase(unittest.TestCase):
+    def test_page_size_is_clamped(self):
+        self.assertEqual(page_size(None, default=20), 20)
+        self.assertEqual(page_size("abc", default=20), 20)
+        self.assertEqual(page_size("0"), 1)
+        self.assertEqual(page_size("-5"), 1)
+        self.assertEqual(page_size("30"), 30)
+        self.assertEqual(page_size(str(MAX_PAGE_SIZE + 1)), MAX_PAGE_SIZE)
+
+    def test_last_page_has_no_cursor(self):
+        items = [{"id": str(ObjectId()), "timestamp": "2024-05-01T00:00:00"}]
+        self.assertEqual(finish_page(items, "timestamp", 2), (items, None))
+
+    def test_extra_item_is_dropped_and_points_the_cursor(self):
+        items = [
+            {"id": str(ObjectId()), "timestamp": f"2024-05-0{day}T00:00:00"}
+            for day in (3, 2, 1)
+        ]
+
+        page, cursor = finish_page(items, "timestamp", 2)
+
+        self.assertEqual(page, items[:2])
+        self.assertEqual(
+            decode_cursor(cursor, "timestamp"),
+            (datetime(2024, 5, 2), ObjectId(items[1]["id"])),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import os
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+
+from app.chatbot.utils.speech_recognition.audio_processing import (
+    SAMPLE_RATE,
+    chunk_boundaries,
+)
+from app.chatbot.utils.speech_recognition import transcription_engine
+from app.chatbot.utils.speech_recognition.transcription_engine import (
+    TranscriptionEngine,
+    merge_segments,
+)
+
+
+def tone(seconds, amplitude=0.5, frequency=200):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def timed_chunk(audio, language):
+    """Stands in for transcribing a chunk, recording when and where it ran."""
+    started = time.time()
+    time.sleep(0.5)
+    return [
+        {"start": 0.0, "end": 0.0, "text": f"{os.getpid()} {started} {time.time()}"}
+    ]
+
+
+class ChunkBoundariesTestCase(unittest.TestCase):
+    def test_short_audio_is_one_chunk(self):
+        audio = tone(10)
+        self.assertEqual(
+            chunk_boundaries(audio, chunk_seconds=30), [(0, 0, len(audio))]
+        )
+
+    def test_cuts_at_quiet_points(self):
+        audio = tone(70)
+        for pause in (28.5, 57.0):
+            start = int(pause * SAMPLE_RATE)
+            audio[start : start + int(0.1 * SAMPLE_RATE)] = 0
+
+        chunks = chunk_boundaries(audio, chunk_seconds=30, search_seconds=3)
+
+        self.assertEqual(
+            chunks,
+            [
+                (0, 0, int(28.5 * SAMPLE_RATE)),
+                (int(28.5 * SAMPLE_RATE), int(28.5 * SAMPLE_RATE), 57 * SAMPLE_RATE),
+                (57 * SAMPLE_RATE, 57 * SAMPLE_RATE, len(audio)),
+            ],
+        )
+
+    def test_cuts_at_nominal_boundary_without_quiet_point(self):
+        audio = tone(65)
+        chunks = chunk_boundaries(audio, chunk_seconds=30, search_seconds=3)
+
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][2], len(audio))
+        for (_, cut, end), (_, next_cut, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, next_cut)
+        for _, cut, end in chunks:
+            self.assertLessEqual(end - cut, 30 * SAMPLE_RATE)
+
+    def test_chunks_reach_back_by_the_overlap(self):
+        audio = tone(70)
+        chunks = chunk_boundaries(audio, chunk_seconds=30, overlap_seconds=1.0)
+
+        self.assertEqual(chunks[0][0], 0)
+        for start, cut, _ in chunks[1:]:
+            self.assertEqual(cut - start, SAMPLE_RATE)
+
+
+class MergeSegmentsTestCase(unittest.TestCase):
+    def test_overlapping_segments_are_kept_once(self):
+        # Two 10 second chunks cut at 10s that overlap by 1s, from 9s to 10s
+        chunks = [
+            (0, 0, 10 * SAMPLE_RATE),
+            (9 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE),
+        ]
+        results = [
+            [
+                {"start": 0.0, "end": 4.0, "text": "a"},
+                {"start": 9.2, "end": 9.6, "text": "b"},
+                {"start": 9.7, "end": 10.0, "text": "c"},
+            ],
+            [
+                {"start": 0.2, "end": 0.6, "text": "b"},
+                {"start": 0.7, "end": 1.0, "text": "c"},
+                {"start": 3.0, "end": 4.0, "text": "d"},
+            ],
+        ]
+
+        merged = merge_segments(chunks, results, overlap_seconds=1.0)
+
+        self.assertEqual([segment["text"] for segment in merged], ["a", "b", "c", "d"])
+        self.assertAlmostEqual(merged[2]["start"], 9.7)
+        self.assertAlmostEqual(merged[3]["start"], 12.0)
+        self.assertAlmostEqual(merged[3]["end"], 13.0)
+
+    def test_chunks_without_overlap_are_offset(self):
+        chunks = [
+            (0, 0, 5 * SAMPLE_RATE),
+            (5 * SAMPLE_RATE, 5 * SAMPLE_RATE, 8 * SAMPLE_RATE),
+        ]
+        results = [
+            [{"start": 0.0, "end": 5.0, "text": "first"}],
+            [{"start": 0.0, "end": 3.0, "text": "second"}],
+        ]
+
+        merged = merge_segments(chunks, results, overlap_seconds=0)
+
+        self.assertEqual(
+            merged,
+            [
+                {"start": 0.0, "end": 5.0, "text": "first"},
+                {"start": 5.0, "end": 8.0, "text": "second"},
+            ],
+        )
+
+
+class TranscriptionEngineTestCase(unittest.TestCase):
+    def test_daemonic_process_transcribes_in_process(self):
+        engine = TranscriptionEngine(workers=4, vad=False)
+        segments = [{"start": 0.0, "end": 1.0, "text": "hello"}]
+        with patch.object(
+            transcription_engine.multiprocessing, "current_process"
+        ) as current_process, patch.object(
+            transcription_engine, "transcribe_segments", return_value=segments
+        ) as transcribe_segments:
+            current_process.return_value.daemon = True
+            self.assertEqual(engine.transcribe(tone(1), "english"), "hello")
+
+        self.assertIsNone(engine._pool)
+        transcribe_segments.assert_called_once()
+
+    def test_chunks_are_transcribed_in_parallel(self):
+        engine = TranscriptionEngine(workers=4, chunk_seconds=1, vad=False)
+        engine.transcribe_chunk = timed_chunk
+        self.addCleanup(engine.shutdown)
+
+        # As a task of the transcription queue's threads pool worker would
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            segments = executor.submit(
+                engine.transcribe_segments, np.zeros(4 * SAMPLE_RATE, np.float32), "fon"
+            ).result()
+
+        runs = [segment["text"].split() for segment in segments]
+        self.assertGreaterEqual(len(runs), 4)
+        self.assertGreater(len({pid for pid, _, _ in runs}), 1)
+        # Some chunks started before others had finished
+        intervals = sorted((float(start), float(end)) for _, start, end in runs)
+        self.assertTrue(
+            any(
+                next_start < end
+                for (_, end), (next_start, _) in zip(intervals, intervals[1:])
+            )
+        )
+
+    def test_silence_is_skipped_and_times_are_mapped_back(self):
+        engine = TranscriptionEngine(workers=1, vad=True)
+        audio = np.concatenate(
+            (np.zeros(2 * SAMPLE_RATE, np.float32), tone(1), np.zeros(SAMPLE_RATE))
+        )
+        segments = [{"start": 0.0, "end": 1.4, "text": "hello"}]
+        with patch.object(
+            transcription_engine, "transcribe_segments", return_value=segments
+        ) as transcribe_segments:
+            result = engine.transcribe_segments(audio, "english")
+
+        # The speech and its padding, from 1.8s to 3.2s
+        self.assertEqual(len(transcribe_segments.call_args[0][0]), 1.4 * SAMPLE_RATE)
+        self.assertAlmostEqual(result[0]["start"], 1.8)
+        self.assertAlmostEqual(result[0]["end"], 3.2)
+
+    def test_silent_audio_is_not_transcribed(self):
+        engine = TranscriptionEngine(workers=1, vad=True)
+        with patch.object(transcription_engine, "transcribe_segments") as transcribe:
+            self.assertEqual(
+                engine.transcribe(np.zeros(SAMPLE_RATE, np.float32), "en"), ""
+            )
+        transcribe.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
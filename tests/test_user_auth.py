@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import fakeredis
+from flask import Flask
+
+from app.chatbot import user_auth
+
+
+class AuthenticateUserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.redis = fakeredis.FakeRedis()
+        self.client = Mock()
+        self.app = Flask(__name__)
+        self.app.config.update(
+            USER_CACHE_SIZE=100, USER_CACHE_TTL=300, USER_CACHE_NEGATIVE_TTL=30
+        )
+        for patcher in (
+            patch("app.utils.cache.time.monotonic", side_effect=lambda: self.now),
+            patch(
+                "app.utils.cache.redis_manager.get_redis_client",
+                return_value=self.redis,
+            ),
+            patch.object(user_auth, "get_user_client", return_value=self.client),
+            patch.object(user_auth.microservice_token, "get_token", return_value="t"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.new_worker()
+
+    def new_worker(self):
+        # Each worker process has its own memory tier and shares Redis
+        user_auth._user_cache = None
+        self.addCleanup(setattr, user_auth, "_user_cache", None)
+
+    def respond(self, status_code):
+        self.client.get_user.return_value = Mock(
+            status_code=status_code, json=Mock(return_value={"_id": "user"})
+        )
+
+    def test_user_is_cached(self):
+        self.respond(200)
+        self.assertEqual(user_auth.authenticate_user("user").id, "user")
+        self.new_worker()
+        self.assertEqual(user_auth.authenticate_user("user").id, "user")
+
+        self.client.get_user.assert_called_once()
+
+    def test_failed_lookup_is_not_cached(self):
+        self.respond(502)
+        self.assertIsNone(user_auth.authenticate_user("user"))
+        self.respond(200)
+        self.assertEqual(user_auth.authenticate_user("user").id, "user")
+
+    def test_rejection_from_redis_expires_after_negative_ttl(self):
+        self.respond(401)
+        self.assertIsNone(user_auth.authenticate_user("user"))
+        self.new_worker()
+        self.assertIsNone(user_auth.authenticate_user("user"))
+        self.assertEqual(self.client.get_user.call_count, 1)
+
+        self.respond(200)
+        self.now += 29
+        self.assertIsNone(user_auth.authenticate_user("user"))
+        self.assertEqual(self.client.get_user.call_count, 1)
+        # Redis has expired the rejection by then too
+        (key,) = self.redis.keys()
+        self.assertLessEqual(self.redis.ttl(key), 30)
+        self.now += 2
+        self.redis.delete(key)
+        self.assertEqual(user_auth.authenticate_user("user").id, "user")
+        self.assertEqual(self.client.get_user.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from types import SimpleNamespace
+
+import torch
+
+from app.inference.vision_cache import VisionFeatureCache, install_vision_feature_cache
+
+
+class StubModel:
+    """Stands in for a LLaVA-Next model, counting the images its vision tower sees."""
+
+    def __init__(self):
+        self.config = SimpleNamespace(_name_or_path="stub")
+        self.images = 0
+
+    def get_image_features(self, pixel_values, image_sizes):
+        self.images += pixel_values.shape[0]
+        return [pixel_values.flatten(1).sum(dim=1, keepdim=True)]
+
+
+class VisionFeatureCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.model = StubModel()
+        install_vision_feature_cache(self.model, VisionFeatureCache(1024 * 1024))
+        self.image_sizes = torch.tensor([[16, 16]])
+
+    def test_repeated_image_skips_the_vision_tower(self):
+        pixel_values = torch.rand(1, 2, 3, 16, 16)
+
+        first = self.model.get_image_features(pixel_values, self.image_sizes)
+        second = self.model.get_image_features(pixel_values.clone(), self.image_sizes)
+
+        self.assertEqual(self.model.images, 1)
+        self.assertTrue(torch.equal(first[0], second[0]))
+
+    def test_other_image_runs_the_vision_tower(self):
+        self.model.get_image_features(torch.rand(1, 2, 3, 16, 16), self.image_sizes)
+        self.model.get_image_features(torch.rand(1, 2, 3, 16, 16), self.image_sizes)
+
+        self.assertEqual(self.model.images, 2)
+
+    def test_model_without_image_features_is_left_alone(self):
+        model = SimpleNamespace(config=SimpleNamespace())
+
+        install_vision_feature_cache(model, VisionFeatureCache(1024))
+
+        self.assertFalse(hasattr(model, "get_image_features"))
+
+
+if __name__ == "__main__":
+    unittest.main()
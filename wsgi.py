@@ -1,4 +1,5 @@
 import os
+from argparse import Namespace
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,3 +23,8 @@ if __name__ == "__main__":
     start_metrics_server(port=6000)
     app = create_app(args)
     app.run(port=os.environ.get("PORT", 5000))
+else:
+    # Imported by gunicorn ("wsgi:app"). With preload_app enabled this runs once in
+    # the master process, which loads the warm models before forking the workers.
+    # The metrics server is started by the gunicorn master, see gunicorn.conf.py.
+    app = create_app(Namespace(environment="production", metrics_server=False))